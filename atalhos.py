@@ -13,7 +13,8 @@ def setup_shortcuts(main_window, item_dialog=None):
       - Ctrl+L: Selecionar o último item da tabela
       - Ctrl+H: Selecionar o primeiro item da tabela
       - F5: Atualizar diretório e tabela
-      - Ctrl+Z: Desfazer até 5 alterações (inserção ou exclusão)
+      - Ctrl+Z: Desfazer a última alteração (histórico salvo no banco)
+      - Ctrl+Y: Refazer a última alteração desfeita
     """
     # Atalho Ctrl+N para adicionar item
     shortcutAddItem = QShortcut(QKeySequence("Ctrl+N"), main_window)
@@ -39,3 +40,7 @@ def setup_shortcuts(main_window, item_dialog=None):
     # Atalho Ctrl+Z para desfazer
     shortcutUndo = QShortcut(QKeySequence("Ctrl+Z"), main_window)
     shortcutUndo.activated.connect(main_window.undo_last_action)
+
+    # Atalho Ctrl+Y para refazer
+    shortcutRedo = QShortcut(QKeySequence("Ctrl+Y"), main_window)
+    shortcutRedo.activated.connect(main_window.redo_last_action)
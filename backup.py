@@ -0,0 +1,451 @@
+"""
+Backup consistente do banco com a API de backup do SQLite.
+
+Connection.backup() copia o banco em passos de BACKUP_PAGES páginas: entre
+um passo e outro o lock de leitura é liberado, então quem está gravando não
+fica bloqueado durante toda a cópia, e o resultado é um instantâneo íntegro
+(nunca um arquivo copiado pela metade enquanto outro usuário grava).
+O instantâneo é compactado em seguida e gravado em "backups", ao lado do
+banco, com data e hora no nome.
+
+Backups de gerações (banco + imagens) são incrementais: cada geração guarda
+um instantâneo do banco e um manifest.json com caminho, tamanho, mtime e
+hash de cada imagem. As imagens ficam num repositório por conteúdo
+(backups/images/<hash>), copiadas sem recompactar e só quando novas ou
+alteradas: arquivos com o mesmo tamanho e mtime da geração anterior nem são
+lidos. As gerações mais antigas são descartadas (rotação) junto com as
+imagens que nenhuma geração restante usa, e qualquer geração pode ser
+restaurada como um par consistente de banco e imagens.
+"""
+import datetime
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import zipfile
+
+from PyQt5.QtCore import QThread, pyqtSignal
+
+import database
+
+# Páginas copiadas por passo de Connection.backup()
+BACKUP_PAGES = 256
+# Recomeços tolerados (outra conexão gravou durante a cópia) antes de copiar num passo só
+MAX_RESTARTS = 3
+# Bloco lido do instantâneo durante a compactação (bytes)
+COPY_CHUNK = 1 << 20
+BACKUP_FOLDER = "backups"
+GENERATIONS_FOLDER = "generations"
+OBJECTS_FOLDER = "images"
+MANIFEST = "manifest.json"
+# Gerações e objetos .part parados há mais que isto são restos de backups interrompidos
+PART_STALE_SECONDS = 24 * 60 * 60
+
+
+class BackupCancelled(Exception):
+    pass
+
+
+class _BackupRestarted(Exception):
+    pass
+
+
+def pasta_backups():
+    """Pasta de backups ao lado do banco atual (criada se não existir)."""
+    pasta = os.path.join(os.path.dirname(os.path.abspath(database.NOME_DB)), BACKUP_FOLDER)
+    os.makedirs(pasta, exist_ok=True)
+    return pasta
+
+
+def copiar_banco(destino, progresso=None, cancelado=None):
+    """
+    Copia o banco atual para o arquivo destino com Connection.backup(), em passos.
+    progresso(páginas copiadas, total de páginas) é chamado a cada passo e
+    cancelado() consultado entre os passos (levanta BackupCancelled).
+
+    Uma gravação de outra conexão entre dois passos faz o SQLite recomeçar a
+    cópia; se isso acontecer mais de MAX_RESTARTS vezes (banco muito
+    movimentado), a cópia é refeita num passo só, segurando o lock de
+    leitura apenas durante ela.
+    """
+    estado = {"copiadas": 0, "recomecos": 0}
+
+    def passo(status, restantes, total):
+        if cancelado and cancelado():
+            raise BackupCancelled()
+        copiadas = total - restantes
+        if copiadas < estado["copiadas"]:
+            estado["recomecos"] += 1
+            if estado["recomecos"] > MAX_RESTARTS:
+                raise _BackupRestarted()
+        estado["copiadas"] = copiadas
+        if progresso:
+            progresso(copiadas, total)
+
+    for paginas in (BACKUP_PAGES, -1):
+        alvo = sqlite3.connect(destino)
+        try:
+            with database.obter_conexao(somente_leitura=True) as conn:
+                conn.backup(alvo, pages=paginas, progress=passo)
+            return
+        except _BackupRestarted:
+            print("Banco alterado durante o backup; copiando num passo só.")
+        finally:
+            alvo.close()
+
+
+def _carimbo():
+    return datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+
+
+def backup_banco(progresso=None, cancelado=None, pasta=None, carimbo=None):
+    """
+    Gera <banco>_<data_hora>.zip com um instantâneo consistente em pasta
+    (padrão: backups, ao lado do banco). progresso(feito, total) é reportado
+    em KB: primeiro a cópia, depois a compactação. Retorna o caminho do zip.
+    """
+    nome = os.path.splitext(os.path.basename(database.NOME_DB))[0]
+    carimbo = carimbo or _carimbo()
+    pasta = pasta or pasta_backups()
+    instantaneo = os.path.join(pasta, f".{nome}_{carimbo}.db")
+    destino = os.path.join(pasta, f"{nome}_{carimbo}.zip")
+    parcial = destino + ".part"
+    try:
+        with database.obter_conexao(somente_leitura=True) as conn:
+            page_kb = conn.execute("PRAGMA page_size").fetchone()[0] / 1024
+
+        def copia(paginas, total_paginas):
+            # Metade do progresso para a cópia e metade para a compactação
+            if progresso:
+                progresso(int(paginas * page_kb), int(2 * total_paginas * page_kb))
+
+        copiar_banco(instantaneo, copia, cancelado)
+        total_kb = max(1, os.path.getsize(instantaneo) // 1024)
+        lidos = 0
+        with zipfile.ZipFile(parcial, "w", zipfile.ZIP_DEFLATED) as zf, \
+                open(instantaneo, "rb") as origem, \
+                zf.open(os.path.basename(database.NOME_DB), "w", force_zip64=True) as saida:
+            while True:
+                if cancelado and cancelado():
+                    raise BackupCancelled()
+                bloco = origem.read(COPY_CHUNK)
+                if not bloco:
+                    break
+                saida.write(bloco)
+                lidos += len(bloco)
+                if progresso:
+                    progresso(total_kb + lidos // 1024, 2 * total_kb)
+        os.replace(parcial, destino)
+    finally:
+        for temporario in (instantaneo, parcial):
+            if os.path.exists(temporario):
+                os.remove(temporario)
+    return destino
+
+
+# -------------------- Gerações incrementais (banco + imagens) --------------------
+def _pasta_geracoes():
+    pasta = os.path.join(pasta_backups(), GENERATIONS_FOLDER)
+    os.makedirs(pasta, exist_ok=True)
+    return pasta
+
+
+def _caminho_objeto(hash_conteudo):
+    return os.path.join(pasta_backups(), OBJECTS_FOLDER, hash_conteudo[:2], hash_conteudo)
+
+
+def listar_geracoes():
+    """Nomes (data_hora) das gerações completas, da mais antiga para a mais recente."""
+    pasta = _pasta_geracoes()
+    return sorted(nome for nome in os.listdir(pasta) if os.path.exists(os.path.join(pasta, nome, MANIFEST)))
+
+
+def ler_manifesto(geracao):
+    with open(os.path.join(_pasta_geracoes(), geracao, MANIFEST), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _listar_imagens(pasta):
+    """[(caminho relativo com "/", tamanho, mtime_ns)] dos arquivos da pasta de imagens."""
+    arquivos = []
+    for raiz, _, nomes in os.walk(pasta):
+        for nome in nomes:
+            completo = os.path.join(raiz, nome)
+            info = os.stat(completo)
+            relativo = os.path.relpath(completo, pasta).replace(os.sep, "/")
+            arquivos.append((relativo, info.st_size, info.st_mtime_ns))
+    return arquivos
+
+
+def _guardar_objeto(origem, avancar, cancelado):
+    """
+    Copia origem para um temporário calculando o SHA-256 na mesma leitura e o
+    move para o repositório se o conteúdo ainda não estiver lá.
+    Retorna (hash, bytes copiados para o repositório).
+    """
+    repositorio = os.path.join(pasta_backups(), OBJECTS_FOLDER)
+    os.makedirs(repositorio, exist_ok=True)
+    sha = hashlib.sha256()
+    fd, temporario = tempfile.mkstemp(dir=repositorio, suffix=".part")
+    try:
+        with open(origem, "rb") as entrada, os.fdopen(fd, "wb") as saida:
+            while True:
+                if cancelado and cancelado():
+                    raise BackupCancelled()
+                bloco = entrada.read(COPY_CHUNK)
+                if not bloco:
+                    break
+                sha.update(bloco)
+                saida.write(bloco)
+                avancar(len(bloco))
+        hash_conteudo = sha.hexdigest()
+        destino = _caminho_objeto(hash_conteudo)
+        try:
+            # Renova o mtime: a rotação de outro usuário não remove um objeto recém-usado
+            os.utime(destino)
+            return hash_conteudo, 0
+        except FileNotFoundError:
+            pass
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        os.replace(temporario, destino)
+        return hash_conteudo, os.path.getsize(destino)
+    finally:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+
+
+def _ultima_atividade(pasta):
+    """mtime mais recente da pasta e dos arquivos dentro dela."""
+    mtimes = [os.path.getmtime(pasta)]
+    for raiz, _, nomes in os.walk(pasta):
+        for nome in nomes:
+            try:
+                mtimes.append(os.path.getmtime(os.path.join(raiz, nome)))
+            except FileNotFoundError:
+                pass
+    return max(mtimes)
+
+
+def _remover_antigas(manter):
+    """
+    Apaga as gerações além das manter mais recentes e as imagens que nenhuma
+    outra usa. A pasta de backups é compartilhada por todos os usuários do
+    banco: gerações .part de outros backups ainda em andamento ficam, assim
+    como os objetos gravados desde o início delas (ainda fora de qualquer
+    manifesto) e os mais novos que o início da limpeza.
+    """
+    inicio = time.time()
+    limite = inicio
+    pasta = _pasta_geracoes()
+    for nome in os.listdir(pasta):
+        if not nome.endswith(".part"):
+            continue
+        caminho = os.path.join(pasta, nome)
+        try:
+            atividade = _ultima_atividade(caminho)
+        except FileNotFoundError:
+            # Concluída ou descartada pelo próprio processo enquanto olhávamos
+            continue
+        if inicio - atividade > PART_STALE_SECONDS:
+            shutil.rmtree(caminho, ignore_errors=True)
+            continue
+        try:
+            comeco = datetime.datetime.strptime(nome[:-len(".part")], "%Y%m%d_%H%M%S").timestamp()
+        except ValueError:
+            comeco = atividade
+        limite = min(limite, comeco)
+
+    geracoes = listar_geracoes()
+    removidas = geracoes[:max(0, len(geracoes) - max(1, manter))]
+    for geracao in removidas:
+        shutil.rmtree(os.path.join(pasta, geracao))
+    if not removidas:
+        return removidas
+    em_uso = {entrada["hash"] for geracao in listar_geracoes() for entrada in ler_manifesto(geracao)["files"]}
+    repositorio = os.path.join(pasta_backups(), OBJECTS_FOLDER)
+    # De baixo para cima, para remover as subpastas <h[:2]> que ficarem vazias
+    for raiz, _, nomes in os.walk(repositorio, topdown=False):
+        for nome in nomes:
+            if nome in em_uso:
+                continue
+            caminho = os.path.join(raiz, nome)
+            try:
+                mtime = os.path.getmtime(caminho)
+            except FileNotFoundError:
+                continue
+            # Temporários de cópias em andamento (.part) só saem quando abandonados
+            recente = inicio - mtime <= PART_STALE_SECONDS if nome.endswith(".part") else mtime >= limite
+            if not recente:
+                os.remove(caminho)
+        if raiz != repositorio and not os.listdir(raiz):
+            try:
+                os.rmdir(raiz)
+            except OSError:
+                # Outro backup acabou de gravar nela
+                pass
+    return removidas
+
+
+def backup_geracao(manter=10, progresso=None, cancelado=None):
+    """
+    Cria uma geração em backups/generations/<data_hora>: instantâneo do banco
+    e manifesto das imagens, copiando para o repositório só as imagens novas ou
+    alteradas desde a geração anterior. Depois mantém só as manter gerações
+    mais recentes. progresso(feito, total) em KB.
+    Retorna um dicionário com generation, files, changed, copied_bytes e removed.
+    """
+    pasta_imagens = database.IMAGES_FOLDER
+    geracoes = listar_geracoes()
+    anteriores = {}
+    if geracoes:
+        anteriores = {entrada["path"]: entrada for entrada in ler_manifesto(geracoes[-1])["files"]}
+    arquivos = _listar_imagens(pasta_imagens) if os.path.isdir(pasta_imagens) else []
+    alterados = [(caminho, tamanho, mtime) for caminho, tamanho, mtime in arquivos
+                 if caminho not in anteriores
+                 or (anteriores[caminho]["size"], anteriores[caminho]["mtime_ns"]) != (tamanho, mtime)]
+
+    with database.obter_conexao(somente_leitura=True) as conn:
+        tamanho_banco_kb = (conn.execute("PRAGMA page_count").fetchone()[0]
+                            * conn.execute("PRAGMA page_size").fetchone()[0]) // 1024
+    total_kb = 2 * tamanho_banco_kb + sum(tamanho for _, tamanho, _ in alterados) // 1024
+    feito = {"kb": 0, "bytes": 0}
+
+    def progresso_banco(kb, _):
+        if progresso:
+            progresso(kb, total_kb)
+
+    def avancar(quantidade):
+        feito["bytes"] += quantidade
+        if progresso:
+            progresso(2 * tamanho_banco_kb + feito["bytes"] // 1024, total_kb)
+
+    carimbo = _carimbo()
+    parcial = os.path.join(_pasta_geracoes(), carimbo + ".part")
+    os.makedirs(parcial)
+    try:
+        arquivo_banco = backup_banco(progresso_banco, cancelado, pasta=parcial, carimbo=carimbo)
+        entradas = []
+        copiados = 0
+        alterados_por_caminho = {caminho for caminho, _, _ in alterados}
+        for caminho, tamanho, mtime in arquivos:
+            if caminho in alterados_por_caminho:
+                hash_conteudo, bytes_copiados = _guardar_objeto(
+                    os.path.join(pasta_imagens, caminho.replace("/", os.sep)), avancar, cancelado)
+                copiados += bytes_copiados
+            else:
+                hash_conteudo = anteriores[caminho]["hash"]
+            entradas.append({"path": caminho, "size": tamanho, "mtime_ns": mtime, "hash": hash_conteudo})
+        manifesto = {
+            "created": carimbo,
+            "database": os.path.basename(arquivo_banco),
+            "database_name": os.path.basename(database.NOME_DB),
+            "files": entradas,
+        }
+        with open(os.path.join(parcial, MANIFEST), "w", encoding="utf-8") as f:
+            json.dump(manifesto, f, indent=1)
+        os.replace(parcial, os.path.join(_pasta_geracoes(), carimbo))
+    except BaseException:
+        shutil.rmtree(parcial, ignore_errors=True)
+        raise
+    removidas = _remover_antigas(manter)
+    return {"generation": carimbo, "files": len(arquivos), "changed": len(alterados),
+            "copied_bytes": copiados, "removed": removidas}
+
+
+def restaurar_geracao(geracao, progresso=None, cancelado=None):
+    """
+    Restaura a geração: primeiro as imagens (só as que diferem em tamanho ou
+    mtime do manifesto, sem apagar arquivos extras) e por último o banco,
+    copiado sobre o banco atual com Connection.backup() numa conexão de
+    escrita. Um cancelamento (inclusive durante a cópia do banco, que é
+    desfeita por inteiro) não altera o banco.
+    progresso(feito, total) em KB. Retorna o número de imagens restauradas.
+    """
+    manifesto = ler_manifesto(geracao)
+    pasta_geracao = os.path.join(_pasta_geracoes(), geracao)
+    pasta_imagens = database.IMAGES_FOLDER
+    pendentes = []
+    for entrada in manifesto["files"]:
+        destino = os.path.join(pasta_imagens, entrada["path"].replace("/", os.sep))
+        try:
+            info = os.stat(destino)
+            if (info.st_size, info.st_mtime_ns) == (entrada["size"], entrada["mtime_ns"]):
+                continue
+        except FileNotFoundError:
+            pass
+        if not os.path.exists(_caminho_objeto(entrada["hash"])):
+            raise FileNotFoundError(f"Backup image missing from the repository: {entrada['path']}")
+        pendentes.append((entrada, destino))
+    with zipfile.ZipFile(os.path.join(pasta_geracao, manifesto["database"])) as zf:
+        membro = zf.getinfo(manifesto["database_name"])
+        banco_kb = membro.file_size // 1024
+        total_kb = max(1, sum(entrada["size"] for entrada, _ in pendentes) // 1024 + banco_kb)
+        feito = 0
+        for entrada, destino in pendentes:
+            if cancelado and cancelado():
+                raise BackupCancelled()
+            os.makedirs(os.path.dirname(destino), exist_ok=True)
+            temporario = destino + ".part"
+            shutil.copyfile(_caminho_objeto(entrada["hash"]), temporario)
+            os.replace(temporario, destino)
+            os.utime(destino, ns=(entrada["mtime_ns"], entrada["mtime_ns"]))
+            feito += entrada["size"]
+            if progresso:
+                progresso(feito // 1024, total_kb)
+        with tempfile.TemporaryDirectory(dir=pasta_geracao) as temporaria:
+            instantaneo = zf.extract(membro, temporaria)
+            origem = sqlite3.connect(instantaneo)
+            try:
+                if origem.execute("PRAGMA quick_check").fetchone()[0] != "ok":
+                    raise sqlite3.DatabaseError("The database snapshot in this backup is damaged.")
+
+                def passo(status, restantes, paginas):
+                    # Interromper a cópia antes do último passo desfaz a transação no banco atual
+                    if restantes and cancelado and cancelado():
+                        raise BackupCancelled()
+                    if progresso:
+                        progresso(feito // 1024 + banco_kb * (paginas - restantes) // max(1, paginas), total_kb)
+
+                with database.obter_conexao() as destino_conn:
+                    origem.backup(destino_conn, pages=BACKUP_PAGES, progress=passo)
+            finally:
+                origem.close()
+    return len(pendentes)
+
+
+class BackupWorker(QThread):
+    """
+    Roda uma tarefa de backup (backup_banco, backup_geracao ou
+    restaurar_geracao) fora do thread da interface. A tarefa recebe args e
+    os parâmetros progresso e cancelado.
+    """
+    # (KB processados, total em KB)
+    progress = pyqtSignal(int, int)
+    # (resultado da tarefa, segundos)
+    completed = pyqtSignal(object, float)
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
+
+    def __init__(self, task=backup_banco, args=(), parent=None):
+        super().__init__(parent)
+        self.task = task
+        self.args = args
+        self._cancel = threading.Event()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def run(self):
+        inicio = time.perf_counter()
+        try:
+            resultado = self.task(*self.args, progresso=self.progress.emit, cancelado=self._cancel.is_set)
+        except BackupCancelled:
+            self.cancelled.emit()
+        except Exception as e:
+            self.failed.emit(str(e))
+        else:
+            self.completed.emit(resultado, time.perf_counter() - inicio)
@@ -0,0 +1,26 @@
+from collections import namedtuple
+
+from PyQt5.QtCore import QObject, pyqtSignal
+
+# entity: "item" ou "directory"
+# action: "inserted", "updated" ou "deleted"
+# ids: ids afetados
+# fields: colunas alteradas ("note" para a nota); vazio = qualquer coluna
+Change = namedtuple("Change", "entity action ids fields")
+
+
+class ChangeNotifier(QObject):
+    """
+    Avisa a interface do que foi alterado no banco, para que a tabela e a
+    árvore atualizem apenas as linhas/nós afetados em vez de recarregar tudo.
+    """
+    changed = pyqtSignal(object)
+
+    def notify(self, entity, action, ids, fields=()):
+        ids = tuple(i for i in ids if i is not None)
+        if ids:
+            self.changed.emit(Change(entity, action, ids, tuple(fields)))
+
+
+# Instância compartilhada
+notifier = ChangeNotifier()
@@ -1,3 +1,4 @@
+import json
 import os
 
 
@@ -12,3 +13,83 @@ def get_config_path():
     if not os.path.exists(config_folder):
         os.makedirs(config_folder)
     return os.path.join(config_folder, "config.json")
+
+
+def _load_section(key, defaults):
+    """
+    Retorna a seção key do config.json do usuário, completada com os valores
+    padrão de defaults.
+    """
+    config = dict(defaults)
+    config_path = get_config_path()
+    if os.path.exists(config_path):
+        try:
+            with open(config_path, "r") as f:
+                config.update(json.load(f).get(key, {}))
+        except Exception as e:
+            print(f"Erro ao carregar a seção '{key}' da configuração:", e)
+    return config
+
+
+# Valores padrão do acesso ao banco (chave "database" do config.json)
+DEFAULT_DATABASE_CONFIG = {
+    "wal": False,
+    "busy_timeout_ms": 5000,
+    "lock_retries": 3,
+    "retry_delay_ms": 250,
+}
+
+
+def load_database_config():
+    """
+    Retorna a configuração de acesso ao banco salva no config.json do usuário,
+    completada com os valores padrão. O modo WAL é opcional (desligado por padrão),
+    pois não é seguro em todos os compartilhamentos de rede.
+    """
+    return _load_section("database", DEFAULT_DATABASE_CONFIG)
+
+
+# Valores padrão da busca de itens (chave "search" do config.json)
+DEFAULT_SEARCH_CONFIG = {
+    "as_you_type": True,
+    "debounce_ms": 300,
+    "min_chars": 2,
+}
+
+
+def load_search_config():
+    """
+    Retorna a configuração da busca de itens salva no config.json do usuário,
+    completada com os valores padrão.
+    """
+    return _load_section("search", DEFAULT_SEARCH_CONFIG)
+
+
+# Valores padrão dos backups incrementais (chave "backup" do config.json)
+DEFAULT_BACKUP_CONFIG = {
+    # Gerações (banco + imagens) mantidas em backups/generations
+    "generations": 10,
+}
+
+
+def load_backup_config():
+    """
+    Retorna a configuração dos backups salva no config.json do usuário,
+    completada com os valores padrão.
+    """
+    return _load_section("backup", DEFAULT_BACKUP_CONFIG)
+
+
+# Valores padrão do histórico de desfazer/refazer (chave "undo" do config.json)
+DEFAULT_UNDO_CONFIG = {
+    # Entradas mais antigas são removidas em segundo plano; 0 = manter tudo
+    "retention_days": 30,
+}
+
+
+def load_undo_config():
+    """
+    Retorna a configuração do histórico de desfazer salva no config.json do
+    usuário, completada com os valores padrão.
+    """
+    return _load_section("undo", DEFAULT_UNDO_CONFIG)
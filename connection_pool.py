@@ -0,0 +1,255 @@
+import os
+import sqlite3
+import threading
+import time
+import urllib.request
+import weakref
+
+
+class ReadOnlyDatabaseError(sqlite3.OperationalError):
+    """Levantada ao pedir a conexão de escrita enquanto o pool está em modo somente leitura."""
+
+
+def is_lock_error(error):
+    """Indica se o erro do SQLite foi causado por outro processo segurando o banco."""
+    message = str(error).lower()
+    return "database is locked" in message or "database is busy" in message
+
+
+class _Dona:
+    """Marca guardada no threading.local de cada thread; some quando a thread termina."""
+
+
+class ConnectionPool:
+    """
+    Mantém conexões SQLite de longa duração para o banco do inventário.
+
+    Cada thread recebe a sua própria conexão de leitura (reutilizada entre
+    chamadas) e todas as escritas passam por uma única conexão de escrita,
+    protegida por um lock reentrante. Os PRAGMAs são aplicados uma única vez,
+    quando a conexão é aberta, e não mais a cada uso.
+
+    Uma conexão de leitura só é fechada pela própria thread (ou depois que a
+    thread terminou): as de outras threads vivas são apenas invalidadas e
+    fechadas por elas no próximo uso ou em close_thread_reader().
+    """
+
+    def __init__(self, path, timeout=5, journal_mode="DELETE", retries=3, retry_delay=0.25):
+        self.path = path
+        self.timeout = timeout
+        self.journal_mode = journal_mode
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.read_only = False
+        self._lock = threading.Lock()
+        self._writer_lock = threading.RLock()
+        self._writer = None
+        self._local = threading.local()
+        # (weakref da marca da thread dona, conexão) de cada conexão de leitura aberta.
+        # threading.Thread.is_alive() não serve: threads do Qt aparecem sempre vivas.
+        self._readers = []
+        # Incrementada a cada troca de banco para invalidar conexões antigas por thread
+        self._generation = 0
+        self._stats = {
+            "connections_opened": 0,
+            "reader_acquisitions": 0,
+            "writer_acquisitions": 0,
+            "writer_waits": 0,
+            "writer_wait_seconds": 0.0,
+            "lock_retries": 0,
+        }
+
+    # -------------------- Abertura --------------------
+    def _connect(self, read_only=False):
+        if read_only:
+            uri = "file:" + urllib.request.pathname2url(os.path.abspath(self.path)) + "?mode=ro"
+            conn = sqlite3.connect(uri, uri=True, timeout=self.timeout, check_same_thread=False)
+        else:
+            conn = sqlite3.connect(self.path, timeout=self.timeout, check_same_thread=False)
+        conn.execute(f"PRAGMA busy_timeout = {int(self.timeout * 1000)};")
+        with self._lock:
+            self._stats["connections_opened"] += 1
+        return conn
+
+    def with_retries(self, func):
+        """
+        Executa func() repetindo a tentativa quando o banco está bloqueado por outro
+        processo, com espera crescente entre as tentativas. Relança o último erro.
+        """
+        for attempt in range(self.retries + 1):
+            try:
+                return func()
+            except sqlite3.OperationalError as e:
+                if not is_lock_error(e) or attempt >= self.retries:
+                    raise
+                with self._lock:
+                    self._stats["lock_retries"] += 1
+                time.sleep(self.retry_delay * (2 ** attempt))
+
+    def _apply_journal_mode(self, conn):
+        current = conn.execute("PRAGMA journal_mode;").fetchone()[0].upper()
+        if current == self.journal_mode:
+            return
+        try:
+            conn.execute(f"PRAGMA journal_mode={self.journal_mode};")
+        except sqlite3.OperationalError as e:
+            # Trocar o modo exige acesso exclusivo; com outros usuários conectados
+            # seguimos no modo atual em vez de falhar.
+            if not is_lock_error(e):
+                raise
+            print(f"Não foi possível mudar journal_mode para {self.journal_mode}: {e}")
+
+    def _open_writer(self):
+        if self.read_only:
+            raise ReadOnlyDatabaseError("O banco de dados está aberto em modo somente leitura.")
+        conn = self._connect()
+        try:
+            self._apply_journal_mode(conn)
+            # Garante que o lock de escrita pode ser obtido antes de entregar a conexão
+            self.with_retries(lambda: conn.execute("BEGIN IMMEDIATE;"))
+            conn.rollback()
+        except Exception:
+            conn.close()
+            raise
+        print("Conexão em modo leitura-escrita estabelecida.")
+        return conn
+
+    # -------------------- Empréstimo --------------------
+    def reader(self):
+        """Retorna um context manager com a conexão de leitura da thread atual."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "generation", None) != self._generation:
+            # A conexão invalidada por close_all() é fechada aqui, pela thread dona
+            self.close_thread_reader()
+            conn = self._connect(read_only=self.read_only)
+            self._local.conn = conn
+            self._local.generation = self._generation
+            if getattr(self._local, "dona", None) is None:
+                self._local.dona = _Dona()
+            with self._lock:
+                self._readers.append((weakref.ref(self._local.dona), conn))
+        with self._lock:
+            self._stats["reader_acquisitions"] += 1
+        return _ReaderLease(conn)
+
+    def writer(self):
+        """Retorna um context manager com a conexão de escrita compartilhada."""
+        return _WriterLease(self)
+
+    def _acquire_writer(self):
+        if not self._writer_lock.acquire(blocking=False):
+            inicio = time.perf_counter()
+            self._writer_lock.acquire()
+            with self._lock:
+                self._stats["writer_waits"] += 1
+                self._stats["writer_wait_seconds"] += time.perf_counter() - inicio
+        try:
+            if self._writer is None:
+                self._writer = self._open_writer()
+        except Exception:
+            self._writer_lock.release()
+            raise
+        with self._lock:
+            self._stats["writer_acquisitions"] += 1
+        return self._writer
+
+    def _release_writer(self):
+        self._writer_lock.release()
+
+    # -------------------- Manutenção --------------------
+    def close_thread_reader(self):
+        """Fecha a conexão de leitura da thread atual (chame antes de a thread terminar)."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            return
+        self._local.conn = None
+        with self._lock:
+            self._readers = [(dona, c) for dona, c in self._readers if c is not conn]
+        conn.close()
+
+    def close_all(self):
+        """
+        Fecha a conexão de escrita, a de leitura da thread atual e as de threads
+        já encerradas, e invalida as demais, que cada thread fecha no próximo
+        uso. Novas conexões são criadas sob demanda.
+        """
+        with self._writer_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+        self.close_thread_reader()
+        with self._lock:
+            self._generation += 1
+            encerradas = [c for dona, c in self._readers if dona() is None]
+            self._readers = [(dona, c) for dona, c in self._readers if dona() is not None]
+        # Nenhuma outra thread usa mais essas conexões
+        for conn in encerradas:
+            conn.close()
+
+    def reconfigure(self, path):
+        """Aponta o pool para outro arquivo de banco, descartando as conexões atuais."""
+        self.close_all()
+        self.path = path
+        self.read_only = False
+
+    def configure(self, journal_mode=None, timeout=None, retries=None, retry_delay=None):
+        """Ajusta o modo de journal e a política de espera; vale para as próximas conexões."""
+        self.close_all()
+        if journal_mode is not None:
+            self.journal_mode = journal_mode.upper()
+        if timeout is not None:
+            self.timeout = timeout
+        if retries is not None:
+            self.retries = retries
+        if retry_delay is not None:
+            self.retry_delay = retry_delay
+
+    def set_read_only(self, read_only):
+        """Liga/desliga o modo somente leitura, reabrindo as conexões de acordo."""
+        self.close_all()
+        self.read_only = read_only
+
+    def stats(self):
+        """Retorna um dicionário com as estatísticas de uso do pool."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["open_readers"] = len(self._readers)
+        stats["writer_open"] = self._writer is not None
+        stats["read_only"] = self.read_only
+        stats["journal_mode"] = self.journal_mode
+        stats["path"] = self.path
+        return stats
+
+
+class _ReaderLease:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        # Leituras não devem deixar transações abertas segurando o lock compartilhado
+        if self.conn.in_transaction:
+            self.conn.rollback()
+        return False
+
+
+class _WriterLease:
+    def __init__(self, pool):
+        self.pool = pool
+        self.conn = None
+
+    def __enter__(self):
+        self.conn = self.pool._acquire_writer()
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self.conn.commit()
+            else:
+                self.conn.rollback()
+        finally:
+            self.pool._release_writer()
+        return False
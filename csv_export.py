@@ -0,0 +1,160 @@
+"""
+Exportação do banco para CSV em streaming.
+
+A exportação lê de um instantâneo do banco, feito com a API de backup
+(backup.copiar_banco) numa pasta temporária: diretórios e itens saem do
+mesmo instante sem manter uma transação de leitura aberta no banco
+compartilhado, o que bloquearia quem grava durante toda a exportação.
+
+As linhas são lidas do cursor em blocos (fetchmany) e gravadas por um
+arquivo com buffer grande, sem carregar as tabelas na memória. O arquivo é
+escrito num ".part" e só substitui o destino quando a exportação termina,
+então um cancelamento ou erro não deixa um CSV pela metade.
+
+O formato é o lido por MainWindow.import_csv: seção "=== DIRECTORIES ===",
+linha em branco e seção "=== ITEMS ===", cada uma com o cabeçalho das colunas.
+"""
+import csv
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from PyQt5.QtCore import QThread, pyqtSignal
+
+from backup import BackupCancelled, copiar_banco
+
+# Linhas lidas do cursor por vez
+CHUNK_SIZE = 5000
+# Buffer do arquivo de saída (bytes)
+WRITE_BUFFER = 1 << 20
+
+_SUBTREE = "SELECT descendant_id FROM directory_closure WHERE ancestor_id = ?"
+
+
+class ExportCancelled(Exception):
+    pass
+
+
+def _colunas(conn, tabela, excluir=()):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({tabela})") if row[1] not in excluir]
+
+
+def _consultas(conn, directory_id, incluir_caminhos):
+    """Retorna [(seção, cabeçalho, sql, parâmetros)] das duas seções."""
+    # O caminho materializado só sai quando pedido; import_csv lê as colunas pela posição
+    dir_columns = _colunas(conn, "directories", excluir=() if incluir_caminhos else ("path",))
+    item_columns = _colunas(conn, "items")
+    dir_select = ", ".join(f"d.{c}" for c in dir_columns)
+    item_select = ", ".join(f"i.{c}" for c in item_columns)
+    item_header = list(item_columns)
+    item_join = ""
+    if incluir_caminhos:
+        item_select += ", d.path"
+        item_header.append("directory_path")
+        item_join = " LEFT JOIN directories d ON d.id = i.directory_id"
+    dir_where = item_where = ""
+    params = ()
+    if directory_id is not None:
+        dir_where = f" WHERE d.id IN ({_SUBTREE})"
+        item_where = f" WHERE i.directory_id IN ({_SUBTREE})"
+        params = (directory_id,)
+    return [
+        ("=== DIRECTORIES ===", dir_columns,
+         f"SELECT {dir_select} FROM directories d{dir_where} ORDER BY d.id", params),
+        ("=== ITEMS ===", item_header,
+         f"SELECT {item_select} FROM items i{item_join}{item_where} ORDER BY i.id", params),
+    ]
+
+
+def exportar_csv(path, directory_id=None, incluir_caminhos=False, progresso=None, cancelado=None):
+    """
+    Exporta diretórios e itens para path. directory_id limita a exportação à
+    subárvore desse diretório; incluir_caminhos acrescenta o caminho completo
+    dos diretórios (coluna path) e dos itens (coluna directory_path).
+    progresso(linhas, total) é chamado a cada bloco e cancelado() é
+    consultado durante o instantâneo e entre os blocos (levanta ExportCancelled).
+    Retorna o número de linhas exportadas.
+    """
+    temporario = path + ".part"
+    try:
+        # Instantâneo local: as consultas não seguram lock no banco compartilhado
+        with tempfile.TemporaryDirectory() as pasta:
+            instantaneo = os.path.join(pasta, "export.db")
+            try:
+                copiar_banco(instantaneo, cancelado=cancelado)
+            except BackupCancelled:
+                raise ExportCancelled()
+            conn = sqlite3.connect(instantaneo)
+            try:
+                exportadas = _gravar(conn, temporario, directory_id, incluir_caminhos, progresso, cancelado)
+            finally:
+                conn.close()
+        os.replace(temporario, path)
+    except BaseException:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+        raise
+    return exportadas
+
+
+def _gravar(conn, temporario, directory_id, incluir_caminhos, progresso, cancelado):
+    """Grava as duas seções lidas de conn em temporario; retorna o número de linhas."""
+    exportadas = 0
+    consultas = _consultas(conn, directory_id, incluir_caminhos)
+    total = sum(conn.execute(f"SELECT COUNT(*) FROM ({sql})", params).fetchone()[0]
+                for _, _, sql, params in consultas)
+    if progresso:
+        progresso(0, total)
+    with open(temporario, "w", newline="", encoding="utf-8", buffering=WRITE_BUFFER) as f:
+        writer = csv.writer(f)
+        for numero, (secao, cabecalho, sql, params) in enumerate(consultas):
+            if numero:
+                writer.writerow([])
+            writer.writerow([secao])
+            writer.writerow(cabecalho)
+            cursor = conn.execute(sql, params)
+            while True:
+                if cancelado and cancelado():
+                    raise ExportCancelled()
+                linhas = cursor.fetchmany(CHUNK_SIZE)
+                if not linhas:
+                    break
+                writer.writerows(linhas)
+                exportadas += len(linhas)
+                if progresso:
+                    progresso(exportadas, total)
+    return exportadas
+
+
+class CsvExportWorker(QThread):
+    """Roda exportar_csv fora do thread da interface."""
+    # (linhas exportadas, total)
+    progress = pyqtSignal(int, int)
+    # (linhas exportadas, segundos)
+    completed = pyqtSignal(int, float)
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
+
+    def __init__(self, path, directory_id=None, include_paths=False, parent=None):
+        super().__init__(parent)
+        self.path = path
+        self.directory_id = directory_id
+        self.include_paths = include_paths
+        self._cancel = threading.Event()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def run(self):
+        inicio = time.perf_counter()
+        try:
+            linhas = exportar_csv(self.path, self.directory_id, self.include_paths,
+                                  progresso=self.progress.emit, cancelado=self._cancel.is_set)
+        except ExportCancelled:
+            self.cancelled.emit()
+        except Exception as e:
+            self.failed.emit(str(e))
+        else:
+            self.completed.emit(linhas, time.perf_counter() - inicio)
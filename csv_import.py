@@ -0,0 +1,270 @@
+"""
+Importação em massa de CSV no formato gerado por csv_export.
+
+O arquivo é lido linha a linha. Os diretórios (poucos) são guardados para
+serem inseridos na ordem pai -> filho, com ids novos já reservados, e os
+itens são inseridos em lotes com executemany, tudo numa única transação:
+um erro inesperado ou um cancelamento desfaz a importação inteira.
+
+Linhas inválidas (id ou quantidade que não são números, título vazio,
+diretório desconhecido) não interrompem a importação: são puladas e
+listadas no relatório de erros do resultado.
+
+Em cargas grandes os índices secundários de items e os triggers de inserção
+do índice de busca e dos contadores por diretório são removidos durante a
+carga e recriados/recalculados numa passada no final.
+"""
+import csv
+import threading
+import time
+from collections import namedtuple
+
+from PyQt5.QtCore import QThread, pyqtSignal
+
+from database import obter_conexao
+from directory_stats import reconstruir_estatisticas
+from search_index import indice_disponivel, indexar_itens
+
+DIRECTORIES_SECTION = "=== DIRECTORIES ==="
+ITEMS_SECTION = "=== ITEMS ==="
+# Itens por executemany
+BATCH_SIZE = 5000
+# A partir de quantas linhas os índices e triggers de items são recriados no final
+LARGE_IMPORT_ROWS = 20000
+# Triggers de inserção em items desligados durante cargas grandes
+_INSERT_TRIGGERS = ("items_fts_insert", "directory_stats_item_insert")
+
+# Colunas usadas e a posição delas em arquivos sem cabeçalho reconhecível
+_DIR_COLUMNS = {"id": 0, "name": 1, "parent_id": 2}
+_ITEM_COLUMNS = {"id": 0, "title": 1, "responsible": 2, "quantity": 3, "description": 4, "image_path": 5,
+                 "directory_id": 6}
+
+# errors: lista de (linha do arquivo, mensagem)
+ImportResult = namedtuple("ImportResult", "directories items errors")
+
+
+class ImportCancelled(Exception):
+    pass
+
+
+class InvalidCsvError(Exception):
+    pass
+
+
+def _posicoes(cabecalho, padrao):
+    nomes = [nome.strip().lower() for nome in cabecalho]
+    if all(coluna in nomes for coluna in padrao):
+        return {coluna: nomes.index(coluna) for coluna in padrao}
+    return dict(padrao)
+
+
+def _campo(row, posicoes, coluna):
+    posicao = posicoes[coluna]
+    return row[posicao] if posicao < len(row) else ""
+
+
+def _inteiro(texto, descricao):
+    texto = texto.strip()
+    if not texto:
+        return None
+    try:
+        return int(texto)
+    except ValueError:
+        raise ValueError(f"invalid {descricao} {texto!r}") from None
+
+
+def _contar_linhas(path):
+    with open(path, "rb") as f:
+        return sum(1 for _ in f)
+
+
+def _ordenar_diretorios(diretorios, erros):
+    """
+    Retorna [(id antigo, nome, id antigo do pai)] com cada pai antes dos filhos.
+    Pais ausentes do arquivo viram raiz; diretórios presos em ciclos vão para erros.
+    """
+    filhos = {}
+    for old_id, (linha, nome, parent_id) in diretorios.items():
+        raiz = parent_id is None or parent_id not in diretorios
+        filhos.setdefault(None if raiz else parent_id, []).append(old_id)
+    ordem = []
+    pilha = list(reversed(filhos.get(None, [])))
+    while pilha:
+        old_id = pilha.pop()
+        linha, nome, parent_id = diretorios[old_id]
+        ordem.append((old_id, nome, parent_id if parent_id in diretorios else None))
+        pilha.extend(reversed(filhos.get(old_id, [])))
+    alcancados = {old_id for old_id, _, _ in ordem}
+    for old_id, (linha, _, _) in diretorios.items():
+        if old_id not in alcancados:
+            erros.append((linha, f"directory {old_id} is part of a parent cycle"))
+    return ordem
+
+
+def _proximo_id(conn, tabela):
+    """
+    Primeiro id nunca usado em tabela (AUTOINCREMENT): acima do maior id atual
+    e do último já entregue (sqlite_sequence), para não reaproveitar ids de
+    registros excluídos que o diário de desfazer ainda pode restaurar.
+    Ids explícitos maiores atualizam sqlite_sequence sozinhos.
+    """
+    return conn.execute(f"""
+        SELECT MAX(COALESCE((SELECT MAX(id) FROM {tabela}), 0),
+                   COALESCE((SELECT seq FROM sqlite_sequence WHERE name = ?), 0)) + 1
+    """, (tabela,)).fetchone()[0]
+
+
+def _remover_para_carga(conn):
+    """Remove índices secundários e triggers de inserção de items; retorna os SQLs para recriá-los."""
+    nomes = ", ".join("?" for _ in _INSERT_TRIGGERS)
+    objetos = conn.execute(f"""
+        SELECT type, name, sql FROM sqlite_master
+         WHERE sql IS NOT NULL
+           AND ((type = 'index' AND tbl_name = 'items') OR (type = 'trigger' AND name IN ({nomes})))
+    """, _INSERT_TRIGGERS).fetchall()
+    for tipo, nome, _ in objetos:
+        conn.execute(f"DROP {tipo.upper()} {nome}")
+    return objetos
+
+
+def _recriar_apos_carga(conn, objetos, primeiro_item_id):
+    for _, _, sql in objetos:
+        conn.execute(sql)
+    nomes = {nome for _, nome, _ in objetos}
+    if "items_fts_insert" in nomes and indice_disponivel(conn):
+        indexar_itens(conn, primeiro_item_id)
+    if "directory_stats_item_insert" in nomes:
+        reconstruir_estatisticas(conn)
+
+
+def importar_csv(path, progresso=None, cancelado=None):
+    """
+    Importa diretórios e itens de path como novos registros (os ids do arquivo
+    só ligam itens e subdiretórios aos diretórios do próprio arquivo).
+    progresso(linhas lidas, total de linhas) é chamado a cada lote e cancelado()
+    consultado entre os lotes (levanta ImportCancelled). Levanta InvalidCsvError
+    se faltarem as seções. Retorna um ImportResult.
+    """
+    total = _contar_linhas(path)
+    erros = []
+    diretorios = {}
+    id_map = {}
+    itens_importados = 0
+    lidas = 0
+
+    def avancar():
+        if cancelado and cancelado():
+            raise ImportCancelled()
+        if progresso:
+            progresso(lidas, total)
+
+    with obter_conexao() as conn, open(path, "r", newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        secao = None
+        posicoes = None
+        lote = []
+        objetos_removidos = None
+        primeiro_item_id = None
+        for row in reader:
+            lidas += 1
+            linha = reader.line_num
+            if lidas % BATCH_SIZE == 0:
+                avancar()
+            if row == [DIRECTORIES_SECTION]:
+                secao, posicoes = "directories", None
+                continue
+            if row == [ITEMS_SECTION]:
+                if secao != "directories":
+                    raise InvalidCsvError("Invalid CSV format (missing sections).")
+                # Todos os diretórios lidos: grava-os antes do primeiro item
+                primeiro_dir_id = _proximo_id(conn, "directories")
+                ordem = _ordenar_diretorios(diretorios, erros)
+                for novo_id, (old_id, _, _) in enumerate(ordem, primeiro_dir_id):
+                    id_map[old_id] = novo_id
+                conn.executemany(
+                    "INSERT INTO directories (id, name, parent_id) VALUES (?, ?, ?)",
+                    [(id_map[old_id], nome, id_map.get(parent_id)) for old_id, nome, parent_id in ordem],
+                )
+                primeiro_item_id = _proximo_id(conn, "items")
+                if total >= LARGE_IMPORT_ROWS:
+                    objetos_removidos = _remover_para_carga(conn)
+                secao, posicoes = "items", None
+                continue
+            if not row or not any(campo.strip() for campo in row):
+                continue
+            if secao is None:
+                continue
+            if posicoes is None:
+                posicoes = _posicoes(row, _DIR_COLUMNS if secao == "directories" else _ITEM_COLUMNS)
+                continue
+            try:
+                if secao == "directories":
+                    old_id = _inteiro(_campo(row, posicoes, "id"), "directory id")
+                    nome = _campo(row, posicoes, "name").strip()
+                    if old_id is None or not nome:
+                        raise ValueError("directory id and name are required")
+                    if old_id in diretorios:
+                        raise ValueError(f"duplicate directory id {old_id}")
+                    diretorios[old_id] = (linha, nome, _inteiro(_campo(row, posicoes, "parent_id"), "parent id"))
+                    continue
+                title = _campo(row, posicoes, "title")
+                if not title.strip():
+                    raise ValueError("title is required")
+                quantity = _inteiro(_campo(row, posicoes, "quantity"), "quantity")
+                old_dir = _inteiro(_campo(row, posicoes, "directory_id"), "directory id")
+                if old_dir is not None and old_dir not in id_map:
+                    raise ValueError(f"unknown directory {old_dir}")
+            except ValueError as e:
+                erros.append((linha, str(e)))
+                continue
+            lote.append((title, _campo(row, posicoes, "responsible"), quantity,
+                         _campo(row, posicoes, "description"), _campo(row, posicoes, "image_path"),
+                         id_map.get(old_dir)))
+            if len(lote) >= BATCH_SIZE:
+                conn.executemany("""
+                    INSERT INTO items (title, responsible, quantity, description, image_path, directory_id)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                """, lote)
+                itens_importados += len(lote)
+                lote = []
+        if secao != "items":
+            raise InvalidCsvError("Invalid CSV format (missing sections).")
+        if lote:
+            conn.executemany("""
+                INSERT INTO items (title, responsible, quantity, description, image_path, directory_id)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, lote)
+            itens_importados += len(lote)
+        avancar()
+        if objetos_removidos is not None:
+            _recriar_apos_carga(conn, objetos_removidos, primeiro_item_id)
+    return ImportResult(len(id_map), itens_importados, sorted(erros))
+
+
+class CsvImportWorker(QThread):
+    """Roda importar_csv fora do thread da interface."""
+    # (linhas lidas, total de linhas)
+    progress = pyqtSignal(int, int)
+    # (ImportResult, segundos)
+    completed = pyqtSignal(object, float)
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
+
+    def __init__(self, path, parent=None):
+        super().__init__(parent)
+        self.path = path
+        self._cancel = threading.Event()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def run(self):
+        inicio = time.perf_counter()
+        try:
+            resultado = importar_csv(self.path, progresso=self.progress.emit, cancelado=self._cancel.is_set)
+        except ImportCancelled:
+            self.cancelled.emit()
+        except Exception as e:
+            self.failed.emit(str(e))
+        else:
+            self.completed.emit(resultado, time.perf_counter() - inicio)
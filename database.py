@@ -2,6 +2,10 @@ import os
 import sqlite3
 import sys
 
+from config import load_database_config
+from connection_pool import ConnectionPool, is_lock_error
+from migrations import aplicar_migracoes
+
 # Diretório base: se empacotado, usa o diretório do executável; senão, o do script
 BASE_DIR = os.path.dirname(sys.executable) if getattr(sys, "frozen", False) else os.path.dirname(
     os.path.abspath(sys.argv[0]))
@@ -11,76 +15,140 @@ NOME_DB = os.path.join(BASE_DIR, "inventario.db")
 # Diretório padrão de imagens, relativo ao banco
 IMAGES_FOLDER = os.path.join(BASE_DIR, "imagens_originais")
 
+# Pool de conexões reaproveitadas por todo o programa
+_pool = ConnectionPool(NOME_DB)
+
 
 def set_database_path(path):
     """Define o caminho do banco e atualiza o diretório de imagens correspondente."""
     global NOME_DB, IMAGES_FOLDER
     NOME_DB = path
     IMAGES_FOLDER = os.path.join(os.path.dirname(path), "imagens_originais")
+    _pool.reconfigure(path)
+
+
+def configurar_acesso(db_config=None):
+    """
+    Aplica ao pool a configuração de acesso ao banco (modo WAL opcional,
+    busy timeout e política de novas tentativas quando o arquivo está bloqueado).
+    """
+    db_config = db_config or load_database_config()
+    _pool.configure(
+        journal_mode="WAL" if db_config.get("wal") else "DELETE",
+        timeout=db_config.get("busy_timeout_ms", 5000) / 1000,
+        retries=db_config.get("lock_retries", 3),
+        retry_delay=db_config.get("retry_delay_ms", 250) / 1000,
+    )
+
+
+def obter_conexao(somente_leitura=False):
+    """
+    Retorna um context manager com uma conexão do pool, compatível com
+    `with obter_conexao() as conn`. Ao sair do bloco a transação é confirmada
+    (ou desfeita em caso de exceção) e a conexão volta ao pool, sem ser fechada.
+
+    Use somente_leitura=True em consultas: cada thread reutiliza sua própria
+    conexão de leitura e não disputa o lock da conexão de escrita.
+    Se o banco estiver em modo somente leitura, pedir a conexão de escrita
+    levanta ReadOnlyDatabaseError.
+    """
+    if somente_leitura:
+        return _pool.reader()
+    return _pool.writer()
+
 
+def modo_somente_leitura():
+    """Indica se o programa está servindo apenas leituras (lock de escrita indisponível)."""
+    return _pool.read_only
 
-def obter_conexao():
+
+def tentar_modo_escrita():
     """
-    Tenta obter uma conexão em modo leitura-escrita.
-    Se o banco estiver bloqueado, exibe uma mensagem de erro e fecha o programa.
+    Tenta (re)obter o lock de escrita. Se conseguir, sai do modo somente leitura
+    e retorna True; caso contrário permanece (ou entra) em modo somente leitura.
     """
+    _pool.set_read_only(False)
     try:
-        # Tenta abrir a conexão com timeout de 5 segundos
-        conn = sqlite3.connect(NOME_DB, timeout=5, check_same_thread=False)
-        conn.execute("PRAGMA journal_mode=DELETE;")
-        conn.commit()
-        print("Conexão em modo leitura-escrita estabelecida.")
-        return conn
+        with obter_conexao():
+            pass
+        return True
     except sqlite3.OperationalError as e:
-        if "database is locked" in str(e):
-            # Importa QMessageBox para exibir a mensagem de erro
-            from PyQt5.QtWidgets import QMessageBox
-            QMessageBox.critical(None, "Erro", "O banco de dados já está em uso. O programa será fechado.")
-            sys.exit(1)
-        else:
+        if not is_lock_error(e):
             raise
+        print("Lock de escrita indisponível, entrando em modo somente leitura:", e)
+        _pool.set_read_only(True)
+        return False
+
+
+def estatisticas_conexoes():
+    """Retorna as estatísticas do pool de conexões (aberturas, empréstimos, esperas)."""
+    return _pool.stats()
+
+
+def fechar_conexao_leitura():
+    """Fecha a conexão de leitura da thread atual (ex.: ao encerrar uma thread de trabalho)."""
+    _pool.close_thread_reader()
+
+
+def fechar_conexoes():
+    """
+    Fecha as conexões do pool (por exemplo, ao encerrar o programa). As de
+    leitura de outras threads ainda vivas só são invalidadas; pare essas
+    threads antes.
+    """
+    _pool.close_all()
 
 
 def verificar_ou_criar_db():
+    """
+    Cria/verifica as tabelas do banco, aplicando as migrações pendentes
+    (ver migrations.py). Se outro usuário estiver segurando o lock
+    de escrita de um banco já existente, o programa continua em modo somente
+    leitura em vez de ser encerrado.
+    """
     novo_db = not os.path.exists(NOME_DB)
-    # Para criação, usamos uma conexão simples sem lock
-    conn = sqlite3.connect(NOME_DB, check_same_thread=False)
-    conn.execute("PRAGMA journal_mode=DELETE;")
+    configurar_acesso()
     try:
-        cursor = conn.cursor()
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS directories (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                parent_id INTEGER,
-                note TEXT,
-                FOREIGN KEY(parent_id) REFERENCES directories(id)
-            )
-        """)
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS items (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                title TEXT NOT NULL,
-                responsible TEXT,
-                quantity INTEGER,
-                description TEXT,
-                image_path TEXT,
-                directory_id INTEGER,
-                note TEXT,
-                FOREIGN KEY(directory_id) REFERENCES directories(id)
-            )
-        """)
-        if novo_db:
-            cursor.execute("INSERT INTO directories (name, parent_id) VALUES (?, ?)", ("Equipamentos", None))
-        conn.commit()
+        with obter_conexao() as conn:
+            _criar_tabelas(conn, novo_db)
+    except sqlite3.OperationalError as e:
+        if novo_db or not is_lock_error(e):
+            print("Erro ao criar/verificar banco de dados:", e)
+            raise
+        print("Banco bloqueado por outro usuário, abrindo em modo somente leitura:", e)
+        _pool.set_read_only(True)
     except Exception as e:
         print("Erro ao criar/verificar banco de dados:", e)
         raise
-    finally:
-        conn.close()
+
+
+def _criar_tabelas(conn, novo_db):
+    aplicar_migracoes(conn)
+    if novo_db:
+        conn.execute("INSERT INTO directories (name, parent_id) VALUES (?, ?)", ("Equipamentos", None))
 
 
 def criar_pasta_imagens():
     """Cria a pasta para armazenar as imagens, se ela não existir."""
     if not os.path.exists(IMAGES_FOLDER):
         os.makedirs(IMAGES_FOLDER)
+
+
+def remover_imagens(caminhos):
+    """
+    Apaga os arquivos de imagem em caminhos que ficam dentro da pasta de
+    imagens do banco (arquivos de outras pastas nunca são apagados).
+    Retorna quantos arquivos foram apagados.
+    """
+    pasta = os.path.normcase(os.path.abspath(IMAGES_FOLDER))
+    removidos = 0
+    for caminho in caminhos:
+        absoluto = os.path.abspath(caminho)
+        if os.path.dirname(os.path.normcase(absoluto)) != pasta or not os.path.isfile(absoluto):
+            continue
+        try:
+            os.remove(absoluto)
+            removidos += 1
+        except OSError as e:
+            print("Erro ao apagar imagem:", e)
+    return removidos
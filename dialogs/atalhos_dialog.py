@@ -17,7 +17,8 @@ class atalhosDialog(QDialog):
             "Ctrl+L: Selecionar o último item da tabela\n"
             "Ctrl+H: Selecionar o primeiro item da tabela\n"
             "F5: Atualizar diretório e tabela\n"
-            "Ctrl+Z: Desfazer até 5 alterações (inserção ou exclusão)\n"
+            "Ctrl+Z: Desfazer a última alteração (itens, quantidades, movimentações, exclusões)\n"
+            "Ctrl+Y: Refazer a última alteração desfeita\n"
 
         )
         label = QLabel(texto_atalhos)
@@ -27,7 +27,7 @@ class DirectoryDialog(QDialog):
         if self.directory_id:
             # Carrega dados do diretório para edição
             try:
-                with obter_conexao() as conn:
+                with obter_conexao(somente_leitura=True) as conn:
                     cursor = conn.cursor()
                     cursor.execute("""
                         SELECT name, parent_id
@@ -70,6 +70,8 @@ class DirectoryDialog(QDialog):
                         INSERT INTO directories (name, parent_id)
                         VALUES (?, ?)
                     """, (nome, self.parent_directory_id))
+                    # Id do diretório criado, para quem abriu o diálogo
+                    self.directory_id = cursor.lastrowid
                 conn.commit()
             self.accept()
         except Exception as e:
@@ -51,7 +51,7 @@ class ItemDetailDialog(QDialog):
         if not item_id:
             return
         try:
-            with obter_conexao() as conn:
+            with obter_conexao(somente_leitura=True) as conn:
                 cursor = conn.cursor()
                 cursor.execute("""
                     SELECT title, responsible, quantity, description, image_path
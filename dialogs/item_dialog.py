@@ -8,6 +8,7 @@ from PyQt5.QtWidgets import (
     QPushButton, QSpinBox, QFileDialog, QHBoxLayout, QMessageBox, QShortcut
 )
 from database import obter_conexao, IMAGES_FOLDER
+from undo_journal import atualizar, capturar, excluir, iniciar_escrita, inserir, registrar
 
 
 class CopyImageThread(QThread):
@@ -42,6 +43,7 @@ class ItemDialog(QDialog):
         self.setWindowTitle("Item de Inventário")
         self.item_id = item_id
         self.directory_id = directory_id
+        self.new_item_id = None
         self.image_path = None
 
         self.resize(400, 400)
@@ -78,7 +80,7 @@ class ItemDialog(QDialog):
         # Se item_id existe, carregamos dados do items
         if self.item_id:
             try:
-                with obter_conexao() as conn:
+                with obter_conexao(somente_leitura=True) as conn:
                     cursor = conn.cursor()
                     cursor.execute("""
                         SELECT title, responsible, quantity, description, image_path, directory_id
@@ -159,6 +161,9 @@ class ItemDialog(QDialog):
             with obter_conexao() as conn:
                 cursor = conn.cursor()
                 if self.item_id:
+                    colunas = ("title", "responsible", "quantity", "description", "image_path")
+                    iniciar_escrita(conn)
+                    antes = capturar(conn, "items", [self.item_id], colunas)
                     cursor.execute("""
                         UPDATE items
                            SET title = ?,
@@ -168,11 +173,18 @@ class ItemDialog(QDialog):
                                image_path = ?
                          WHERE id = ?
                     """, (title, responsible, quantity, description, self.image_path, self.item_id))
+                    depois = capturar(conn, "items", [self.item_id], colunas)
+                    registrar(conn, f"Edit item '{title}'",
+                              [atualizar("items", antes, depois)], [atualizar("items", depois, antes)])
                 else:
                     cursor.execute("""
                         INSERT INTO items (title, responsible, quantity, description, image_path, directory_id)
                         VALUES (?, ?, ?, ?, ?, ?)
                     """, (title, responsible, quantity, description, self.image_path, self.directory_id))
+                    # Id do item criado, para quem abriu o diálogo
+                    self.new_item_id = cursor.lastrowid
+                    linhas = capturar(conn, "items", [self.new_item_id])
+                    registrar(conn, f"Add item '{title}'", [excluir("items", linhas)], [inserir("items", linhas)])
                 conn.commit()
             self.accept()
         except Exception as e:
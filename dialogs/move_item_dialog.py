@@ -33,30 +33,35 @@ class MoveItemDialog(QDialog):
 
     def load_directories(self, current_directory_id):
         try:
-            with obter_conexao() as conn:
+            with obter_conexao(somente_leitura=True) as conn:
                 cursor = conn.cursor()
                 cursor.execute("SELECT id, name, parent_id FROM directories")
                 rows = cursor.fetchall()
-            dirs = {row[0]: (row[1], row[2]) for row in rows}
-
-            def add_children(parent_item, parent_id):
-                for d_id, (d_name, d_parent) in dirs.items():
-                    if d_parent == parent_id:
-                        item = QTreeWidgetItem([d_name])
-                        item.setData(0, Qt.UserRole, d_id)
-                        parent_item.addChild(item)
-                        add_children(item, d_id)
-
-            root_item = self.tree.invisibleRootItem()
-            for d_id, (d_name, d_parent) in dirs.items():
-                if d_parent is None:
-                    item = QTreeWidgetItem([d_name])
-                    item.setData(0, Qt.UserRole, d_id)
-                    root_item.addChild(item)
-                    add_children(item, d_id)
+            self.build_tree(rows)
             self.tree.expandAll()
         except Exception as e:
             QMessageBox.critical(self, "Erro", f"Erro ao carregar diretórios: {e}")
 
+    def build_tree(self, rows):
+        """
+        Monta os itens da árvore a partir das linhas (id, name, parent_id) em
+        uma passada, sem recursão (árvores profundas não estouram a pilha).
+        """
+        children = {}
+        for d_id, d_name, d_parent in rows:
+            children.setdefault(d_parent, []).append((d_id, d_name))
+        stack = [(self.tree.invisibleRootItem(), None)]
+        while stack:
+            parent_item, parent_id = stack.pop()
+            created = []
+            for d_id, d_name in children.get(parent_id, ()):
+                item = QTreeWidgetItem([d_name])
+                item.setData(0, Qt.UserRole, d_id)
+                created.append(item)
+                if d_id in children:
+                    stack.append((item, d_id))
+            if created:
+                parent_item.addChildren(created)
+
     def on_item_selected(self, item, column):
         self.selected_directory_id = item.data(0, Qt.UserRole)
@@ -6,7 +6,7 @@ from notes_utils import load_warnings_config, save_warnings_config, get_director
 
 
 class NotesListDialog(QDialog):
-    def __init__(self, notes):
+    def __init__(self):
         super().__init__()
         self.setWindowTitle("All Notes")
         self.resize(600, 400)
@@ -18,45 +18,30 @@ class NotesListDialog(QDialog):
         self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Interactive)
         layout.addWidget(self.table)
 
-        self.populate_table(notes)
+        self.populate_table()
         self.load_config()
 
-    def populate_table(self, notes):
+    def populate_table(self):
         dir_paths = get_directory_paths()
-        items = []
-        # As keys devem estar no formato "dir_X" para diretórios ou "item_X" para itens.
-        for key, value in notes.items():
-            note_text = value.get("text", "")
-            if key.startswith("dir_"):
-                type_str = "Directory"
-                try:
-                    dir_id = int(key.split("_")[1])
-                except Exception:
-                    dir_id = None
-                path = dir_paths.get(dir_id, "Unknown") if dir_id is not None else "Unknown"
-                items.append((type_str, key, path, note_text))
-            elif key.startswith("item_"):
-                type_str = "Item"
-                try:
-                    item_id = int(key.split("_")[1])
-                except Exception:
-                    item_id = None
-                directory_id = None
-                if item_id is not None:
-                    with obter_conexao() as conn:
-                        cursor = conn.cursor()
-                        cursor.execute("SELECT directory_id FROM items WHERE id = ?", (item_id,))
-                        res = cursor.fetchone()
-                        if res:
-                            directory_id = res[0]
-                path = dir_paths.get(directory_id, "Unknown") if directory_id is not None else "Unknown"
-                items.append((type_str, key, path, note_text))
-        self.table.setRowCount(len(items))
-        for i, (type_str, key, path, note_text) in enumerate(items):
+        # Uma única consulta: o diretório de cada nota de item vem do LEFT JOIN com items
+        with obter_conexao(somente_leitura=True) as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT n.entity_type, n.entity_id, n.text,
+                       CASE WHEN n.entity_type = 'dir' THEN n.entity_id ELSE i.directory_id END
+                  FROM notes n
+                  LEFT JOIN items i ON n.entity_type = 'item' AND i.id = n.entity_id
+                 ORDER BY n.entity_type, n.entity_id
+            """)
+            rows = cursor.fetchall()
+        self.table.setRowCount(len(rows))
+        for i, (entity_type, entity_id, note_text, directory_id) in enumerate(rows):
+            type_str = "Directory" if entity_type == "dir" else "Item"
+            path = dir_paths.get(directory_id, "Unknown") if directory_id is not None else "Unknown"
             self.table.setItem(i, 0, QTableWidgetItem(type_str))
-            self.table.setItem(i, 1, QTableWidgetItem(key))
+            self.table.setItem(i, 1, QTableWidgetItem(f"{entity_type}_{entity_id}"))
             self.table.setItem(i, 2, QTableWidgetItem(path))
-            self.table.setItem(i, 3, QTableWidgetItem(note_text))
+            self.table.setItem(i, 3, QTableWidgetItem(note_text or ""))
 
     def load_config(self):
         """
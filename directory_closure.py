@@ -0,0 +1,163 @@
+"""
+Tabela de fechamento (closure table) da hierarquia de diretórios.
+
+directory_closure guarda um par (ancestral, descendente, profundidade) para
+cada diretório e todos os seus ancestrais, incluindo o próprio diretório com
+profundidade 0. Assim "todos os itens da subárvore", contagens e exclusões de
+subárvore viram um único JOIN indexado, sem CTEs recursivas.
+A tabela é mantida por triggers em directories (inserção, mudança de
+parent_id e exclusão) e pode ser reconstruída com reconstruir_closure().
+
+A coluna directories.path guarda o caminho completo ("Raiz/Sub/Dir") de cada
+diretório, também mantido por triggers: renomear ou mover um diretório
+reescreve o prefixo de toda a subárvore, achada pela tabela de fechamento.
+"""
+
+CREATE_TABLE = """
+    CREATE TABLE IF NOT EXISTS directory_closure (
+        ancestor_id INTEGER NOT NULL,
+        descendant_id INTEGER NOT NULL,
+        depth INTEGER NOT NULL,
+        PRIMARY KEY (ancestor_id, descendant_id)
+    ) WITHOUT ROWID
+"""
+
+CREATE_INDEX = """
+    CREATE INDEX IF NOT EXISTS idx_directory_closure_descendant
+        ON directory_closure(descendant_id, depth)
+"""
+
+TRIGGER_INSERT = """
+    CREATE TRIGGER IF NOT EXISTS directory_closure_insert
+    AFTER INSERT ON directories
+    BEGIN
+        INSERT INTO directory_closure (ancestor_id, descendant_id, depth)
+        VALUES (NEW.id, NEW.id, 0);
+        INSERT INTO directory_closure (ancestor_id, descendant_id, depth)
+        SELECT ancestor_id, NEW.id, depth + 1
+          FROM directory_closure
+         WHERE descendant_id = NEW.parent_id;
+    END
+"""
+
+# BEFORE: os caminhos já estão corretos quando triggers AFTER UPDATE (ou o
+# próprio UPDATE) precisarem consultar a hierarquia nova.
+TRIGGER_MOVE = """
+    CREATE TRIGGER IF NOT EXISTS directory_closure_move
+    BEFORE UPDATE OF parent_id ON directories
+    WHEN OLD.parent_id IS NOT NEW.parent_id
+    BEGIN
+        SELECT RAISE(ABORT, 'cannot move a directory into its own subtree')
+         WHERE EXISTS (SELECT 1 FROM directory_closure
+                        WHERE ancestor_id = NEW.id AND descendant_id = NEW.parent_id);
+        DELETE FROM directory_closure
+         WHERE descendant_id IN (SELECT descendant_id FROM directory_closure WHERE ancestor_id = NEW.id)
+           AND ancestor_id NOT IN (SELECT descendant_id FROM directory_closure WHERE ancestor_id = NEW.id);
+        INSERT INTO directory_closure (ancestor_id, descendant_id, depth)
+        SELECT a.ancestor_id, d.descendant_id, a.depth + d.depth + 1
+          FROM directory_closure a
+          JOIN directory_closure d ON d.ancestor_id = NEW.id
+         WHERE a.descendant_id = NEW.parent_id;
+    END
+"""
+
+TRIGGER_DELETE = """
+    CREATE TRIGGER IF NOT EXISTS directory_closure_delete
+    AFTER DELETE ON directories
+    BEGIN
+        DELETE FROM directory_closure WHERE descendant_id = OLD.id;
+    END
+"""
+
+
+TRIGGER_PATH_INSERT = """
+    CREATE TRIGGER IF NOT EXISTS directory_path_insert
+    AFTER INSERT ON directories
+    BEGIN
+        UPDATE directories
+           SET path = COALESCE((SELECT path FROM directories WHERE id = NEW.parent_id) || '/', '') || NEW.name
+         WHERE id = NEW.id;
+    END
+"""
+
+# AFTER: a closure já reflete o novo pai (trigger BEFORE acima)
+TRIGGER_PATH_UPDATE = """
+    CREATE TRIGGER IF NOT EXISTS directory_path_update
+    AFTER UPDATE OF name, parent_id ON directories
+    WHEN OLD.name IS NOT NEW.name OR OLD.parent_id IS NOT NEW.parent_id
+    BEGIN
+        UPDATE directories
+           SET path = COALESCE((SELECT path FROM directories WHERE id = NEW.parent_id) || '/', '') || NEW.name
+                      || substr(path, length(OLD.path) + 1)
+         WHERE id IN (SELECT descendant_id FROM directory_closure WHERE ancestor_id = NEW.id);
+    END
+"""
+
+
+def criar_closure(conn):
+    """Cria a tabela, o índice e os triggers (sem popular a tabela)."""
+    for sql in (CREATE_TABLE, CREATE_INDEX, TRIGGER_INSERT, TRIGGER_MOVE, TRIGGER_DELETE):
+        conn.execute(sql)
+
+
+def reconstruir_closure(conn):
+    """
+    Recalcula toda a tabela de fechamento a partir de directories.parent_id.
+    Ciclos eventualmente gravados por versões antigas são cortados pelo limite
+    de profundidade. Retorna o número de pares gravados.
+    """
+    conn.execute("DELETE FROM directory_closure")
+    conn.execute("""
+        INSERT OR IGNORE INTO directory_closure (ancestor_id, descendant_id, depth)
+        WITH RECURSIVE c(ancestor_id, descendant_id, depth) AS (
+            SELECT id, id, 0 FROM directories
+            UNION ALL
+            SELECT c.ancestor_id, d.id, c.depth + 1
+              FROM c
+              JOIN directories d ON d.parent_id = c.descendant_id
+             WHERE c.depth < (SELECT COUNT(*) FROM directories)
+        )
+        SELECT ancestor_id, descendant_id, MIN(depth)
+          FROM c
+         GROUP BY ancestor_id, descendant_id
+    """)
+    return conn.execute("SELECT COUNT(*) FROM directory_closure").fetchone()[0]
+
+
+def criar_caminhos(conn):
+    """Cria a coluna directories.path (se ainda não existir) e os triggers que a mantêm."""
+    colunas = [row[1] for row in conn.execute("PRAGMA table_info(directories)")]
+    if "path" not in colunas:
+        conn.execute("ALTER TABLE directories ADD COLUMN path TEXT")
+    for sql in (TRIGGER_PATH_INSERT, TRIGGER_PATH_UPDATE):
+        conn.execute(sql)
+
+
+def reconstruir_caminhos(conn):
+    """
+    Recalcula directories.path a partir de parent_id. Diretórios cujo pai não
+    existe são tratados como raiz; os presos em ciclos ficam só com o nome.
+    Retorna o número de diretórios atualizados.
+    """
+    conn.execute("DROP TABLE IF EXISTS temp.directory_paths")
+    conn.execute("CREATE TEMP TABLE directory_paths (id INTEGER PRIMARY KEY, path TEXT)")
+    conn.execute("""
+        INSERT OR IGNORE INTO temp.directory_paths (id, path)
+        WITH RECURSIVE p(id, path, depth) AS (
+            SELECT id, name, 0
+              FROM directories
+             WHERE parent_id IS NULL OR parent_id NOT IN (SELECT id FROM directories)
+            UNION ALL
+            SELECT d.id, p.path || '/' || d.name, p.depth + 1
+              FROM p
+              JOIN directories d ON d.parent_id = p.id
+             WHERE p.depth < (SELECT COUNT(*) FROM directories)
+        )
+        SELECT id, path FROM p
+    """)
+    cursor = conn.execute("""
+        UPDATE directories
+           SET path = COALESCE((SELECT path FROM temp.directory_paths WHERE directory_paths.id = directories.id), name)
+    """)
+    conn.execute("DROP TABLE temp.directory_paths")
+    return cursor.rowcount
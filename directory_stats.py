@@ -0,0 +1,164 @@
+"""
+Contadores agregados por diretório: quantidade de itens, soma das
+quantidades e itens com imagem.
+
+directory_stats guarda, para cada diretório, os totais dos itens do próprio
+diretório (item_count, total_quantity, image_count) e os da subárvore inteira
+(subtree_*). Triggers em items ajustam o diretório do item e todos os seus
+ancestrais (via directory_closure); mover um diretório transfere os totais da
+subárvore dos ancestrais antigos para os novos. reconstruir_estatisticas()
+recalcula tudo numa passada para bancos existentes ou contadores divergentes.
+"""
+
+CREATE_TABLE = """
+    CREATE TABLE IF NOT EXISTS directory_stats (
+        directory_id INTEGER PRIMARY KEY,
+        item_count INTEGER NOT NULL DEFAULT 0,
+        total_quantity INTEGER NOT NULL DEFAULT 0,
+        image_count INTEGER NOT NULL DEFAULT 0,
+        subtree_item_count INTEGER NOT NULL DEFAULT 0,
+        subtree_total_quantity INTEGER NOT NULL DEFAULT 0,
+        subtree_image_count INTEGER NOT NULL DEFAULT 0
+    )
+"""
+
+# Contribuição de uma linha de items ({row} = NEW ou OLD) para os contadores
+_QUANTIDADE = "COALESCE({row}.quantity, 0)"
+_IMAGEM = "({row}.image_path IS NOT NULL AND {row}.image_path <> '')"
+
+
+def _ajuste(row, sinal):
+    """UPDATEs que somam (sinal '+') ou subtraem (sinal '-') a linha do diretório e dos ancestrais."""
+    quantidade = _QUANTIDADE.format(row=row)
+    imagem = _IMAGEM.format(row=row)
+    return f"""
+        UPDATE directory_stats
+           SET item_count = item_count {sinal} 1,
+               total_quantity = total_quantity {sinal} {quantidade},
+               image_count = image_count {sinal} {imagem}
+         WHERE directory_id = {row}.directory_id;
+        UPDATE directory_stats
+           SET subtree_item_count = subtree_item_count {sinal} 1,
+               subtree_total_quantity = subtree_total_quantity {sinal} {quantidade},
+               subtree_image_count = subtree_image_count {sinal} {imagem}
+         WHERE directory_id IN (SELECT ancestor_id FROM directory_closure WHERE descendant_id = {row}.directory_id);
+    """
+
+
+TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS directory_stats_item_insert
+    AFTER INSERT ON items
+    BEGIN
+        {_ajuste("NEW", "+")}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS directory_stats_item_delete
+    AFTER DELETE ON items
+    BEGIN
+        {_ajuste("OLD", "-")}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS directory_stats_item_update
+    AFTER UPDATE OF quantity, image_path, directory_id ON items
+    BEGIN
+        {_ajuste("OLD", "-")}
+        {_ajuste("NEW", "+")}
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS directory_stats_directory_insert
+    AFTER INSERT ON directories
+    BEGIN
+        INSERT OR IGNORE INTO directory_stats (directory_id) VALUES (NEW.id);
+    END
+    """,
+    # AFTER: a closure já reflete o novo pai; os ancestrais de OLD.parent_id não mudam
+    """
+    CREATE TRIGGER IF NOT EXISTS directory_stats_directory_move
+    AFTER UPDATE OF parent_id ON directories
+    WHEN OLD.parent_id IS NOT NEW.parent_id
+    BEGIN
+        UPDATE directory_stats
+           SET subtree_item_count = subtree_item_count
+                   - (SELECT subtree_item_count FROM directory_stats WHERE directory_id = NEW.id),
+               subtree_total_quantity = subtree_total_quantity
+                   - (SELECT subtree_total_quantity FROM directory_stats WHERE directory_id = NEW.id),
+               subtree_image_count = subtree_image_count
+                   - (SELECT subtree_image_count FROM directory_stats WHERE directory_id = NEW.id)
+         WHERE directory_id IN (SELECT ancestor_id FROM directory_closure WHERE descendant_id = OLD.parent_id);
+        UPDATE directory_stats
+           SET subtree_item_count = subtree_item_count
+                   + (SELECT subtree_item_count FROM directory_stats WHERE directory_id = NEW.id),
+               subtree_total_quantity = subtree_total_quantity
+                   + (SELECT subtree_total_quantity FROM directory_stats WHERE directory_id = NEW.id),
+               subtree_image_count = subtree_image_count
+                   + (SELECT subtree_image_count FROM directory_stats WHERE directory_id = NEW.id)
+         WHERE directory_id IN (SELECT ancestor_id FROM directory_closure WHERE descendant_id = NEW.parent_id);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS directory_stats_directory_delete
+    AFTER DELETE ON directories
+    BEGIN
+        DELETE FROM directory_stats WHERE directory_id = OLD.id;
+    END
+    """,
+]
+
+
+def criar_estatisticas(conn):
+    """Cria a tabela e os triggers (sem popular a tabela)."""
+    conn.execute(CREATE_TABLE)
+    for trigger in TRIGGERS:
+        conn.execute(trigger)
+
+
+def reconstruir_estatisticas(conn):
+    """
+    Recalcula todos os contadores a partir de items e directory_closure
+    (que deve estar correta). Retorna o número de diretórios.
+    """
+    conn.execute("DELETE FROM directory_stats")
+    conn.execute(f"""
+        INSERT INTO directory_stats (directory_id, item_count, total_quantity, image_count)
+        SELECT d.id, COUNT(i.id), COALESCE(SUM({_QUANTIDADE.format(row="i")}), 0),
+               COALESCE(SUM(CASE WHEN i.id IS NULL THEN 0 ELSE {_IMAGEM.format(row="i")} END), 0)
+          FROM directories d
+          LEFT JOIN items i ON i.directory_id = d.id
+         GROUP BY d.id
+    """)
+    conn.execute("""
+        UPDATE directory_stats
+           SET (subtree_item_count, subtree_total_quantity, subtree_image_count) = (
+               SELECT COALESCE(SUM(s.item_count), 0), COALESCE(SUM(s.total_quantity), 0),
+                      COALESCE(SUM(s.image_count), 0)
+                 FROM directory_closure c
+                 JOIN directory_stats s ON s.directory_id = c.descendant_id
+                WHERE c.ancestor_id = directory_stats.directory_id
+           )
+    """)
+    return conn.execute("SELECT COUNT(*) FROM directory_stats").fetchone()[0]
+
+
+def estatisticas(conn, directory_ids):
+    """
+    Retorna {directory_id: (subtree_item_count, subtree_total_quantity,
+    subtree_image_count, item_count, total_quantity, image_count)}.
+    """
+    result = {}
+    directory_ids = list(directory_ids)
+    # Em lotes, abaixo do limite de parâmetros do SQLite
+    for start in range(0, len(directory_ids), 500):
+        chunk = directory_ids[start:start + 500]
+        placeholders = ", ".join("?" for _ in chunk)
+        for row in conn.execute(f"""
+            SELECT directory_id, subtree_item_count, subtree_total_quantity, subtree_image_count,
+                   item_count, total_quantity, image_count
+              FROM directory_stats
+             WHERE directory_id IN ({placeholders})
+        """, chunk):
+            result[row[0]] = tuple(row[1:])
+    return result
@@ -1,23 +1,31 @@
-import csv
+import datetime
 import json
 import os
 import shutil
+import sqlite3
 import zipfile
 
 from PyQt5 import QtWidgets
-from PyQt5.QtCore import Qt, QPoint, QEvent
+from PyQt5.QtCore import Qt, QPoint, QEvent, QTimer, QStringListModel
 from PyQt5.QtGui import QPalette, QColor
 from PyQt5.QtWidgets import (QAbstractItemView, QHeaderView,
                              QMainWindow, QWidget, QSplitter, QVBoxLayout, QHBoxLayout,
-                             QTreeWidgetItem, QTableWidget, QTableWidgetItem,
+                             QTreeView, QTableView,
                              QPushButton, QFileDialog, QLineEdit, QMessageBox, QDialog, QComboBox, QMenu, QAction,
-                             QColorDialog, QCompleter, QToolButton, QStyle, QFrame, QToolTip)
+                             QColorDialog, QCompleter, QToolButton, QStyle, QFrame, QToolTip, QProgressBar,
+                             QCheckBox, QInputDialog)
 
 from atalhos import setup_shortcuts
-from config import get_config_path
+from backup import BackupWorker, backup_geracao, listar_geracoes, ler_manifesto, restaurar_geracao
+from change_notifier import notifier
+from config import (get_config_path, load_backup_config, load_database_config, load_search_config,
+                    load_undo_config)
+from csv_export import CsvExportWorker
+from csv_import import CsvImportWorker
 from database import (
     verificar_ou_criar_db, criar_pasta_imagens, obter_conexao,
-    NOME_DB, IMAGES_FOLDER, set_database_path
+    set_database_path, estatisticas_conexoes, fechar_conexoes,
+    configurar_acesso, modo_somente_leitura, tentar_modo_escrita, remover_imagens
 )
 from dialogs.atalhos_dialog import atalhosDialog
 from dialogs.directory_dialog import DirectoryDialog
@@ -25,10 +33,24 @@ from dialogs.item_detail_dialog import ItemDetailDialog
 from dialogs.item_dialog import ItemDialog
 from dialogs.notas_dialog import NoteDialog  # Nosso diálogo para notas
 from dialogs.sobre_dialog import sobreDialog
-from notes_utils import load_notes, save_notes, load_appdata_notes
+from directory_closure import reconstruir_caminhos, reconstruir_closure
+from directory_stats import reconstruir_estatisticas
+from notes_utils import notes_store, import_appdata_notes, parse_note_key
+from path_index import PathIndex
+from quantity_buffer import QuantityBuffer, UPDATE_SQL as QUANTITY_UPDATE_SQL
+from query_worker import QueryWorker
+from search_index import montar_busca, indice_disponivel, criar_indice_busca, reconstruir_indice_busca
+from undo_journal import (ConflitoDiario, JournalPruneWorker, alteracoes, atualizar, capturar, descartar, desfazer,
+                          excluir, incrementar, iniciar_escrita, inserir, refazer, registrar, variacoes)
+from widgets import DirectoryTreeModel, ItemsTableModel, QuantityDelegate, TaskProgressDialog
+from widgets.task_progress_dialog import format_duration
+from widgets.items_model import QUANTITY_COLUMN
 
 
 class MainWindow(QMainWindow):
+    # Matches listed by the directory completer popup
+    DIR_COMPLETER_LIMIT = 50
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Inventory")
@@ -36,6 +58,7 @@ class MainWindow(QMainWindow):
         # Create/check DB and images folder
         verificar_ou_criar_db()
         criar_pasta_imagens()
+        import_appdata_notes()
 
         # Load settings (theme, window position, etc.)
         self.load_config()
@@ -43,6 +66,29 @@ class MainWindow(QMainWindow):
         # Setup menu bar
         self.setup_menu()
 
+        # Long export/import/backup job running on its own thread (one at a time)
+        self.background_task = None
+        # Removes undo journal entries older than the retention window
+        self.journal_pruner = None
+        # Why changes are refused even with write access (e.g. a CSV import holds the write lock)
+        self.write_block_reason = None
+
+        # Read queries (tree, items, search) run on this thread; results come back as signals
+        self.query_worker = QueryWorker(self)
+        self.query_worker.resultReady.connect(self.on_query_result)
+        self.query_worker.failed.connect(self.on_query_failed)
+        self.query_worker.busyChanged.connect(self.update_busy_indicator)
+        self.query_worker.start()
+        self.fts_available = False
+
+        self.busy_indicator = QProgressBar()
+        self.busy_indicator.setRange(0, 0)
+        self.busy_indicator.setFixedWidth(120)
+        self.busy_indicator.setMaximumHeight(14)
+        self.busy_indicator.setTextVisible(False)
+        self.busy_indicator.hide()
+        self.statusBar().addPermanentWidget(self.busy_indicator)
+
         # Variables for directory search
         self.current_search_text = ""
         self.current_search_results = []
@@ -59,6 +105,13 @@ class MainWindow(QMainWindow):
             "Search by title, description, responsible or directory..."
         )
         self.search_line_edit.returnPressed.connect(self.search_items)
+        self.search_line_edit.textChanged.connect(self.on_search_text_changed)
+
+        # Search-as-you-type: waits for a pause in typing before querying
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(int(self.search_config.get("debounce_ms", 300)))
+        self.search_timer.timeout.connect(self.search_items)
 
         btn_search = QPushButton("Search")
         btn_search.clicked.connect(self.search_items)
@@ -76,19 +129,35 @@ class MainWindow(QMainWindow):
         main_layout.addWidget(splitter)
 
         # Directory tree
-        self.tree_directories = QtWidgets.QTreeWidget()
-        self.tree_directories.setHeaderLabel("Directories")
+        # Only root directories are read up front; children are fetched when a node is expanded
+        self.tree_model = DirectoryTreeModel(self, worker=self.query_worker)
+        self.tree_model.custom_colors = self.tree_colors
+        self.tree_model.childrenLoaded.connect(self.on_tree_children_loaded)
+        self.tree_model.moveRequested.connect(self.move_directory_to)
+        self.tree_model.errorOccurred.connect(lambda message: QMessageBox.critical(self, "Error", message))
+        self.tree_model.revealed.connect(self.on_directory_revealed)
+        self.tree_expand_all = False
+        self.pending_expand = set(self.expanded_ids)
+        self.tree_select_id = None
+        # Directory paths for the completer and the directory search;
+        # None until the background job delivers them
+        self.dir_index = None
+        # Directories whose indexed paths are being re-read after a change
+        self.dir_index_pending = set()
+        self.dir_completer_model = QStringListModel(self)
+        self.tree_directories = QTreeView()
+        self.tree_directories.setModel(self.tree_model)
         self.tree_directories.setContextMenuPolicy(Qt.CustomContextMenu)
         self.tree_directories.customContextMenuRequested.connect(self.on_tree_context_menu)
-        self.tree_directories.itemClicked.connect(self.on_directory_selected)
+        self.tree_directories.clicked.connect(self.on_directory_selected)
         self.tree_directories.header().setStretchLastSection(False)
-        self.tree_directories.header().setSectionResizeMode(0, QHeaderView.ResizeToContents)
+        self.tree_directories.header().setSectionResizeMode(QHeaderView.ResizeToContents)
         self.tree_directories.setDragEnabled(True)
         self.tree_directories.viewport().setAcceptDrops(True)
         self.tree_directories.setDropIndicatorShown(True)
         self.tree_directories.setDefaultDropAction(Qt.MoveAction)
-        self.tree_directories.setSelectionMode(QtWidgets.QTreeWidget.SingleSelection)
-        self.tree_directories.setDragDropMode(QtWidgets.QTreeWidget.InternalMove)
+        self.tree_directories.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.tree_directories.setDragDropMode(QAbstractItemView.DragDrop)
         self.tree_directories.viewport().installEventFilter(self)
 
         tree_container = QWidget()
@@ -103,13 +172,13 @@ class MainWindow(QMainWindow):
         btn_expand = QToolButton()
         btn_expand.setIcon(self.style().standardIcon(QStyle.SP_ArrowDown))
         btn_expand.setToolTip("Expand All")
-        btn_expand.clicked.connect(self.tree_directories.expandAll)
+        btn_expand.clicked.connect(self.expand_all_directories)
         control_layout.addWidget(btn_expand)
 
         btn_collapse = QToolButton()
         btn_collapse.setIcon(self.style().standardIcon(QStyle.SP_ArrowUp))
         btn_collapse.setToolTip("Collapse All")
-        btn_collapse.clicked.connect(self.tree_directories.collapseAll)
+        btn_collapse.clicked.connect(self.collapse_all_directories)
         control_layout.addWidget(btn_collapse)
 
         control_layout.addStretch()
@@ -132,20 +201,39 @@ class MainWindow(QMainWindow):
         self.dir_search_line_edit = QLineEdit()
         self.dir_search_line_edit.setPlaceholderText("Search Directory...")
         self.dir_search_line_edit.returnPressed.connect(self.search_directory)
+        # The popup shows the ranked matches from dir_index as they are, without QCompleter's own filtering
+        dir_completer = QCompleter(self.dir_completer_model, self)
+        dir_completer.setCompletionMode(QCompleter.UnfilteredPopupCompletion)
+        dir_completer.activated.connect(self.on_dir_completer_activated)
+        self.dir_search_line_edit.setCompleter(dir_completer)
+        self.dir_search_line_edit.textEdited.connect(self.update_dir_completer_matches)
         tree_layout.addWidget(self.dir_search_line_edit)
 
         tree_layout.addWidget(self.tree_directories)
         splitter.addWidget(tree_container)
 
         # Items table
-        self.table_items = QTableWidget()
-        self.table_items.setColumnCount(6)
-        self.table_items.setHorizontalHeaderLabels(["ID", "Title", "Responsible", "Quantity", "Image", "Description"])
-        self.table_items.setEditTriggers(QTableWidget.NoEditTriggers)
+        # The model fetches rows on demand as the view scrolls; quantity +/- is
+        # painted and handled by a delegate instead of a widget per row.
+        self.quantity_buffer = QuantityBuffer(self)
+        self.quantity_buffer.failed.connect(self.on_quantity_flush_failed)
+        # Item counters in the tree (directory_stats) change with every quantity update
+        self.quantity_buffer.flushed.connect(self.tree_model.refresh_stats)
+        self.items_model = ItemsTableModel(self, worker=self.query_worker, quantity_buffer=self.quantity_buffer)
+        # Mutations announce what changed; only the affected rows/nodes are updated
+        notifier.changed.connect(self.on_data_changed)
+        self.items_model.errorOccurred.connect(lambda message: QMessageBox.critical(self, "Error", message))
+        self.items_model.itemLocated.connect(self.on_item_located)
+        self.table_items = QTableView()
+        self.table_items.setModel(self.items_model)
+        self.table_items.setItemDelegateForColumn(QUANTITY_COLUMN, QuantityDelegate(self.table_items))
+        self.table_items.setEditTriggers(QAbstractItemView.NoEditTriggers)
         self.table_items.setContextMenuPolicy(Qt.CustomContextMenu)
         self.table_items.customContextMenuRequested.connect(self.on_table_context_menu)
-        self.table_items.cellDoubleClicked.connect(self.on_item_double_clicked)
-        self.table_items.setSelectionBehavior(QTableWidget.SelectRows)
+        self.table_items.doubleClicked.connect(self.on_item_double_clicked)
+        self.table_items.setSelectionBehavior(QAbstractItemView.SelectRows)
+        # Ctrl/Shift-click selects several rows for the bulk actions of the context menu
+        self.table_items.setSelectionMode(QAbstractItemView.ExtendedSelection)
         self.table_items.horizontalHeader().setSectionsMovable(True)
         self.table_items.setHorizontalScrollBarPolicy(Qt.ScrollBarAsNeeded)
         self.table_items.setHorizontalScrollMode(QAbstractItemView.ScrollPerPixel)
@@ -182,15 +270,15 @@ class MainWindow(QMainWindow):
         button_layout.addWidget(self.btn_add_item)
         main_layout.addLayout(button_layout)
 
+        self.update_read_only_state(notify=True)
+
         # Load tree and table settings
         self.load_tree()
+        self.check_search_index()
         self.restore_table_config()
+        self.prune_undo_journal()
 
-        # Initialize undo stack (max 5 operations)
-        self.undo_stack = []
-        self.max_undo = 5
-
-        # Setup shortcuts (Ctrl+N, Ctrl+L, Ctrl+H, F5, Ctrl+Z)
+        # Setup shortcuts (Ctrl+N, Ctrl+L, Ctrl+H, F5, Ctrl+Z, Ctrl+Y)
         setup_shortcuts(self)
 
     # -------------------- Header Context Menu --------------------
@@ -204,9 +292,9 @@ class MainWindow(QMainWindow):
         action_desc = menu.addAction("Descending")
         action = menu.exec_(header.mapToGlobal(pos))
         if action == action_asc:
-            self.table_items.sortItems(logical_index, Qt.AscendingOrder)
+            self.items_model.sort(logical_index, Qt.AscendingOrder)
         elif action == action_desc:
-            self.table_items.sortItems(logical_index, Qt.DescendingOrder)
+            self.items_model.sort(logical_index, Qt.DescendingOrder)
 
     # -------------------- Shortcut Methods --------------------
     def show_shortcuts(self):
@@ -217,54 +305,118 @@ class MainWindow(QMainWindow):
         dialog = sobreDialog()
         dialog.exec_()
 
+    def show_connection_stats(self):
+        stats = estatisticas_conexoes()
+        text = (
+            f"Database: {stats['path']}\n"
+            f"Journal mode: {stats['journal_mode']}{' (read-only)' if stats['read_only'] else ''}\n"
+            f"Connections opened: {stats['connections_opened']}\n"
+            f"Open reader connections: {stats['open_readers']}\n"
+            f"Writer connection open: {'Yes' if stats['writer_open'] else 'No'}\n"
+            f"Reader acquisitions: {stats['reader_acquisitions']}\n"
+            f"Writer acquisitions: {stats['writer_acquisitions']}\n"
+            f"Writer waits: {stats['writer_waits']} ({stats['writer_wait_seconds']:.3f} s)\n"
+            f"Lock retries: {stats['lock_retries']}"
+        )
+        QMessageBox.information(self, "Connection Statistics", text)
+
+    def show_query_stats(self):
+        stats = self.query_worker.latency_stats()
+        if not stats:
+            QMessageBox.information(self, "Query Statistics", "No queries recorded yet.")
+            return
+        lines = []
+        for kind in sorted(stats):
+            entry = stats[kind]
+            line = f"{kind}: {entry['count']} queries"
+            if entry["count"]:
+                line += (f", avg {entry['avg']:.1f} ms, p50 {entry['p50']:.1f} ms, "
+                         f"p95 {entry['p95']:.1f} ms, max {entry['max']:.1f} ms")
+            if entry["interrupted"]:
+                line += f", {entry['interrupted']} interrupted"
+            lines.append(line)
+        QMessageBox.information(self, "Query Statistics", "\n".join(lines))
+
     def select_last_item(self):
         self.table_items.clearSelection()
-        row_count = self.table_items.rowCount()
-        if row_count > 0:
-            self.table_items.selectRow(row_count - 1)
-            self.table_items.scrollToItem(self.table_items.item(row_count - 1, 0))
+        # The remaining pages load in the background; on_item_located selects the last row
+        self.items_model.locate()
 
     def select_first_item(self):
         self.table_items.clearSelection()
-        if self.table_items.rowCount() > 0:
+        if self.items_model.rowCount() > 0:
             self.table_items.selectRow(0)
-            self.table_items.scrollToItem(self.table_items.item(0, 0))
+            self.table_items.scrollTo(self.items_model.index(0, 0))
 
     def undo_last_action(self):
-        if not self.undo_stack:
-            QMessageBox.information(self, "Undo", "No operations to undo.")
-            return
+        self.apply_journal(desfazer, "Undo", "No operations to undo.", "Undone")
 
-        last_action = self.undo_stack.pop()
-        action_type = last_action.get("type")
-
-        if action_type == "delete":
-            data = last_action.get("data")
-            try:
-                with obter_conexao() as conn:
-                    cursor = conn.cursor()
-                    cursor.execute("""
-                        INSERT INTO items (title, responsible, quantity, description, image_path, directory_id)
-                        VALUES (?, ?, ?, ?, ?, ?)
-                    """, (data['title'], data['responsible'], data['quantity'],
-                          data['description'], data['image_path'], data['directory_id']))
-                    conn.commit()
-                QMessageBox.information(self, "Undo", "Delete undone.")
-            except Exception as e:
-                QMessageBox.critical(self, "Error", f"Error undoing delete: {e}")
+    def redo_last_action(self):
+        self.apply_journal(refazer, "Redo", "No operations to redo.", "Redone")
 
-        elif action_type == "insert":
-            item_id = last_action.get("item_id")
+    def apply_journal(self, step, title, empty_message, done_prefix):
+        """Runs undo_journal.desfazer/refazer and announces what it changed."""
+        if not self.ensure_writable():
+            return
+        try:
+            with obter_conexao() as conn:
+                entry = step(conn)
+        except ConflitoDiario as conflict:
+            # Someone else changed the same rows: never overwrite their values
+            answer = QMessageBox.question(
+                self, title,
+                f"'{conflict.descricao}' can't be {done_prefix.lower()}: the records were changed by another "
+                "user since.\n\nRemove this step from the history?",
+                QMessageBox.Yes | QMessageBox.No)
+            if answer == QMessageBox.Yes:
+                try:
+                    with obter_conexao() as conn:
+                        descartar(conn, conflict.entrada_id)
+                except Exception as e:
+                    QMessageBox.critical(self, "Error", f"Error during {title.lower()}: {e}")
+            return
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Error during {title.lower()}: {e}")
+            return
+        if entry is None:
+            QMessageBox.information(self, title, empty_message)
+            return
+        description, operations = entry
+        for entity, action, ids, fields in alteracoes(operations):
+            notifier.notify(entity, action, ids, fields)
+        self.statusBar().showMessage(f"{done_prefix}: {description}", 5000)
+
+    def prune_undo_journal(self):
+        days = int(self.undo_config.get("retention_days", 0))
+        if days <= 0 or modo_somente_leitura() or self.journal_pruner is not None:
+            return
+        self.journal_pruner = JournalPruneWorker(days, self)
+        self.journal_pruner.failed.connect(lambda message: print("Error pruning undo journal:", message))
+        self.journal_pruner.finished.connect(self.on_journal_pruned)
+        self.journal_pruner.start()
+
+    def on_journal_pruned(self):
+        self.journal_pruner.deleteLater()
+        self.journal_pruner = None
+
+    # -------------------- Change Notifications --------------------
+    def on_data_changed(self, change):
+        if change.entity == "item":
+            self.items_model.apply_change(change)
+            if change.fields != ("note",):
+                self.tree_model.refresh_stats()
+        elif change.entity == "directory":
             try:
-                with obter_conexao() as conn:
-                    cursor = conn.cursor()
-                    cursor.execute("DELETE FROM items WHERE id = ?", (item_id,))
-                    conn.commit()
-                QMessageBox.information(self, "Undo", "Insert undone.")
+                self.tree_model.apply_change(change)
+                if change.fields != ("note",):
+                    self.update_dir_index(change)
+                    # Moves and deletes change the counters of the old and new ancestors
+                    self.tree_model.refresh_stats()
+                    # Renaming or moving changes the full paths shown in the Directory column
+                    if change.action == "updated" and self.items_model.with_directory:
+                        self.items_model.reload()
             except Exception as e:
-                QMessageBox.critical(self, "Error", f"Error undoing insert: {e}")
-
-        self.refresh_table()
+                QMessageBox.critical(self, "Error", f"Error updating directory tree: {e}")
 
     # -------------------- Refresh Methods --------------------
     def refresh_table(self):
@@ -272,33 +424,20 @@ class MainWindow(QMainWindow):
         if directory_id:
             self.load_items(directory_id)
         else:
-            self.table_items.setRowCount(0)
+            self.items_model.clear()
 
     def refresh_tree_and_table(self):
-        selected_directory_id = self.get_selected_directory_id()
-        self.load_tree()
-        if selected_directory_id:
-            def find_item_by_id(item, id_val):
-                if item.data(0, Qt.UserRole) == id_val:
-                    return item
-                for i in range(item.childCount()):
-                    res = find_item_by_id(item.child(i), id_val)
-                    if res:
-                        return res
-                return None
-
-            root = self.tree_directories.invisibleRootItem()
-            found = None
-            for i in range(root.childCount()):
-                found = find_item_by_id(root.child(i), selected_directory_id)
-                if found:
-                    break
-            if found:
-                self.tree_directories.setCurrentItem(found)
+        self.load_tree(select_id=self.get_selected_directory_id())
         self.refresh_table()
 
     # -------------------- Configuration Methods --------------------
     def load_config(self):
+        self.database_config = load_database_config()
+        self.search_config = load_search_config()
+        self.backup_config = load_backup_config()
+        self.undo_config = load_undo_config()
+        self.tree_colors = {}
+        self.expanded_ids = []
         config_path = get_config_path()
         if os.path.exists(config_path):
             try:
@@ -335,11 +474,15 @@ class MainWindow(QMainWindow):
             },
             "table": {
                 "column_widths": [self.table_items.horizontalHeader().sectionSize(i)
-                                  for i in range(self.table_items.columnCount())],
+                                  for i in range(self.table_items.horizontalHeader().count())],
                 "column_order": [self.table_items.horizontalHeader().logicalIndex(i)
-                                 for i in range(self.table_items.columnCount())]
+                                 for i in range(self.table_items.horizontalHeader().count())]
             },
-            "theme": getattr(self, "tema_atual", "light")
+            "theme": getattr(self, "tema_atual", "light"),
+            "database": getattr(self, "database_config", {}),
+            "search": getattr(self, "search_config", {}),
+            "backup": getattr(self, "backup_config", {}),
+            "undo": getattr(self, "undo_config", {})
         }
         try:
             with open(get_config_path(), "w") as f:
@@ -348,7 +491,22 @@ class MainWindow(QMainWindow):
             QMessageBox.warning(self, "Warning", f"Could not save settings: {e}")
 
     def closeEvent(self, event):
+        if not self.quantity_buffer.flush():
+            resp = QMessageBox.question(self, "Confirm",
+                                        "Some quantity changes could not be saved. Close anyway and discard them?")
+            if resp != QMessageBox.Yes:
+                event.ignore()
+                return
+        if self.background_task is not None:
+            # Export/import/backup running: stop it before the connections are closed
+            self.background_task.cancel()
+            self.background_task.wait()
+        if self.journal_pruner is not None:
+            self.journal_pruner.cancel()
+            self.journal_pruner.wait()
         self.save_config()
+        self.query_worker.stop()
+        fechar_conexoes()
         super().closeEvent(event)
 
     # -------------------- Menu Bar --------------------
@@ -369,9 +527,12 @@ class MainWindow(QMainWindow):
         action_backup_db = QAction("Backup DB", self)
         action_backup_db.triggered.connect(self.backup_db)
         menu_backup.addAction(action_backup_db)
-        action_backup_images = QAction("Backup Images", self)
+        action_backup_images = QAction("Backup DB + Images (incremental)", self)
         action_backup_images.triggered.connect(self.backup_images)
         menu_backup.addAction(action_backup_images)
+        action_restore_backup = QAction("Restore DB + Images...", self)
+        action_restore_backup.triggered.connect(self.restore_backup)
+        menu_backup.addAction(action_restore_backup)
         action_backup_configs = QAction("Backup Configs", self)
         action_backup_configs.triggered.connect(self.backup_configs)
         menu_backup.addAction(action_backup_configs)
@@ -387,6 +548,25 @@ class MainWindow(QMainWindow):
         action_connect_db = QAction("Connect to another DB", self)
         action_connect_db.triggered.connect(self.select_db)
         menu_config.addAction(action_connect_db)
+        self.action_wal = QAction("Use WAL Journal Mode", self)
+        self.action_wal.setCheckable(True)
+        self.action_wal.setChecked(bool(self.database_config.get("wal")))
+        self.action_wal.toggled.connect(self.toggle_wal_mode)
+        menu_config.addAction(self.action_wal)
+        self.action_search_as_you_type = QAction("Search As You Type", self)
+        self.action_search_as_you_type.setCheckable(True)
+        self.action_search_as_you_type.setChecked(bool(self.search_config.get("as_you_type")))
+        self.action_search_as_you_type.toggled.connect(self.toggle_search_as_you_type)
+        menu_config.addAction(self.action_search_as_you_type)
+        action_rebuild_hierarchy = QAction("Rebuild Directory Hierarchy", self)
+        action_rebuild_hierarchy.triggered.connect(self.rebuild_directory_hierarchy)
+        menu_config.addAction(action_rebuild_hierarchy)
+        action_rebuild_search = QAction("Rebuild Search Index", self)
+        action_rebuild_search.triggered.connect(self.rebuild_search_index)
+        menu_config.addAction(action_rebuild_search)
+        action_retry_write = QAction("Retry Write Access", self)
+        action_retry_write.triggered.connect(self.retry_write_access)
+        menu_config.addAction(action_retry_write)
 
         # Help Menu
         menu_help = menubar.addMenu("Help")
@@ -396,166 +576,331 @@ class MainWindow(QMainWindow):
         action_about = QAction("About", self)
         action_about.triggered.connect(self.show_about)
         menu_help.addAction(action_about)
+        action_conn_stats = QAction("Connection Statistics", self)
+        action_conn_stats.triggered.connect(self.show_connection_stats)
+        menu_help.addAction(action_conn_stats)
+        action_query_stats = QAction("Query Statistics", self)
+        action_query_stats.triggered.connect(self.show_query_stats)
+        menu_help.addAction(action_query_stats)
 
     def select_db(self):
+        if not self.ensure_idle("Select DB"):
+            return
         path, _ = QFileDialog.getOpenFileName(self, "Select DB", "", "SQLite DB (*.db)")
         if path:
+            if not self.quantity_buffer.flush():
+                return
             set_database_path(path)
+            try:
+                verificar_ou_criar_db()
+            except Exception as e:
+                QMessageBox.critical(self, "Error", f"Error opening DB: {e}")
+                return
             criar_pasta_imagens()
             print("Selected DB:", path)
+            self.update_read_only_state(notify=True)
+            self.items_model.clear()
             self.load_tree()
+            self.check_search_index()
+            self.prune_undo_journal()
 
-    # -------------------- Directory Tree Methods --------------------
-    def load_tree(self):
-        self.tree_directories.clear()
+    def rebuild_directory_hierarchy(self):
+        if not self.ensure_writable():
+            return
         try:
             with obter_conexao() as conn:
-                cursor = conn.cursor()
-                cursor.execute("SELECT id, name, parent_id FROM directories")
-                rows = cursor.fetchall()
-            dirs = {r[0]: (r[1], r[2]) for r in rows}
-
-            def add_children(parent_item, parent_id):
-                for d_id, (d_name, d_parent) in dirs.items():
-                    if d_parent == parent_id:
-                        item = QTreeWidgetItem([d_name])
-                        item.setData(0, Qt.UserRole, d_id)
-                        key = f"dir_{d_id}"
-                        # Primeiro, tenta o JSON do DB
-                        notes_db = load_notes()
-                        note_text = ""
-                        note_color = ""
-                        if key in notes_db:
-                            note_text = notes_db[key].get("text", "")
-                            note_color = notes_db[key].get("color", "")
-                        else:
-                            # Fallback para o AppData
-                            notes_appdata = load_appdata_notes()
-                            if key in notes_appdata:
-                                note_text = notes_appdata[key].get("text", "")
-                                note_color = notes_appdata[key].get("color", "")
-                        # Definir tooltip e cor usando os métodos adequados para QTreeWidgetItem:
-                        if note_text:
-                            item.setToolTip(0, note_text)
-                        if note_color:
-                            item.setBackground(0, QColor(note_color))
-                        parent_item.addChild(item)
-                        add_children(item, d_id)
-
-            root_item = self.tree_directories.invisibleRootItem()
-            for d_id, (d_name, d_parent) in dirs.items():
-                if d_parent is None:
-                    item = QTreeWidgetItem([d_name])
-                    item.setData(0, Qt.UserRole, d_id)
-                    key = f"dir_{d_id}"
-                    notes = load_notes()
-                    if key in notes:
-                        note_data = notes[key]
-                        item.setToolTip(0, note_data.get("text", ""))
-                        if note_data.get("color"):
-                            item.setBackground(0, QColor(note_data["color"]))
-                    else:
-                        notes_appdata = load_appdata_notes()
-                        if key in notes_appdata and notes_appdata[key].get("color"):
-                            color = notes_appdata[key]["color"]
-                            item.setBackground(0, QColor(color))
-                            item.setToolTip(0, notes_appdata[key].get("text", ""))
-                    root_item.addChild(item)
-                    add_children(item, d_id)
-
-            if hasattr(self, "expanded_ids"):
-                self.restore_tree_expansion(self.expanded_ids)
-            self.update_dir_completer()
+                pairs = reconstruir_closure(conn)
+                reconstruir_caminhos(conn)
+                reconstruir_estatisticas(conn)
+            QMessageBox.information(self, "Directories", f"Directory hierarchy rebuilt ({pairs} entries).")
+            self.load_tree(select_id=self.get_selected_directory_id())
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Error rebuilding directory hierarchy: {e}")
+
+    def rebuild_search_index(self):
+        if not self.ensure_writable():
+            return
+        try:
+            with obter_conexao() as conn:
+                if not criar_indice_busca(conn):
+                    QMessageBox.warning(self, "Search", "Full-text search (FTS5) is not available; "
+                                                        "searches will keep using the slower LIKE mode.")
+                    return
+                reconstruir_indice_busca(conn)
+            self.fts_available = True
+            QMessageBox.information(self, "Search", "Search index rebuilt.")
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Error rebuilding search index: {e}")
+
+    # -------------------- Database Access Mode --------------------
+    def update_read_only_state(self, notify=False):
+        read_only = modo_somente_leitura()
+        blocked = read_only or self.write_block_reason is not None
+        if read_only:
+            self.setWindowTitle("Inventory (read-only)")
+        elif blocked:
+            self.setWindowTitle(f"Inventory ({self.write_block_reason})")
+        else:
+            self.setWindowTitle("Inventory")
+        self.btn_add_item.setEnabled(not blocked)
+        self.items_model.read_only = blocked
+        self.table_items.viewport().update()
+        if read_only and notify:
+            QMessageBox.warning(
+                self, "Read-only mode",
+                "The database is being written by another user. It was opened in read-only mode: "
+                "you can browse, search and view items, but changes are disabled.\n"
+                "Use Settings > Retry Write Access to try again."
+            )
 
+    def ensure_writable(self):
+        if modo_somente_leitura():
+            QMessageBox.warning(self, "Read-only mode",
+                                "The database is open in read-only mode. Changes are disabled.")
+            return False
+        if self.write_block_reason is not None:
+            QMessageBox.warning(self, "Changes disabled",
+                                f"Changes are disabled: {self.write_block_reason}. Try again when it finishes.")
+            return False
+        # Pending +/- clicks go in first so other edits see the current quantities
+        self.quantity_buffer.flush()
+        return True
+
+    def set_write_block(self, reason):
+        """Refuses changes while reason applies (shown in the title); None allows them again."""
+        self.write_block_reason = reason
+        self.update_read_only_state()
+
+    def ensure_idle(self, title):
+        """
+        Refuses reconnecting or switching databases while a background task runs: closing
+        the connections waits for the writer an import or restore holds until it finishes,
+        and a running export or backup would lose its database.
+        """
+        if self.background_task is None and self.write_block_reason is None:
+            return True
+        reason = self.write_block_reason or "an export, import or backup is running"
+        QMessageBox.warning(self, title, f"Not available now: {reason}. Try again when it finishes.")
+        return False
+
+    def retry_write_access(self):
+        if not self.ensure_idle("Database"):
+            return
+        try:
+            ok = tentar_modo_escrita()
         except Exception as e:
-            QMessageBox.critical(self, "Error", f"Error loading directory tree: {e}")
+            QMessageBox.critical(self, "Error", f"Error reconnecting to DB: {e}")
+            return
+        self.update_read_only_state()
+        if ok:
+            QMessageBox.information(self, "Database", "Write access restored.")
+        else:
+            QMessageBox.warning(self, "Database", "The database is still locked by another user.")
 
-    def on_directory_selected(self, item, column):
-        directory_id = item.data(0, Qt.UserRole)
+    def toggle_wal_mode(self, enabled):
+        if not self.ensure_idle("Use WAL Journal Mode"):
+            self.action_wal.blockSignals(True)
+            self.action_wal.setChecked(not enabled)
+            self.action_wal.blockSignals(False)
+            return
+        self.database_config["wal"] = enabled
+        self.save_config()
+        configurar_acesso(self.database_config)
+        if not modo_somente_leitura():
+            tentar_modo_escrita()
+        self.update_read_only_state()
+
+    def on_quantity_flush_failed(self, message):
+        QMessageBox.critical(self, "Error",
+                             f"Error saving quantity changes: {message}\n"
+                             "The changes were kept and will be saved with the next change.")
+
+    # -------------------- Background Queries --------------------
+    def update_busy_indicator(self, _busy=None):
+        # The signal value may arrive out of order; ask the worker instead
+        self.busy_indicator.setVisible(self.query_worker.is_busy())
+
+    def on_query_result(self, channel, ticket, result):
+        if not self.query_worker.is_current(channel, ticket):
+            return
+        if channel == "dir-paths":
+            self.set_dir_index(result)
+        elif channel == "dir-index":
+            self.dir_index_pending.clear()
+            self.apply_dir_index_rows(result)
+        elif channel == "fts":
+            self.fts_available = result
+
+    def on_query_failed(self, channel, ticket, message):
+        if not self.query_worker.is_current(channel, ticket):
+            return
+        if channel in ("dir-paths", "dir-index"):
+            print("Error loading directory paths:", message)
+        elif channel == "fts":
+            print("Error checking search index:", message)
+
+    def check_search_index(self):
+        self.query_worker.submit("fts", indice_disponivel)
+
+    # -------------------- Directory Tree Methods --------------------
+    def load_tree(self, select_id=None):
+        """
+        Reloads the tree from its root directories in the background, keeping the
+        current expansion; select_id is reselected once the tree is back.
+        """
+        if self.tree_model.loaded_ids():
+            self.expanded_ids = self.get_expanded_items()
+        self.pending_expand = set(self.expanded_ids)
+        self.tree_select_id = select_id
+        self.tree_model.reload()
+        self.update_dir_completer()
+
+    def on_tree_children_loaded(self, parent_index):
+        # Re-expands saved nodes as their parents arrive, one level at a time
+        for row in range(self.tree_model.rowCount(parent_index)):
+            index = self.tree_model.index(row, 0, parent_index)
+            dir_id = index.data(Qt.UserRole)
+            if self.tree_expand_all or dir_id in self.pending_expand:
+                self.pending_expand.discard(dir_id)
+                self.tree_directories.expand(index)
+        if not parent_index.isValid() and self.tree_select_id:
+            self.select_directory(self.tree_select_id)
+            self.tree_select_id = None
+
+    def expand_all_directories(self):
+        self.tree_expand_all = True
+        self.tree_directories.expandAll()
+
+    def collapse_all_directories(self):
+        self.tree_expand_all = False
+        self.pending_expand.clear()
+        self.tree_directories.collapseAll()
+
+    def select_directory(self, dir_id):
+        """Loads the path down to dir_id in the background; on_directory_revealed selects it."""
+        self.tree_model.reveal(dir_id)
+
+    def on_directory_revealed(self, index):
+        """Expands the ancestors of a revealed directory, then selects and scrolls to it."""
+        parent = index.parent()
+        while parent.isValid():
+            self.tree_directories.expand(parent)
+            parent = parent.parent()
+        self.tree_directories.setCurrentIndex(index)
+        self.tree_directories.scrollTo(index)
+
+    def on_directory_selected(self, index):
+        directory_id = index.data(Qt.UserRole)
         self.load_items(directory_id)
 
     def get_selected_directory_id(self):
-        item = self.tree_directories.currentItem()
-        if item:
-            return item.data(0, Qt.UserRole)
+        index = self.tree_directories.currentIndex()
+        if index.isValid():
+            return index.data(Qt.UserRole)
         return None
 
     def get_expanded_items(self):
-        expanded_ids = []
-
-        def traverse(item):
-            dir_id = item.data(0, Qt.UserRole)
-            if item.isExpanded():
-                expanded_ids.append(dir_id)
-            for i in range(item.childCount()):
-                traverse(item.child(i))
-
-        root = self.tree_directories.invisibleRootItem()
-        for i in range(root.childCount()):
-            traverse(root.child(i))
-        return expanded_ids
-
-    def restore_tree_expansion(self, expanded_ids):
-        def traverse(item):
-            dir_id = item.data(0, Qt.UserRole)
-            item.setExpanded(dir_id in expanded_ids)
-            for i in range(item.childCount()):
-                traverse(item.child(i))
-
-        root = self.tree_directories.invisibleRootItem()
-        for i in range(root.childCount()):
-            traverse(root.child(i))
+        expanded = [dir_id for dir_id in self.tree_model.loaded_ids()
+                    if self.tree_directories.isExpanded(self.tree_model.index_for_id(dir_id))]
+        # Saved nodes whose parents were never expanded in this session stay saved
+        return expanded + [dir_id for dir_id in self.pending_expand if dir_id not in expanded]
 
     def update_dir_completer(self):
-        self.dir_path_map = {}
-        paths = []
-
-        def traverse(item, path):
-            current_path = f"{path}/{item.text(0)}" if path else item.text(0)
-            paths.append(current_path)
-            self.dir_path_map[current_path] = item
-            for i in range(item.childCount()):
-                traverse(item.child(i), current_path)
-
-        root = self.tree_directories.invisibleRootItem()
-        for i in range(root.childCount()):
-            traverse(root.child(i), "")
-        completer = QCompleter(paths)
-        completer.setCaseSensitivity(Qt.CaseInsensitive)
-        self.dir_search_line_edit.setCompleter(completer)
-        completer.activated.connect(self.on_dir_completer_activated)
+        # Paths come from the DB (not from the tree, which is only partly loaded);
+        # the index is built on the worker thread too
+        self.query_worker.submit("dir-paths", lambda conn: PathIndex(
+            conn.execute("SELECT id, COALESCE(path, name) FROM directories").fetchall()))
+
+    def set_dir_index(self, index):
+        self.dir_index = index
+        self.current_search_results = []
+        self.update_dir_completer_matches(self.dir_search_line_edit.text())
+
+    def update_dir_completer_matches(self, text):
+        if self.dir_index is None:
+            return
+        matches = self.dir_index.search(text, limit=self.DIR_COMPLETER_LIMIT)
+        self.dir_completer_model.setStringList([path for _, path in matches])
+        if matches and self.dir_search_line_edit.hasFocus():
+            self.dir_search_line_edit.completer().complete()
+
+    def update_dir_index(self, change):
+        """Updates only the indexed paths touched by a directory change."""
+        if self.dir_index is None:
+            # The initial load is still running; it may have read the old rows
+            self.update_dir_completer()
+            return
+        self.current_search_results = []
+        if change.action == "deleted":
+            for dir_id in change.ids:
+                self.dir_index.remove(dir_id)
+            if self.dir_index_pending & set(change.ids):
+                # The pending query may bring the deleted paths back: ask again without them
+                self.dir_index_pending.difference_update(change.ids)
+                self.request_dir_index_rows()
+            return
+        self.dir_index_pending.update(change.ids)
+        self.request_dir_index_rows()
+
+    def request_dir_index_rows(self):
+        """Reads the paths (and subtrees) of the changed directories on the worker thread."""
+        ids = sorted(self.dir_index_pending)
+        if not ids:
+            self.query_worker.invalidate("dir-index")
+            return
+        placeholders = ", ".join("?" for _ in ids)
+
+        def fetch(conn):
+            subtrees = {}
+            for ancestor_id, descendant_id in conn.execute(
+                    f"SELECT ancestor_id, descendant_id FROM directory_closure WHERE ancestor_id IN ({placeholders})",
+                    ids):
+                subtrees.setdefault(ancestor_id, []).append(descendant_id)
+            rows = conn.execute(f"SELECT id, COALESCE(path, name) FROM directories WHERE id IN ({placeholders})", ids)
+            return [(dir_id, path, subtrees.get(dir_id, [])) for dir_id, path in rows]
+
+        self.query_worker.submit("dir-index", fetch, kind="dir-paths")
+
+    def apply_dir_index_rows(self, rows):
+        if self.dir_index is None:
+            return
+        self.current_search_results = []
+        for dir_id, path, descendants in rows:
+            old_path = self.dir_index.path(dir_id)
+            if old_path is None:
+                self.dir_index.add(dir_id, path)
+            elif old_path != path:
+                # Renamed or moved: the whole subtree gets the new prefix
+                self.dir_index.rename_subtree(old_path, path, descendants)
 
     def on_dir_completer_activated(self, text):
-        item = self.dir_path_map.get(text)
-        if item:
-            self.tree_directories.setCurrentItem(item)
-            parent = item.parent()
-            while parent:
-                parent.setExpanded(True)
-                parent = parent.parent()
+        dir_id = self.dir_index.id_for_path(text) if self.dir_index is not None else None
+        if dir_id:
+            self.select_directory(dir_id)
 
     def search_directory(self):
         text = self.dir_search_line_edit.text().strip().lower()
-        if not text:
+        if not text or self.dir_index is None:
             return
+        # Enter again with the same text goes to the next match, best matches first
         if text != self.current_search_text or not self.current_search_results:
             self.current_search_text = text
-            self.current_search_results = [path for path in self.dir_path_map if text in path.lower()]
+            self.current_search_results = [dir_id for dir_id, _ in self.dir_index.search(text)]
             self.current_search_index = 0
         else:
             self.current_search_index += 1
             if self.current_search_index >= len(self.current_search_results):
                 self.current_search_index = 0
         if self.current_search_results:
-            match = self.current_search_results[self.current_search_index]
-            self.on_dir_completer_activated(match)
+            self.select_directory(self.current_search_results[self.current_search_index])
         else:
             QMessageBox.information(self, "Not found", f"Directory '{text}' not found.")
 
     def on_tree_context_menu(self, pos: QPoint):
-        item = self.tree_directories.itemAt(pos)
+        index = self.tree_directories.indexAt(pos)
         menu = QMenu(self)
-        if item:
+        if index.isValid():
+            dir_id = index.data(Qt.UserRole)
             action_add_dir = QAction("Add Subdirectory", self)
             action_add_dir.triggered.connect(self.add_subdirectory)
             menu.addAction(action_add_dir)
@@ -572,16 +917,16 @@ class MainWindow(QMainWindow):
             action_view.triggered.connect(self.view_items)
             menu.addAction(action_view)
             action_set_color = QAction("Set Color", self)
-            action_set_color.triggered.connect(lambda: self.set_color(item))
+            action_set_color.triggered.connect(lambda: self.set_color(dir_id))
             menu.addAction(action_set_color)
-            key = f"dir_{item.data(0, Qt.UserRole)}"
-            notes = load_notes()
-            if key in notes and notes[key].get("text"):
+            key = f"dir_{dir_id}"
+            # The tree already holds the note (its tooltip): no query needed here
+            if index.siblingAtColumn(0).data(Qt.ToolTipRole):
                 action_note = QAction("Delete Note", self)
-                action_note.triggered.connect(lambda: self.delete_note(key, item))
+                action_note.triggered.connect(lambda: self.delete_note(key))
             else:
                 action_note = QAction("Note", self)
-                action_note.triggered.connect(lambda: self.edit_note(key, item))
+                action_note.triggered.connect(lambda: self.edit_note(key))
             menu.addAction(action_note)
         else:
             action_add_root = QAction("Add Root Directory", self)
@@ -590,39 +935,51 @@ class MainWindow(QMainWindow):
         menu.exec_(self.tree_directories.mapToGlobal(pos))
 
     def add_root_directory(self):
+        if not self.ensure_writable():
+            return
         dialog = DirectoryDialog(self, parent_directory_id=None)
         if dialog.exec_() == QDialog.Accepted:
-            self.expanded_ids = self.get_expanded_items()
-            self.load_tree()
+            notifier.notify("directory", "inserted", [dialog.directory_id])
 
     def add_subdirectory(self):
+        if not self.ensure_writable():
+            return
         parent_id = self.get_selected_directory_id()
         if not parent_id:
             QMessageBox.warning(self, "Warning", "Select a directory to add a subdirectory.")
             return
         dialog = DirectoryDialog(self, parent_directory_id=parent_id)
         if dialog.exec_() == QDialog.Accepted:
-            self.expanded_ids = self.get_expanded_items()
-            self.load_tree()
+            notifier.notify("directory", "inserted", [dialog.directory_id])
+            self.tree_directories.expand(self.tree_model.index_for_id(parent_id))
 
     def edit_directory(self):
+        if not self.ensure_writable():
+            return
         directory_id = self.get_selected_directory_id()
         if not directory_id:
             QMessageBox.warning(self, "Warning", "Select a directory to edit.")
             return
         dialog = DirectoryDialog(self, directory_id=directory_id)
         if dialog.exec_() == QDialog.Accepted:
-            self.load_tree()
+            notifier.notify("directory", "updated", [directory_id], ("name",))
 
     def move_directory(self):
+        if not self.ensure_writable():
+            return
         directory_id = self.get_selected_directory_id()
         if not directory_id:
             QMessageBox.warning(self, "Warning", "Select a directory to move.")
             return
         try:
-            with obter_conexao() as conn:
+            with obter_conexao(somente_leitura=True) as conn:
                 cursor = conn.cursor()
-                cursor.execute("SELECT id, name FROM directories WHERE id != ?", (directory_id,))
+                # Exclui a própria subárvore: mover para dentro dela criaria um ciclo
+                cursor.execute("""
+                    SELECT id, name
+                      FROM directories
+                     WHERE id NOT IN (SELECT descendant_id FROM directory_closure WHERE ancestor_id = ?)
+                """, (directory_id,))
                 all_dirs = cursor.fetchall()
             dlg = QDialog(self)
             dlg.setWindowTitle("Move Directory")
@@ -641,55 +998,138 @@ class MainWindow(QMainWindow):
             btn_cancel.clicked.connect(dlg.reject)
             btn_layout.addWidget(btn_cancel)
             if dlg.exec_() == QDialog.Accepted:
-                new_parent_id = combo.currentData()
-                with obter_conexao() as conn:
-                    cursor = conn.cursor()
-                    cursor.execute("UPDATE directories SET parent_id = ? WHERE id = ?", (new_parent_id, directory_id))
-                    conn.commit()
-                self.load_tree()
+                self.move_directory_to(directory_id, combo.currentData())
         except Exception as e:
             QMessageBox.critical(self, "Error", f"Error moving directory: {e}")
 
+    def move_directory_to(self, directory_id, new_parent_id):
+        """Moves a directory under new_parent_id (None = root); also used by drag and drop."""
+        if not self.ensure_writable():
+            return
+        if directory_id == new_parent_id:
+            return
+        try:
+            with obter_conexao() as conn:
+                iniciar_escrita(conn)
+                cursor = conn.cursor()
+                before = capturar(conn, "directories", [directory_id], ("name", "parent_id"))
+                cursor.execute("UPDATE directories SET parent_id = ? WHERE id = ?", (new_parent_id, directory_id))
+                after = capturar(conn, "directories", [directory_id], ("parent_id",))
+                registrar(conn, f"Move directory '{before[0]['name']}'",
+                          [atualizar("directories", [{"id": directory_id, "parent_id": before[0]["parent_id"]}], after)],
+                          [atualizar("directories", after, before)])
+                conn.commit()
+        except Exception as e:
+            # Inclui a tentativa de mover para dentro da própria subárvore (trigger da closure)
+            QMessageBox.critical(self, "Error", f"Error moving directory: {e}")
+            return
+        notifier.notify("directory", "updated", [directory_id], ("parent_id",))
+        self.select_directory(directory_id)
+
     def delete_directory(self):
+        if not self.ensure_writable():
+            return
         directory_id = self.get_selected_directory_id()
         if not directory_id:
             QMessageBox.warning(self, "Warning", "Select a directory to delete.")
             return
-        resp = QMessageBox.question(self, "Confirm", "Delete this directory and all its content?")
-        if resp != QMessageBox.Yes:
+        try:
+            subdir_count, item_count = self.count_subtree(directory_id)
+            details = f" ({subdir_count} subdirectories, {item_count} items)"
+        except Exception as e:
+            print("Error counting directory content:", e)
+            details = ""
+        box = QMessageBox(QMessageBox.Question, "Confirm", f"Delete this directory and all its content{details}?",
+                          QMessageBox.Yes | QMessageBox.No, self)
+        delete_images = QCheckBox("Also delete image files no longer used by any other item (cannot be undone)")
+        box.setCheckBox(delete_images)
+        if box.exec_() != QMessageBox.Yes:
             return
-        self.delete_directory_recursive(directory_id)
-        self.load_tree()
-        self.table_items.setRowCount(0)
-
-    def delete_directory_recursive(self, directory_id):
+        deleted_ids, counts = self.delete_directory_recursive(directory_id, delete_images.isChecked())
+        if deleted_ids:
+            notifier.notify("directory", "deleted", deleted_ids)
+            self.items_model.clear()
+            message = (f"Removed {counts['directories']} directories, {counts['items']} items "
+                       f"and {counts['notes']} notes")
+            if delete_images.isChecked():
+                message += f", and deleted {counts['images']} image files"
+            QMessageBox.information(self, "Delete Directory", message + ".")
+
+    def delete_directory_recursive(self, directory_id, delete_images=False):
+        """
+        Deletes directory_id with its subtree, items and notes in one transaction
+        (recorded in the undo journal). With delete_images, image files of the
+        deleted items that no remaining item uses are removed after the commit.
+        Returns (deleted directory ids, {"directories", "items", "notes", "images": count}).
+        """
+        subtree = "SELECT descendant_id FROM directory_closure WHERE ancestor_id = ?"
+        subtree_items = f"SELECT id FROM items WHERE directory_id IN ({subtree})"
         try:
             with obter_conexao() as conn:
+                iniciar_escrita(conn)
                 cursor = conn.cursor()
-                cursor.execute("SELECT id FROM directories WHERE parent_id = ?", (directory_id,))
-                subdirs = cursor.fetchall()
-                for sd in subdirs:
-                    self.delete_directory_recursive(sd[0])
-                cursor.execute("DELETE FROM items WHERE directory_id = ?", (directory_id,))
-                cursor.execute("DELETE FROM directories WHERE id = ?", (directory_id,))
+                # Parents first, so that undoing re-inserts them before their children
+                cursor.execute(f"{subtree} ORDER BY depth, descendant_id", (directory_id,))
+                deleted_ids = [row[0] for row in cursor.fetchall()]
+                directories = capturar(conn, "directories", deleted_ids)
+                items = capturar(conn, "items", [row[0] for row in cursor.execute(subtree_items, (directory_id,))])
+                notes_where = f"""
+                    WHERE (entity_type = 'dir' AND entity_id IN ({subtree}))
+                       OR (entity_type = 'item' AND entity_id IN ({subtree_items}))
+                """
+                notes = capturar(conn, "notes", cursor.execute(
+                    f"SELECT entity_type, entity_id FROM notes {notes_where}", (directory_id, directory_id)
+                ).fetchall())
+                counts = {
+                    "notes": cursor.execute(f"DELETE FROM notes {notes_where}", (directory_id, directory_id)).rowcount,
+                    "items": cursor.execute(f"DELETE FROM items WHERE id IN ({subtree_items})",
+                                            (directory_id,)).rowcount,
+                    "directories": cursor.execute(f"DELETE FROM directories WHERE id IN ({subtree})",
+                                                  (directory_id,)).rowcount,
+                    "images": 0,
+                }
+                registrar(conn, f"Delete directory '{directories[0]['name']}'",
+                          [inserir("directories", directories), inserir("items", items), inserir("notes", notes)],
+                          [excluir("notes", notes), excluir("items", items),
+                           excluir("directories", directories[::-1])])
+                unused_images = set()
+                if delete_images:
+                    unused_images = {item["image_path"] for item in items if item["image_path"]}
+                    candidates = list(unused_images)
+                    for start in range(0, len(candidates), 500):
+                        chunk = candidates[start:start + 500]
+                        placeholders = ", ".join("?" for _ in chunk)
+                        unused_images.difference_update(row[0] for row in cursor.execute(
+                            f"SELECT DISTINCT image_path FROM items WHERE image_path IN ({placeholders})", chunk))
                 conn.commit()
         except Exception as e:
             QMessageBox.critical(self, "Error", f"Error deleting directory: {e}")
-
-    def set_color(self, item):
+            return [], None
+        # Only after the commit: a rolled back delete must keep its images
+        counts["images"] = remover_imagens(unused_images)
+        return deleted_ids, counts
+
+    def count_subtree(self, directory_id):
+        """Returns (subdirectories, items) under directory_id, excluding the directory itself."""
+        with obter_conexao(somente_leitura=True) as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT (SELECT COUNT(*) FROM directory_closure WHERE ancestor_id = ? AND depth > 0),
+                       (SELECT COUNT(*)
+                          FROM directory_closure c
+                          JOIN items ON items.directory_id = c.descendant_id
+                         WHERE c.ancestor_id = ?)
+            """, (directory_id, directory_id))
+            return cursor.fetchone()
+
+    def set_color(self, dir_id):
         color = QColorDialog.getColor()
         if color.isValid():
-            item.setBackground(0, color)
-            if not hasattr(self, "tree_colors"):
-                self.tree_colors = {}
-            dir_id = item.data(0, Qt.UserRole)
-            self.tree_colors[str(dir_id)] = color.name()
-
-    def delete_directory_color(self, item):
-        dir_id = item.data(0, Qt.UserRole)
-        if hasattr(self, "tree_colors") and str(dir_id) in self.tree_colors:
-            del self.tree_colors[str(dir_id)]
-        item.setBackground(0, QColor())
+            # tree_colors is shared with the tree model (saved in the config)
+            self.tree_model.set_custom_color(dir_id, color.name())
+
+    def delete_directory_color(self, dir_id):
+        self.tree_model.set_custom_color(dir_id, None)
 
     def view_items(self):
         directory_id = self.get_selected_directory_id()
@@ -700,171 +1140,140 @@ class MainWindow(QMainWindow):
 
     # -------------------- Items Methods --------------------
     def load_items(self, directory_id):
-        try:
-            with obter_conexao() as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                    SELECT id, title, responsible, quantity, image_path, description
-                      FROM items
-                     WHERE directory_id = ?
-                """, (directory_id,))
-                rows = cursor.fetchall()
-            self.table_items.setColumnCount(6)
-            self.table_items.setHorizontalHeaderLabels(
-                ["ID", "Title", "Responsible", "Quantity", "Image", "Description"]
-            )
-            self.table_items.setRowCount(len(rows))
-            for i, row in enumerate(rows):
-                item_id, title, resp, qty, image_path, desc = row
-                id_item = QTableWidgetItem(str(item_id))
-                self.table_items.setItem(i, 0, id_item)
-                title_item = QTableWidgetItem(title)
-                key = f"item_{item_id}"
-                # Tenta carregar a nota para este item
-                notes_db = load_notes()
-                note_text = ""
-                note_color = ""
-                if key in notes_db:
-                    note_text = notes_db[key].get("text", "")
-                    note_color = notes_db[key].get("color", "")
-                else:
-                    notes_appdata = load_appdata_notes()
-                    if key in notes_appdata:
-                        note_text = notes_appdata[key].get("text", "")
-                        note_color = notes_appdata[key].get("color", "")
-                if note_text:
-                    title_item.setToolTip(note_text)
-                if note_color:
-                    title_item.setBackground(QColor(note_color))
-                self.table_items.setItem(i, 1, title_item)
-                self.table_items.setItem(i, 2, QTableWidgetItem(resp or ""))
-                from widgets.quantity_widget import QuantityWidget
-                quantity = qty if qty is not None else 0
-                quantity_widget = QuantityWidget(item_id, quantity)
-                self.table_items.setCellWidget(i, 3, quantity_widget)
-                self.table_items.setItem(i, 4, QTableWidgetItem("Yes" if image_path else "No"))
-                self.table_items.setItem(i, 5, QTableWidgetItem(desc or ""))
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"Error loading items: {e}")
+        self.items_model.set_query("""
+            SELECT items.id, items.title, items.responsible, items.quantity,
+                   items.image_path, items.description, NULL AS directory,
+                   n.text AS note_text, n.color AS note_color
+              FROM items
+              LEFT JOIN notes n ON n.entity_type = 'item' AND n.entity_id = items.id
+             WHERE items.directory_id = ?
+        """, (directory_id,))
 
     def load_items_recursive(self, directory_id):
-        query = """
-        WITH RECURSIVE subdirs(id) AS (
-            SELECT id FROM directories WHERE id = ?
-            UNION ALL
-            SELECT d.id FROM directories d JOIN subdirs s ON d.parent_id = s.id
-        )
-        SELECT items.id, items.title, items.responsible, items.quantity,
-               items.image_path, directories.name, items.description
-          FROM items
-          JOIN directories ON items.directory_id = directories.id
-         WHERE items.directory_id IN (SELECT id FROM subdirs)
-        """
-        try:
-            with obter_conexao() as conn:
-                cursor = conn.cursor()
-                cursor.execute(query, (directory_id,))
-                rows = cursor.fetchall()
-            self.table_items.setColumnCount(7)
-            self.table_items.setHorizontalHeaderLabels(
-                ["ID", "Title", "Responsible", "Quantity", "Image", "Description", "Directory"]
-            )
-            self.table_items.setRowCount(len(rows))
-            for i, row in enumerate(rows):
-                item_id, title, resp, qty, image_path, dir_name, desc = row
-                self.table_items.setItem(i, 0, QTableWidgetItem(str(item_id)))
-                self.table_items.setItem(i, 1, QTableWidgetItem(title))
-                self.table_items.setItem(i, 2, QTableWidgetItem(resp or ""))
-                from widgets.quantity_widget import QuantityWidget
-                quantity = qty if qty is not None else 0
-                quantity_widget = QuantityWidget(item_id, quantity)
-                self.table_items.setCellWidget(i, 3, quantity_widget)
-                self.table_items.setItem(i, 4, QTableWidgetItem("Yes" if image_path else "No"))
-                self.table_items.setItem(i, 5, QTableWidgetItem(desc or ""))
-                self.table_items.setItem(i, 6, QTableWidgetItem(dir_name or ""))
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"Error loading items recursively: {e}")
+        self.items_model.set_query("""
+            SELECT items.id, items.title, items.responsible, items.quantity,
+                   items.image_path, items.description, directories.path AS directory,
+                   n.text AS note_text, n.color AS note_color
+              FROM directory_closure c
+              JOIN items ON items.directory_id = c.descendant_id
+              JOIN directories ON items.directory_id = directories.id
+              LEFT JOIN notes n ON n.entity_type = 'item' AND n.entity_id = items.id
+             WHERE c.ancestor_id = ?
+        """, (directory_id,), with_directory=True, kind="recursive")
 
     def add_item(self):
+        if not self.ensure_writable():
+            return
         directory_id = self.get_selected_directory_id()
         if not directory_id:
             QMessageBox.warning(self, "Warning", "Select a directory to add an item.")
             return
         dlg = ItemDialog(self, directory_id=directory_id)
         if dlg.exec_() == QDialog.Accepted:
-            try:
-                with obter_conexao() as conn:
-                    cursor = conn.cursor()
-                    cursor.execute("SELECT MAX(id) FROM items")
-                    new_id = cursor.fetchone()[0]
-                self.undo_stack.append({"type": "insert", "item_id": new_id})
-                if len(self.undo_stack) > self.max_undo:
-                    self.undo_stack.pop(0)
-            except Exception as e:
-                print("Error registering insert for undo:", e)
-            self.load_items(directory_id)
-            self.table_items.scrollToBottom()
+            notifier.notify("item", "inserted", [dlg.new_item_id])
+            self.select_item(dlg.new_item_id)
+
+    def select_item(self, item_id):
+        """Selects and scrolls to the row of item_id, loading further pages in the background if needed."""
+        self.items_model.locate(item_id)
+
+    def on_item_located(self, row):
+        self.table_items.selectRow(row)
+        self.table_items.scrollTo(self.items_model.index(row, 0))
 
     def get_selected_item_id(self):
-        row = self.table_items.currentRow()
-        if row < 0:
+        index = self.table_items.currentIndex()
+        if not index.isValid():
             return None
-        item_id_item = self.table_items.item(row, 0)
-        if item_id_item:
-            return item_id_item.text()
-        return None
+        return self.items_model.item_id(index.row())
+
+    def get_selected_item_ids(self):
+        """Ids of all selected rows, in row order (the current row if nothing is selected)."""
+        rows = sorted(index.row() for index in self.table_items.selectionModel().selectedRows())
+        ids = [self.items_model.item_id(row) for row in rows]
+        if not ids:
+            ids = [self.get_selected_item_id()]
+        return [item_id for item_id in ids if item_id is not None]
+
+    def describe_items(self, verb, rows):
+        """Undo journal description for an action on the captured item rows."""
+        if len(rows) == 1:
+            return f"{verb} item '{rows[0]['title']}'"
+        return f"{verb} {len(rows)} items"
+
+    def update_items(self, item_ids, verb, columns, sql, params, relative=False):
+        """
+        Runs sql with executemany(params) on item_ids in one transaction, with one
+        undo journal entry for the batch and a single change notification.
+        With relative=True the single column is an increment and is journaled as
+        deltas, so undo keeps changes other users made meanwhile.
+        Returns False on error.
+        """
+        try:
+            with obter_conexao() as conn:
+                iniciar_escrita(conn)
+                before = capturar(conn, "items", item_ids, ("title",) + columns)
+                conn.executemany(sql, params)
+                after = capturar(conn, "items", item_ids, columns)
+                if relative:
+                    deltas = variacoes(columns[0], before, after)
+                    if deltas:
+                        registrar(conn, self.describe_items(verb, before),
+                                  [incrementar("items", columns[0], [(i, -d) for i, d in deltas])],
+                                  [incrementar("items", columns[0], deltas)])
+                elif before:
+                    registrar(conn, self.describe_items(verb, before),
+                              [atualizar("items", [{c: row[c] for c in ("id",) + columns} for row in before], after)],
+                              [atualizar("items", after, before)])
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Error updating items: {e}")
+            return False
+        notifier.notify("item", "updated", item_ids, columns)
+        return True
 
     def edit_item(self):
+        if not self.ensure_writable():
+            return
         item_id = self.get_selected_item_id()
         if not item_id:
             QMessageBox.warning(self, "Warning", "Select an item to edit.")
             return
-        directory_id = self.get_selected_directory_id()
         dlg = ItemDialog(self, item_id=int(item_id))
         if dlg.exec_() == QDialog.Accepted:
-            self.load_items(directory_id)
+            notifier.notify("item", "updated", [int(item_id)])
 
     def delete_item(self):
-        item_id = self.get_selected_item_id()
-        if not item_id:
+        if not self.ensure_writable():
+            return
+        item_ids = self.get_selected_item_ids()
+        if not item_ids:
             QMessageBox.warning(self, "Warning", "Select an item to delete.")
             return
-        resp = QMessageBox.question(self, "Confirm", "Delete this item?")
+        question = "Delete this item?" if len(item_ids) == 1 else f"Delete these {len(item_ids)} items?"
+        resp = QMessageBox.question(self, "Confirm", question)
         if resp != QMessageBox.Yes:
             return
         try:
-            directory_id = self.get_selected_directory_id()
-            with obter_conexao() as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                    SELECT title, responsible, quantity, description, image_path, directory_id
-                      FROM items
-                     WHERE id = ?
-                """, (item_id,))
-                data = cursor.fetchone()
-            if data:
-                data_dict = {
-                    "title": data[0],
-                    "responsible": data[1],
-                    "quantity": data[2],
-                    "description": data[3],
-                    "image_path": data[4],
-                    "directory_id": data[5]
-                }
-                self.undo_stack.append({"type": "delete", "data": data_dict})
-                if len(self.undo_stack) > self.max_undo:
-                    self.undo_stack.pop(0)
             with obter_conexao() as conn:
-                cursor = conn.cursor()
-                cursor.execute("DELETE FROM items WHERE id = ?", (item_id,))
-                conn.commit()
-            self.refresh_table()
+                iniciar_escrita(conn)
+                rows = capturar(conn, "items", item_ids)
+                notes = capturar(conn, "notes", [("item", item_id) for item_id in item_ids])
+                conn.executemany("DELETE FROM notes WHERE entity_type = 'item' AND entity_id = ?",
+                                 [(item_id,) for item_id in item_ids])
+                conn.executemany("DELETE FROM items WHERE id = ?", [(item_id,) for item_id in item_ids])
+                if rows:
+                    registrar(conn, self.describe_items("Delete", rows),
+                              [inserir("items", rows), inserir("notes", notes)],
+                              [excluir("notes", notes), excluir("items", rows)])
+            notifier.notify("item", "deleted", item_ids)
         except Exception as e:
             QMessageBox.critical(self, "Error", f"Error deleting item: {e}")
 
     def move_item(self):
-        item_id = self.get_selected_item_id()
-        if not item_id:
+        if not self.ensure_writable():
+            return
+        item_ids = self.get_selected_item_ids()
+        if not item_ids:
             QMessageBox.warning(self, "Warning", "Select an item to move.")
             return
         from dialogs.move_item_dialog import MoveItemDialog
@@ -872,52 +1281,72 @@ class MainWindow(QMainWindow):
         if dlg.exec_() == QDialog.Accepted:
             new_dir_id = dlg.selected_directory_id
             if new_dir_id:
-                try:
-                    with obter_conexao() as conn:
-                        cursor = conn.cursor()
-                        cursor.execute("""
-                            UPDATE items
-                               SET directory_id = ?
-                             WHERE id = ?
-                        """, (new_dir_id, item_id))
-                        conn.commit()
-                    self.load_items(self.get_selected_directory_id())
-                except Exception as e:
-                    QMessageBox.critical(self, "Error", f"Error moving item: {e}")
+                self.update_items(item_ids, "Move", ("directory_id",),
+                                  "UPDATE items SET directory_id = ? WHERE id = ?",
+                                  [(new_dir_id, item_id) for item_id in item_ids])
+
+    def set_items_responsible(self):
+        if not self.ensure_writable():
+            return
+        item_ids = self.get_selected_item_ids()
+        if not item_ids:
+            QMessageBox.warning(self, "Warning", "Select the items to edit.")
+            return
+        responsible, ok = QInputDialog.getText(self, "Set Responsible",
+                                               f"Responsible for {len(item_ids)} item(s):")
+        if ok:
+            self.update_items(item_ids, "Set responsible of", ("responsible",),
+                              "UPDATE items SET responsible = ? WHERE id = ?",
+                              [(responsible.strip(), item_id) for item_id in item_ids])
+
+    def adjust_items_quantity(self):
+        if not self.ensure_writable():
+            return
+        item_ids = self.get_selected_item_ids()
+        if not item_ids:
+            QMessageBox.warning(self, "Warning", "Select the items to adjust.")
+            return
+        delta, ok = QInputDialog.getInt(self, "Adjust Quantity",
+                                        f"Add to the quantity of {len(item_ids)} item(s) (negative subtracts):",
+                                        0, -1000000, 1000000)
+        if ok and delta:
+            # Same relative update as the +/- buttons: never below zero
+            self.update_items(item_ids, "Adjust quantity of", ("quantity",), QUANTITY_UPDATE_SQL,
+                              [(delta, item_id) for item_id in item_ids], relative=True)
 
     def duplicate_item(self):
-        item_id = self.get_selected_item_id()
-        if not item_id:
+        if not self.ensure_writable():
+            return
+        item_ids = self.get_selected_item_ids()
+        if not item_ids:
             QMessageBox.warning(self, "Warning", "Select an item to duplicate.")
             return
         try:
             with obter_conexao() as conn:
+                iniciar_escrita(conn)
+                originals = capturar(conn, "items", item_ids, ("title",))
                 cursor = conn.cursor()
-                cursor.execute("""
-                    SELECT title, responsible, quantity, description, image_path, directory_id
-                      FROM items
-                     WHERE id = ?
-                """, (item_id,))
-                row = cursor.fetchone()
-                if row:
-                    title, responsible, quantity, description, image_path, directory_id = row
-                    new_title = f"Copy of {title}"
+                new_ids = []
+                # One row at a time: lastrowid is the id of exactly this copy
+                for original in originals:
                     cursor.execute("""
                         INSERT INTO items (title, responsible, quantity, description, image_path, directory_id)
-                        VALUES (?, ?, ?, ?, ?, ?)
-                    """, (new_title, responsible, quantity, description, image_path, directory_id))
-                    conn.commit()
-                    new_id = cursor.lastrowid
-                    self.undo_stack.append({"type": "insert", "item_id": new_id})
-                    if len(self.undo_stack) > self.max_undo:
-                        self.undo_stack.pop(0)
-            current_dir = self.get_selected_directory_id()
-            if current_dir:
-                self.load_items(current_dir)
+                        SELECT 'Copy of ' || title, responsible, quantity, description, image_path, directory_id
+                          FROM items
+                         WHERE id = ?
+                    """, (original["id"],))
+                    if cursor.rowcount == 1:
+                        new_ids.append(cursor.lastrowid)
+                rows = capturar(conn, "items", new_ids)
+                if rows:
+                    registrar(conn, self.describe_items("Duplicate", originals),
+                              [excluir("items", rows)], [inserir("items", rows)])
+            notifier.notify("item", "inserted", new_ids)
         except Exception as e:
             QMessageBox.critical(self, "Error", f"Error duplicating item: {e}")
 
-    def on_item_double_clicked(self, row, column):
+    def on_item_double_clicked(self, index):
+        self.quantity_buffer.flush()
         item_id = self.get_selected_item_id()
         if item_id:
             dlg = ItemDetailDialog(self, item_id=int(item_id))
@@ -930,22 +1359,30 @@ class MainWindow(QMainWindow):
         action_add.triggered.connect(self.add_item)
         menu.addAction(action_add)
         if row >= 0:
+            count = len(self.get_selected_item_ids())
+            label = "Item" if count <= 1 else f"{count} Items"
             action_edit = QAction("Edit Item", self)
             action_edit.triggered.connect(self.edit_item)
+            action_edit.setEnabled(count <= 1)
             menu.addAction(action_edit)
-            action_del = QAction("Delete Item", self)
+            action_del = QAction(f"Delete {label}", self)
             action_del.triggered.connect(self.delete_item)
             menu.addAction(action_del)
-            action_move = QAction("Move Item", self)
+            action_move = QAction(f"Move {label}", self)
             action_move.triggered.connect(self.move_item)
             menu.addAction(action_move)
-            action_duplicate = QAction("Duplicate Item", self)
+            action_duplicate = QAction(f"Duplicate {label}", self)
             action_duplicate.triggered.connect(self.duplicate_item)
             menu.addAction(action_duplicate)
-            item_id = self.table_items.item(row, 0).text()
+            action_responsible = QAction("Set Responsible...", self)
+            action_responsible.triggered.connect(self.set_items_responsible)
+            menu.addAction(action_responsible)
+            action_quantity = QAction("Adjust Quantity...", self)
+            action_quantity.triggered.connect(self.adjust_items_quantity)
+            menu.addAction(action_quantity)
+            item_id = self.items_model.item_id(row)
             key = f"item_{item_id}"
-            notes = load_notes()
-            if key in notes and notes[key].get("text"):
+            if self.items_model.note_text(row):
                 action_note = QAction("Delete Note", self)
                 action_note.triggered.connect(lambda: self.delete_note(key))
             else:
@@ -956,185 +1393,213 @@ class MainWindow(QMainWindow):
 
     # -------------------- Items Search --------------------
     def search_items(self):
+        self.search_timer.stop()
         term = self.search_line_edit.text().strip()
         if not term:
             return
-        like_term = f"%{term}%"
-        query = """
-        WITH RECURSIVE subdirs(id) AS (
-          SELECT id FROM directories WHERE name LIKE ?
-          UNION ALL
-          SELECT d.id FROM directories d JOIN subdirs s ON d.parent_id = s.id
-        )
-        SELECT items.id, items.title, items.responsible, items.quantity,
-               items.image_path, directories.name, items.description
-          FROM items
-          JOIN directories ON items.directory_id = directories.id
-         WHERE items.title LIKE ?
-            OR items.description LIKE ?
-            OR items.responsible LIKE ?
-            OR items.directory_id IN (SELECT id FROM subdirs)
-        """
-        try:
-            from widgets.quantity_widget import QuantityWidget
-            with obter_conexao() as conn:
-                cursor = conn.cursor()
-                cursor.execute(query, (like_term, like_term, like_term, like_term))
-                rows = cursor.fetchall()
-            self.table_items.setColumnCount(7)
-            self.table_items.setHorizontalHeaderLabels(
-                ["ID", "Title", "Responsible", "Quantity", "Image", "Description", "Directory"]
-            )
-            self.table_items.setRowCount(len(rows))
-            for i, row in enumerate(rows):
-                item_id, title, resp, qty, image_path, dir_name, desc = row
-                self.table_items.setItem(i, 0, QTableWidgetItem(str(item_id)))
-                self.table_items.setItem(i, 1, QTableWidgetItem(title))
-                self.table_items.setItem(i, 2, QTableWidgetItem(resp or ""))
-                quantity = qty if qty is not None else 0
-                quantity_widget = QuantityWidget(item_id, quantity)
-                self.table_items.setCellWidget(i, 3, quantity_widget)
-                self.table_items.setItem(i, 4, QTableWidgetItem("Yes" if image_path else "No"))
-                self.table_items.setItem(i, 5, QTableWidgetItem(desc or ""))
-                self.table_items.setItem(i, 6, QTableWidgetItem(dir_name or ""))
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"Error searching items: {e}")
+        query, params = montar_busca(term, self.fts_available)
+        # A newer search supersedes (and interrupts) the one still running
+        self.items_model.set_query(query, params, with_directory=True, kind="search", detail=term)
+
+    def on_search_text_changed(self, text):
+        if not self.search_config.get("as_you_type"):
+            return
+        term = text.strip()
+        if len(term) >= int(self.search_config.get("min_chars", 2)):
+            self.search_timer.start()
+        else:
+            self.search_timer.stop()
+            if not term:
+                self.refresh_table()
+
+    def toggle_search_as_you_type(self, enabled):
+        self.search_config["as_you_type"] = enabled
+        self.save_config()
+        if not enabled:
+            self.search_timer.stop()
 
     def clear_search(self):
+        self.search_timer.stop()
+        self.search_line_edit.blockSignals(True)
         self.search_line_edit.clear()
+        self.search_line_edit.blockSignals(False)
         directory_id = self.get_selected_directory_id()
         if directory_id:
             self.load_items(directory_id)
         else:
-            self.table_items.setRowCount(0)
+            self.items_model.clear()
 
     # -------------------- CSV & Backup --------------------
+    def start_background_task(self, worker, title, label, unit="rows"):
+        """Runs a QThread worker with a progress dialog; returns False if another task is running."""
+        if self.background_task is not None:
+            QMessageBox.warning(self, title, "Another export, import or backup is still running.")
+            return False
+        self.background_task = worker
+        dialog = TaskProgressDialog(title, label, unit, self)
+        dialog.attach(worker)
+        worker.finished.connect(self.on_background_task_finished)
+        worker.start()
+        dialog.show()
+        return True
+
+    def on_background_task_finished(self):
+        worker, self.background_task = self.background_task, None
+        if worker is not None:
+            worker.deleteLater()
+
     def export_csv(self):
-        try:
-            path, _ = QFileDialog.getSaveFileName(self, "Export DB to CSV", "", "CSV Files (*.csv)")
-            if not path:
-                return
-            with obter_conexao() as conn:
-                cursor = conn.cursor()
-                cursor.execute("SELECT * FROM directories")
-                directories = cursor.fetchall()
-                dir_columns = [desc[0] for desc in cursor.description]
-                cursor.execute("SELECT * FROM items")
-                items = cursor.fetchall()
-                item_columns = [desc[0] for desc in cursor.description]
-            with open(path, "w", newline="", encoding="utf-8") as f:
-                writer = csv.writer(f)
-                writer.writerow(["=== DIRECTORIES ==="])
-                writer.writerow(dir_columns)
-                for row in directories:
-                    writer.writerow(row)
-                writer.writerow([])
-                writer.writerow(["=== ITEMS ==="])
-                writer.writerow(item_columns)
-                for row in items:
-                    writer.writerow(row)
-            QMessageBox.information(self, "CSV", "Export completed.")
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"Error exporting CSV: {e}")
+        self.quantity_buffer.flush()
+        directory_id = self.get_selected_directory_id()
+        dlg = QDialog(self)
+        dlg.setWindowTitle("Export DB to CSV")
+        layout = QVBoxLayout(dlg)
+        check_subtree = QCheckBox("Only the selected directory and its subdirectories")
+        check_subtree.setEnabled(directory_id is not None)
+        layout.addWidget(check_subtree)
+        check_paths = QCheckBox("Include full directory paths")
+        layout.addWidget(check_paths)
+        btn_layout = QHBoxLayout()
+        layout.addLayout(btn_layout)
+        btn_ok = QPushButton("OK")
+        btn_ok.clicked.connect(dlg.accept)
+        btn_layout.addWidget(btn_ok)
+        btn_cancel = QPushButton("Cancel")
+        btn_cancel.clicked.connect(dlg.reject)
+        btn_layout.addWidget(btn_cancel)
+        if dlg.exec_() != QDialog.Accepted:
+            return
+        path, _ = QFileDialog.getSaveFileName(self, "Export DB to CSV", "", "CSV Files (*.csv)")
+        if not path:
+            return
+        # Rows are streamed from the DB to the file on a worker thread
+        worker = CsvExportWorker(path, directory_id if check_subtree.isChecked() else None,
+                                 check_paths.isChecked(), self)
+        worker.completed.connect(lambda rows, seconds: QMessageBox.information(
+            self, "CSV", f"Export completed: {rows:,} rows in {format_duration(seconds)}."))
+        worker.failed.connect(lambda message: QMessageBox.critical(self, "Error", f"Error exporting CSV: {message}"))
+        worker.cancelled.connect(lambda: QMessageBox.information(self, "CSV", "Export cancelled."))
+        self.start_background_task(worker, "Export DB to CSV", f"Exporting to {os.path.basename(path)}...")
 
     def import_csv(self):
-        try:
-            path, _ = QFileDialog.getOpenFileName(self, "Select CSV", "", "CSV Files (*.csv)")
-            if not path:
-                return
-            with open(path, "r", encoding="utf-8") as f:
-                reader = csv.reader(f)
-                content = list(reader)
-            if not content:
-                QMessageBox.warning(self, "CSV", "Empty CSV file.")
-                return
+        if not self.ensure_writable():
+            return
+        path, _ = QFileDialog.getOpenFileName(self, "Select CSV", "", "CSV Files (*.csv)")
+        if not path:
+            return
+        # Parsed and inserted in batches on a worker thread, in a single transaction. That
+        # transaction holds the write lock until the end, so changes here are refused meanwhile
+        # instead of freezing the window behind it.
+        worker = CsvImportWorker(path, self)
+        worker.completed.connect(lambda result, seconds: self.on_csv_imported(path, result, seconds))
+        worker.failed.connect(lambda message: QMessageBox.critical(self, "Error", f"Error importing CSV: {message}"))
+        worker.cancelled.connect(lambda: QMessageBox.information(self, "CSV", "Import cancelled; nothing was imported."))
+        worker.finished.connect(lambda: self.set_write_block(None))
+        self.set_write_block("CSV import in progress")
+        if not self.start_background_task(worker, "Import DB from CSV", f"Importing {os.path.basename(path)}...",
+                                          unit="lines"):
+            self.set_write_block(None)
+
+    def on_csv_imported(self, path, result, seconds):
+        self.load_tree(select_id=self.get_selected_directory_id())
+        self.items_model.reload()
+        message = (f"Import completed in {format_duration(seconds)}: "
+                   f"{result.directories:,} directories and {result.items:,} items.")
+        if result.errors:
+            report_path = os.path.splitext(path)[0] + "_import_errors.txt"
             try:
-                idx_dir = content.index(["=== DIRECTORIES ==="])
-                idx_items = content.index(["=== ITEMS ==="])
-            except ValueError:
-                QMessageBox.warning(self, "CSV", "Invalid CSV format (missing sections).")
-                return
-            dir_headers = content[idx_dir + 1]
-            directories = content[idx_dir + 2:idx_items]
-            item_headers = content[idx_items + 1]
-            items = content[idx_items + 2:]
-            idx_id_dir, idx_name_dir, idx_parent_dir = 0, 1, 2
-            old_dirs = {}
-            for row in directories:
-                if not row:
-                    continue
-                old_id = int(row[idx_id_dir])
-                name = row[idx_name_dir]
-                parent_str = row[idx_parent_dir].strip() if len(row) > idx_parent_dir else ""
-                parent_id = None if parent_str == "" else int(parent_str)
-                old_dirs[old_id] = (name, parent_id)
-            id_map = {}
-
-            def insert_dir(od_id, cursor):
-                if od_id in id_map:
-                    return id_map[od_id]
-                nm, pid = old_dirs[od_id]
-                new_parent = None if pid is None or pid not in old_dirs else insert_dir(pid, cursor)
-                cursor.execute("INSERT INTO directories (name, parent_id) VALUES (?, ?)", (nm, new_parent))
-                new_id = cursor.lastrowid
-                id_map[od_id] = new_id
-                return new_id
-
-            with obter_conexao() as conn:
-                cursor = conn.cursor()
-                for od_id in old_dirs:
-                    insert_dir(od_id, cursor)
-                conn.commit()
-            idx_id_item, idx_title_item, idx_resp_item, idx_qty_item, idx_desc_item, idx_img_item, idx_dir_item = 0, 1, 2, 3, 4, 5, 6
-            with obter_conexao() as conn:
-                cursor = conn.cursor()
-                for row in items:
-                    if not row:
-                        continue
-                    title = row[idx_title_item]
-                    responsible = row[idx_resp_item]
-                    qty_str = row[idx_qty_item].strip()
-                    quantity = int(qty_str) if qty_str else None
-                    description = row[idx_desc_item]
-                    image_path = row[idx_img_item]
-                    old_dir_str = row[idx_dir_item].strip()
-                    old_dir = None if old_dir_str == "" else int(old_dir_str)
-                    new_dir = id_map.get(old_dir) if old_dir else None
-                    cursor.execute("""
-                            INSERT INTO items (title, responsible, quantity, description, image_path, directory_id)
-                            VALUES (?, ?, ?, ?, ?, ?)
-                        """, (title, responsible, quantity, description, image_path, new_dir))
-                conn.commit()
-            QMessageBox.information(self, "CSV", "Import completed successfully.")
-            self.load_tree()
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"Error importing CSV: {e}")
+                with open(report_path, "w", encoding="utf-8") as f:
+                    for line, error in result.errors:
+                        f.write(f"Line {line}: {error}\n")
+            except OSError as e:
+                report_path = f"(could not be saved: {e})"
+            shown = "\n".join(f"Line {line}: {error}" for line, error in result.errors[:10])
+            more = f"\n... and {len(result.errors) - 10} more" if len(result.errors) > 10 else ""
+            QMessageBox.warning(self, "CSV", f"{message}\n\n{len(result.errors):,} rows were skipped:\n"
+                                             f"{shown}{more}\n\nFull report: {report_path}")
+        else:
+            QMessageBox.information(self, "CSV", message)
 
     def backup_db(self):
-        try:
-            zip_name = f"backup_db_{os.path.splitext(os.path.basename(NOME_DB))[0]}.zip"
-            with zipfile.ZipFile(zip_name, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                zipf.write(NOME_DB, os.path.basename(NOME_DB))
-            QMessageBox.information(self, "Backup", f"DB backup created: {zip_name}")
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"Error backing up DB: {e}")
+        self.quantity_buffer.flush()
+        # Consistent snapshot (SQLite backup API) compressed on a worker thread
+        worker = BackupWorker(parent=self)
+        worker.completed.connect(lambda path, seconds: QMessageBox.information(
+            self, "Backup", f"DB backup created in {format_duration(seconds)}: {path}"))
+        worker.failed.connect(lambda message: QMessageBox.critical(self, "Error", f"Error backing up DB: {message}"))
+        worker.cancelled.connect(lambda: QMessageBox.information(self, "Backup", "DB backup cancelled."))
+        self.start_background_task(worker, "Backup DB", "Backing up the database...", unit="KB")
 
     def backup_images(self):
+        self.quantity_buffer.flush()
+        # New generation: DB snapshot plus a manifest of the images; only new or changed images are copied
+        worker = BackupWorker(backup_geracao, (int(self.backup_config.get("generations", 10)),), self)
+        worker.completed.connect(self.on_images_backed_up)
+        worker.failed.connect(lambda message: QMessageBox.critical(self, "Error", f"Error backing up images: {message}"))
+        worker.cancelled.connect(lambda: QMessageBox.information(self, "Backup", "Backup cancelled."))
+        self.start_background_task(worker, "Backup DB + Images", "Backing up the database and images...", unit="KB")
+
+    def on_images_backed_up(self, result, seconds):
+        message = (f"Backup {result['generation']} created in {format_duration(seconds)}: "
+                   f"{result['files']:,} images, {result['changed']:,} new or changed, "
+                   f"{result['copied_bytes'] / (1024 * 1024):,.1f} MB copied.")
+        if result["removed"]:
+            message += f"\nOld backups removed: {', '.join(result['removed'])}"
+        QMessageBox.information(self, "Backup", message)
+
+    def restore_backup(self):
+        if not self.ensure_writable():
+            return
         try:
-            zip_name = f"backup_images_{os.path.basename(IMAGES_FOLDER)}.zip"
-            with zipfile.ZipFile(zip_name, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                for root, dirs, files in os.walk(IMAGES_FOLDER):
-                    for file in files:
-                        full_path = os.path.join(root, file)
-                        arcname = os.path.relpath(full_path, os.path.dirname(IMAGES_FOLDER))
-                        zipf.write(full_path, arcname)
-            QMessageBox.information(self, "Backup", f"Images backup created: {zip_name}")
+            generations = list(reversed(listar_geracoes()))
+            labels = []
+            for generation in generations:
+                manifest = ler_manifesto(generation)
+                created = datetime.datetime.strptime(generation, "%Y%m%d_%H%M%S")
+                labels.append(f"{created:%Y-%m-%d %H:%M:%S} ({len(manifest['files']):,} images)")
         except Exception as e:
-            QMessageBox.critical(self, "Error", f"Error backing up images: {e}")
+            QMessageBox.critical(self, "Error", f"Error reading backups: {e}")
+            return
+        if not generations:
+            QMessageBox.information(self, "Restore", "There are no DB + Images backups next to this database.")
+            return
+        label, ok = QInputDialog.getItem(self, "Restore DB + Images", "Backup:", labels, 0, False)
+        if not ok:
+            return
+        generation = generations[labels.index(label)]
+        resp = QMessageBox.question(
+            self, "Confirm",
+            "Replace the current database and images with this backup?\n"
+            "Changes made after the backup will be lost, also for other users of this database."
+        )
+        if resp != QMessageBox.Yes:
+            return
+        worker = BackupWorker(restaurar_geracao, (generation,), self)
+        worker.completed.connect(self.on_backup_restored)
+        worker.failed.connect(lambda message: QMessageBox.critical(self, "Error", f"Error restoring backup: {message}"))
+        worker.cancelled.connect(lambda: QMessageBox.information(
+            self, "Restore", "Restore cancelled before the database was replaced."))
+        # The database copy holds the write lock: refuse changes (and +/- flushes) until it ends
+        worker.finished.connect(lambda: self.set_write_block(None))
+        self.set_write_block("backup restore in progress")
+        if not self.start_background_task(worker, "Restore DB + Images", "Restoring the backup...", unit="KB"):
+            self.set_write_block(None)
+
+    def on_backup_restored(self, restored_images, seconds):
+        try:
+            # The restored DB may come from an older schema version
+            verificar_ou_criar_db()
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Error opening the restored DB: {e}")
+        self.update_read_only_state()
+        self.items_model.clear()
+        self.load_tree()
+        self.check_search_index()
+        QMessageBox.information(self, "Restore", f"Backup restored in {format_duration(seconds)} "
+                                                 f"({restored_images:,} images copied back).")
 
     def backup_configs(self):
         try:
-            import datetime
             config_path = get_config_path()
             folder = os.path.dirname(config_path)
             zip_name = os.path.join(folder,
@@ -1235,72 +1700,52 @@ class MainWindow(QMainWindow):
                 if current_visual != desired_visual:
                     header.moveSection(current_visual, desired_visual)
 
-    def edit_note(self, key, widget=None):
+    def edit_note(self, key):
         """
         Opens the NoteDialog to add/edit a note.
         'key' should be "dir_<id>" for directories or "item_<id>" for items.
-        If widget is provided, update its tooltip and background.
         """
-        notes_db = load_notes()
-        current_note = notes_db.get(key, {}).get("text", "")
-        current_color = notes_db.get(key, {}).get("color", "")
-        # Fallback para AppData
-        if not current_note or not current_color:
-            notes_appdata = load_appdata_notes()
-            current_note = current_note or notes_appdata.get(key, {}).get("text", "")
-            current_color = current_color or notes_appdata.get(key, {}).get("color", "")
-        dialog = NoteDialog(current_note, current_color)
+        if not self.ensure_writable():
+            return
+        try:
+            current = notes_store.get(key)
+        except sqlite3.Error as e:
+            QMessageBox.critical(self, "Error", f"Error loading note: {e}")
+            return
+        dialog = NoteDialog(current.get("text", ""), current.get("color", ""))
         if dialog.exec_() == QDialog.Accepted:
             note_text, note_color = dialog.get_note_data()
-            notes_db[key] = {"text": note_text, "color": note_color}
-            save_notes(notes_db)
-            if widget is not None:
-                # Verifica se o widget é um QTreeWidgetItem ou QTableWidgetItem
-                from PyQt5.QtWidgets import QTreeWidgetItem, QTableWidgetItem
-                if isinstance(widget, QTreeWidgetItem):
-                    widget.setToolTip(0, note_text)
-                    if note_color:
-                        widget.setBackground(0, QColor(note_color))
-                    else:
-                        widget.setBackground(0, QColor())
-                elif isinstance(widget, QTableWidgetItem):
-                    widget.setToolTip(note_text)
-                    if note_color:
-                        widget.setBackground(QColor(note_color))
-                    else:
-                        widget.setBackground(QColor())
-        self.refresh_tree_and_table()
+            try:
+                notes_store.set(key, note_text, note_color)
+            except sqlite3.Error as e:
+                QMessageBox.critical(self, "Error", f"Error saving note: {e}")
+                return
+            self.notify_note_changed(key)
 
-    def delete_note(self, key, widget=None):
-        """
-        Deletes the note for 'key' from the DB JSON.
-        Updates the widget (clearing tooltip and background) if provided.
-        """
-        notes_db = load_notes()
-        if key in notes_db:
-            del notes_db[key]
-            save_notes(notes_db)
-        else:
-            notes_appdata = load_appdata_notes()
-            if key in notes_appdata:
-                del notes_appdata[key]
-        if widget is not None:
-            from PyQt5.QtWidgets import QTreeWidgetItem, QTableWidgetItem
-            if isinstance(widget, QTreeWidgetItem):
-                widget.setToolTip(0, "")
-                widget.setBackground(0, QColor())
-            elif isinstance(widget, QTableWidgetItem):
-                widget.setToolTip("")
-                widget.setBackground(QColor())
-        self.refresh_tree_and_table()
+    def delete_note(self, key):
+        """Deletes the note for 'key' from the DB."""
+        if not self.ensure_writable():
+            return
+        try:
+            notes_store.delete(key)
+        except sqlite3.Error as e:
+            QMessageBox.critical(self, "Error", f"Error deleting note: {e}")
+            return
+        self.notify_note_changed(key)
+
+    def notify_note_changed(self, key):
+        parsed = parse_note_key(key)
+        if parsed:
+            entity_type, entity_id = parsed
+            notifier.notify("directory" if entity_type == "dir" else "item", "updated", [entity_id], ("note",))
 
     def eventFilter(self, obj, event):
         if event.type() == QEvent.ToolTip:
             if obj == self.tree_directories.viewport():
                 pos = event.pos()
-                item = self.tree_directories.itemAt(pos)
-                if item:
-                    note_text = item.toolTip(0)
+                index = self.tree_directories.indexAt(pos)
+                if index.isValid():
+                    note_text = index.data(Qt.ToolTipRole)
                     if note_text:
                         QToolTip.showText(event.globalPos(), note_text, self.tree_directories)
                         return True
@@ -1308,19 +1753,16 @@ class MainWindow(QMainWindow):
                 pos = event.pos()
                 index = self.table_items.indexAt(pos)
                 if index.isValid():
-                    # Vamos supor que o tooltip esteja na coluna 1
-                    item = self.table_items.item(index.row(), 1)
-                    if item:
-                        note_text = item.toolTip()
-                        if note_text:
-                            QToolTip.showText(event.globalPos(), note_text, self.table_items)
-                            return True
+                    # A nota é exibida para a linha inteira; o modelo já a carregou com a linha
+                    note_text = self.items_model.note_text(index.row())
+                    if note_text:
+                        QToolTip.showText(event.globalPos(), note_text, self.table_items)
+                        return True
         return super().eventFilter(obj, event)
 
     def show_all_notes(self):
         from dialogs.notes_list_dialog import NotesListDialog
-        notes = load_notes()  # Você pode querer mesclar com appdata se necessário
-        dialog = NotesListDialog(notes)
+        dialog = NotesListDialog()
         dialog.exec_()
         # Após fechar o diálogo, recarregue a árvore e a tabela para atualizar eventuais mudanças
         self.refresh_tree_and_table()
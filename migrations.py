@@ -0,0 +1,208 @@
+"""
+Migrações versionadas do esquema do banco.
+
+A versão do esquema fica gravada em PRAGMA user_version. Cada migração roda
+em sua própria transação e só avança a versão se todos os seus comandos
+forem aplicados, permitindo evoluir bancos já existentes no lugar.
+"""
+
+from directory_closure import criar_caminhos, criar_closure, reconstruir_caminhos, reconstruir_closure
+from directory_stats import criar_estatisticas, reconstruir_estatisticas
+from search_index import atualizar_triggers_busca, criar_tabela_busca, criar_triggers_notas
+
+
+def _migracao_1(conn):
+    """Tabelas base (bancos criados antes das migrações já as possuem)."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS directories (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            parent_id INTEGER,
+            note TEXT,
+            FOREIGN KEY(parent_id) REFERENCES directories(id)
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            responsible TEXT,
+            quantity INTEGER,
+            description TEXT,
+            image_path TEXT,
+            directory_id INTEGER,
+            note TEXT,
+            FOREIGN KEY(directory_id) REFERENCES directories(id)
+        )
+    """)
+
+
+def _migracao_2(conn):
+    """Índices das consultas mais frequentes (clique na árvore, CTEs recursivas, título)."""
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_items_directory_id ON items(directory_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_directories_parent_id ON directories(parent_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_items_title ON items(title)")
+
+
+def _migracao_3(conn):
+    """Tabela de fechamento da hierarquia de diretórios, populada a partir de parent_id."""
+    criar_closure(conn)
+    reconstruir_closure(conn)
+
+
+def _migracao_4(conn):
+    """
+    Tabela FTS5 de busca dos itens (ignorada se o SQLite não tiver FTS5).
+    Triggers e conteúdo vêm na migração 9, que depende de directories.path.
+    """
+    criar_tabela_busca(conn)
+
+
+def _migracao_5(conn):
+    """Tabela de notas, importando o notes.json compartilhado ao lado do banco."""
+    from notes_utils import load_notes, import_json_notes
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS notes (
+            entity_type TEXT NOT NULL CHECK (entity_type IN ('dir', 'item')),
+            entity_id INTEGER NOT NULL,
+            text TEXT,
+            color TEXT,
+            created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (entity_type, entity_id)
+        )
+    """)
+    import_json_notes(conn, load_notes(), overwrite=True)
+    criar_triggers_notas(conn)
+
+
+def _migracao_6(conn):
+    """Caminho completo materializado em directories.path, mantido por triggers."""
+    criar_caminhos(conn)
+    reconstruir_caminhos(conn)
+
+
+def _migracao_7(conn):
+    """Contadores de itens, quantidades e imagens por diretório e subárvore, mantidos por triggers."""
+    criar_estatisticas(conn)
+    reconstruir_estatisticas(conn)
+
+
+def _migracao_8(conn):
+    """Diário persistente de desfazer/refazer."""
+    from undo_journal import criar_diario
+    criar_diario(conn)
+
+
+def _migracao_9(conn):
+    """Triggers de items_fts passam a ler directories.path em vez de percorrer a closure."""
+    atualizar_triggers_busca(conn)
+
+
+# (versão, descrição, função) em ordem crescente de versão
+MIGRACOES = [
+    (1, "tabelas base", _migracao_1),
+    (2, "índices de items.directory_id, directories.parent_id e items.title", _migracao_2),
+    (3, "tabela de fechamento directory_closure", _migracao_3),
+    (4, "índice de busca FTS5 items_fts", _migracao_4),
+    (5, "tabela notes (importada de notes.json)", _migracao_5),
+    (6, "coluna directories.path com o caminho completo", _migracao_6),
+    (7, "tabela directory_stats com contadores por diretório", _migracao_7),
+    (8, "tabela undo_journal de desfazer/refazer", _migracao_8),
+    (9, "triggers de items_fts usando directories.path", _migracao_9),
+]
+
+VERSAO_ESQUEMA = MIGRACOES[-1][0]
+
+
+def versao_atual(conn):
+    """Retorna a versão do esquema gravada no banco."""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def aplicar_migracoes(conn):
+    """
+    Aplica, em ordem, as migrações ainda não aplicadas ao banco.
+    Retorna a lista de versões aplicadas.
+    """
+    if conn.in_transaction:
+        conn.commit()
+    aplicadas = []
+    for versao, descricao, migracao in MIGRACOES:
+        if versao <= versao_atual(conn):
+            continue
+        try:
+            conn.execute("BEGIN")
+            migracao(conn)
+            conn.execute(f"PRAGMA user_version = {versao}")
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            print(f"Erro na migração {versao} ({descricao}):", e)
+            raise
+        print(f"Migração {versao} aplicada: {descricao}")
+        aplicadas.append(versao)
+    return aplicadas
+
+
+# Consultas críticas e o índice que cada uma deve usar segundo o EXPLAIN QUERY PLAN
+CONSULTAS_INDEXADAS = [
+    (
+        "load_items",
+        "SELECT id, title, responsible, quantity, image_path, description FROM items WHERE directory_id = ?",
+        (1,),
+        "idx_items_directory_id",
+    ),
+    (
+        "subdiretórios",
+        "SELECT id FROM directories WHERE parent_id = ?",
+        (1,),
+        "idx_directories_parent_id",
+    ),
+    (
+        "load_items_recursive",
+        """
+        SELECT items.id FROM directory_closure c JOIN items ON items.directory_id = c.descendant_id
+         WHERE c.ancestor_id = ?
+        """,
+        (1,),
+        "idx_items_directory_id",
+    ),
+    (
+        "busca por título",
+        "SELECT id FROM items WHERE title = ?",
+        ("",),
+        "idx_items_title",
+    ),
+]
+
+
+def verificar_planos_de_consulta(conn):
+    """
+    Roda EXPLAIN QUERY PLAN nas consultas críticas e retorna uma lista de
+    (nome, índice esperado, usa_indice, plano) para cada uma.
+    """
+    resultados = []
+    for nome, sql, params, indice in CONSULTAS_INDEXADAS:
+        plano = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+        usa_indice = any(indice in passo for passo in plano)
+        resultados.append((nome, indice, usa_indice, " | ".join(plano)))
+    return resultados
+
+
+if __name__ == "__main__":
+    # Uso: python migrations.py [caminho/do/inventario.db]
+    import sys
+
+    import database
+
+    if len(sys.argv) > 1:
+        database.set_database_path(sys.argv[1])
+    database.verificar_ou_criar_db()
+    with database.obter_conexao(somente_leitura=True) as conexao:
+        print("Versão do esquema:", versao_atual(conexao))
+        falhas = 0
+        for nome_consulta, nome_indice, ok, detalhe in verificar_planos_de_consulta(conexao):
+            print(f"[{'OK' if ok else 'FALHA'}] {nome_consulta} ({nome_indice}): {detalhe}")
+            falhas += 0 if ok else 1
+    sys.exit(1 if falhas else 0)
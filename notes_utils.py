@@ -1,17 +1,20 @@
 import json
 import os
 
-from database import NOME_DB  # To get the DB directory
+import database  # To get the (current) DB directory
 
 
 def get_notes_path():
     """Returns the path of the notes JSON stored in the same directory as the DB."""
-    db_dir = os.path.dirname(NOME_DB)
+    db_dir = os.path.dirname(database.NOME_DB)
     return os.path.join(db_dir, "notes.json")
 
 
 def load_notes():
-    """Loads and returns notes from the DB JSON. Returns an empty dict if not exists."""
+    """
+    Loads and returns notes from the legacy DB JSON (only read by the one-time import
+    into the `notes` table). Returns an empty dict if not exists.
+    """
     path = get_notes_path()
     if os.path.exists(path):
         try:
@@ -22,16 +25,6 @@ def load_notes():
     return {}
 
 
-def save_notes(notes):
-    """Saves the notes dictionary to the DB JSON file."""
-    path = get_notes_path()
-    try:
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(notes, f, indent=4, ensure_ascii=False)
-    except Exception as e:
-        print("Error saving notes to DB:", e)
-
-
 # Functions for warnings dialog configuration stored in AppData.
 def get_appdata_config_path():
     """Returns the path for the configuration JSON in the user's AppData (or home) directory."""
@@ -94,24 +87,112 @@ def load_appdata_notes():
     return {}
 
 
+def parse_note_key(key):
+    """Splits a "dir_<id>"/"item_<id>" key into (entity_type, entity_id), or None if invalid."""
+    entity_type, _, entity_id = key.partition("_")
+    if entity_type not in ("dir", "item"):
+        return None
+    try:
+        return entity_type, int(entity_id)
+    except ValueError:
+        return None
+
+
+class NotesStore:
+    """
+    Notes stored in the `notes` table of the DB, addressed by the same keys used
+    before ("dir_<id>" for directories, "item_<id>" for items). Bulk loads
+    (tree, items table, notes list) join the table directly instead.
+    """
+
+    def get(self, key):
+        """Returns the note dict ({"text", "color"}) for key, or an empty dict."""
+        parsed = parse_note_key(key)
+        if parsed is None:
+            return {}
+        with database.obter_conexao(somente_leitura=True) as conn:
+            row = conn.execute(
+                "SELECT text, color FROM notes WHERE entity_type = ? AND entity_id = ?", parsed
+            ).fetchone()
+        if row is None:
+            return {}
+        return {"text": row[0] or "", "color": row[1] or ""}
+
+    def all(self):
+        """Returns all notes as a dict key -> {"text", "color"}."""
+        with database.obter_conexao(somente_leitura=True) as conn:
+            rows = conn.execute("SELECT entity_type, entity_id, text, color FROM notes").fetchall()
+        return {f"{t}_{i}": {"text": text or "", "color": color or ""} for t, i, text, color in rows}
+
+    def set(self, key, text, color):
+        """Creates or updates the note for key."""
+        parsed = parse_note_key(key)
+        if parsed is None:
+            raise ValueError(f"Invalid note key: {key}")
+        with database.obter_conexao() as conn:
+            upsert_note(conn, parsed[0], parsed[1], text, color)
+
+    def delete(self, key):
+        """Removes the note for key."""
+        parsed = parse_note_key(key)
+        if parsed is None:
+            return
+        with database.obter_conexao() as conn:
+            conn.execute("DELETE FROM notes WHERE entity_type = ? AND entity_id = ?", parsed)
+
+
+notes_store = NotesStore()
+
+
+def upsert_note(conn, entity_type, entity_id, text, color):
+    conn.execute("""
+        INSERT INTO notes (entity_type, entity_id, text, color)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT(entity_type, entity_id) DO UPDATE
+           SET text = excluded.text,
+               color = excluded.color,
+               updated_at = CURRENT_TIMESTAMP
+    """, (entity_type, entity_id, text, color))
+
+
+def import_json_notes(conn, notes, overwrite=False):
+    """
+    Imports a notes.json style dict into the `notes` table. Existing rows are kept
+    unless overwrite is True. Returns the number of notes imported.
+    """
+    rows = []
+    for key, value in notes.items():
+        parsed = parse_note_key(key)
+        if parsed is None or not isinstance(value, dict):
+            continue
+        rows.append((parsed[0], parsed[1], value.get("text", ""), value.get("color", "")))
+    verb = "INSERT OR REPLACE" if overwrite else "INSERT OR IGNORE"
+    conn.executemany(
+        f"{verb} INTO notes (entity_type, entity_id, text, color) VALUES (?, ?, ?, ?)", rows
+    )
+    return len(rows)
+
+
+def import_appdata_notes():
+    """
+    One-time import of this user's AppData notes into the DB (notes already in the DB
+    win). The file is then renamed to notes.imported.json so it is not imported again.
+    """
+    path = get_appdata_notes_path()
+    if not os.path.exists(path) or database.modo_somente_leitura():
+        return 0
+    notes = load_appdata_notes()
+    try:
+        with database.obter_conexao() as conn:
+            count = import_json_notes(conn, notes)
+        os.replace(path, os.path.join(os.path.dirname(path), "notes.imported.json"))
+        return count
+    except Exception as e:
+        print("Error importing appdata notes:", e)
+        return 0
+
+
 def get_directory_paths():
-    """Queries all directories from the DB and returns a dict mapping directory id to its full path."""
-    from database import obter_conexao
-    paths = {}
-    with obter_conexao() as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT id, name, parent_id FROM directories")
-        rows = cursor.fetchall()
-    # Cria um dicionário com os dados dos diretórios.
-    dirs = {row[0]: {"name": row[1], "parent": row[2]} for row in rows}
-
-    def build_path(dir_id):
-        d = dirs[dir_id]
-        if d["parent"] is None:
-            return d["name"]
-        else:
-            return build_path(d["parent"]) + "/" + d["name"]
-
-    for d_id in dirs:
-        paths[d_id] = build_path(d_id)
-    return paths
+    """Returns a dict mapping directory id to its full path (the directories.path column kept by triggers)."""
+    with database.obter_conexao(somente_leitura=True) as conn:
+        return dict(conn.execute("SELECT id, COALESCE(path, name) FROM directories"))
@@ -0,0 +1,144 @@
+"""
+Índice em memória dos caminhos de diretório ("Raiz/Sub/Dir"), usado pelo
+completer e pela busca de diretórios da janela principal.
+
+Guarda a lista ordenada dos caminhos em minúsculas (para a listagem e a
+busca exata com bisect) e um índice de trigramas para buscas por trecho:
+um termo com 3 ou mais caracteres só é comparado com os caminhos que contêm
+todos os seus trigramas; termos menores percorrem todos os caminhos, como a
+busca por trecho original. Inclusões, renomeações e exclusões atualizam as
+estruturas de forma incremental, sem reconstruir o índice.
+"""
+import bisect
+
+# Termos menores que um trigrama não usam o índice de trigramas
+_TRIGRAM = 3
+
+
+def _trigrams(text):
+    return {text[i:i + _TRIGRAM] for i in range(len(text) - _TRIGRAM + 1)}
+
+
+def _name(path):
+    return path.rsplit("/", 1)[-1]
+
+
+class PathIndex:
+    """
+    Índice de {dir_id: caminho}. search() retorna os pares (dir_id, caminho)
+    ordenados pela qualidade da correspondência (nome igual ao termo, nome
+    começando pelo termo, nome contendo o termo, caminho começando pelo termo,
+    trecho do caminho) e, em seguida, pela profundidade do caminho.
+    """
+
+    def __init__(self, paths_by_id=None):
+        self._paths = {}
+        # (texto em minúsculas, dir_id), ordenados para bisect
+        self._sorted_paths = []
+        self._trigrams = {}
+        if paths_by_id:
+            self._paths = dict(paths_by_id)
+            for dir_id, path in self._paths.items():
+                lower = path.lower()
+                self._sorted_paths.append((lower, dir_id))
+                for trigram in _trigrams(lower):
+                    self._trigrams.setdefault(trigram, set()).add(dir_id)
+            self._sorted_paths.sort()
+
+    def __len__(self):
+        return len(self._paths)
+
+    def __contains__(self, dir_id):
+        return dir_id in self._paths
+
+    def path(self, dir_id):
+        return self._paths.get(dir_id)
+
+    def paths(self):
+        """Todos os caminhos, em ordem alfabética (sem diferenciar maiúsculas)."""
+        return [self._paths[dir_id] for _, dir_id in self._sorted_paths]
+
+    def id_for_path(self, path):
+        """dir_id do caminho exato (o de menor id, se houver caminhos repetidos), ou None."""
+        lower = path.lower()
+        position = bisect.bisect_left(self._sorted_paths, (lower,))
+        while position < len(self._sorted_paths) and self._sorted_paths[position][0] == lower:
+            dir_id = self._sorted_paths[position][1]
+            if self._paths[dir_id] == path:
+                return dir_id
+            position += 1
+        return None
+
+    # -------------------- Atualização --------------------
+    def add(self, dir_id, path):
+        """Inclui (ou substitui) o caminho de dir_id."""
+        if dir_id in self._paths:
+            self.remove(dir_id)
+        self._paths[dir_id] = path
+        lower = path.lower()
+        bisect.insort(self._sorted_paths, (lower, dir_id))
+        for trigram in _trigrams(lower):
+            self._trigrams.setdefault(trigram, set()).add(dir_id)
+
+    def remove(self, dir_id):
+        """Retira dir_id do índice e retorna o caminho que ele tinha (ou None)."""
+        path = self._paths.pop(dir_id, None)
+        if path is None:
+            return None
+        lower = path.lower()
+        del self._sorted_paths[bisect.bisect_left(self._sorted_paths, (lower, dir_id))]
+        for trigram in _trigrams(lower):
+            ids = self._trigrams[trigram]
+            ids.discard(dir_id)
+            if not ids:
+                del self._trigrams[trigram]
+        return path
+
+    def rename_subtree(self, old_prefix, new_prefix, dir_ids):
+        """Troca o prefixo old_prefix por new_prefix no caminho dos dir_ids (subárvore renomeada ou movida)."""
+        for dir_id in dir_ids:
+            path = self._paths.get(dir_id)
+            if path is not None and (path == old_prefix or path.startswith(old_prefix + "/")):
+                self.add(dir_id, new_prefix + path[len(old_prefix):])
+
+    # -------------------- Consulta --------------------
+    def _candidates(self, term):
+        if len(term) < _TRIGRAM:
+            # Sem trigrama para filtrar: trecho em qualquer posição ("a1" em "Sala A1")
+            return {dir_id for lower, dir_id in self._sorted_paths if term in lower}
+        # Começa pelo trigrama mais raro para reduzir as interseções
+        sets = sorted((self._trigrams.get(trigram, set()) for trigram in _trigrams(term)), key=len)
+        candidates = set(sets[0])
+        for ids in sets[1:]:
+            candidates &= ids
+            if not candidates:
+                break
+        return {dir_id for dir_id in candidates if term in self._paths[dir_id].lower()}
+
+    def _rank(self, dir_id, term):
+        lower = self._paths[dir_id].lower()
+        name = _name(lower)
+        if name == term:
+            quality = 0
+        elif name.startswith(term):
+            quality = 1
+        elif term in name:
+            quality = 2
+        elif lower.startswith(term):
+            quality = 3
+        else:
+            quality = 4
+        return quality, lower.count("/"), lower, dir_id
+
+    def search(self, text, limit=None):
+        """
+        Pares (dir_id, caminho) que contêm text (sem diferenciar maiúsculas),
+        do melhor para o pior.
+        """
+        term = text.strip().lower()
+        if not term:
+            return []
+        ranked = sorted(self._candidates(term), key=lambda dir_id: self._rank(dir_id, term))
+        if limit is not None:
+            ranked = ranked[:limit]
+        return [(dir_id, self._paths[dir_id]) for dir_id in ranked]
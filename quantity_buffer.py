@@ -0,0 +1,79 @@
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+
+from database import obter_conexao
+from undo_journal import capturar, iniciar_escrita, incrementar, registrar, variacoes
+
+# Incremento relativo: cliques simultâneos de outros usuários não são sobrescritos
+UPDATE_SQL = "UPDATE items SET quantity = MAX(0, COALESCE(quantity, 0) + ?) WHERE id = ?"
+
+
+class QuantityBuffer(QObject):
+    """
+    Acumula os cliques de +/- da coluna de quantidade e os grava de uma vez.
+
+    As variações de cada item são somadas num único delta e gravadas numa só
+    transação depois de IDLE_MS sem novos cliques (ou em flush(), ao fechar a
+    janela ou trocar de banco), com uma entrada no diário de desfazer. Se a gravação falhar, os deltas continuam
+    pendentes e failed é emitido; a próxima tentativa acontece no próximo
+    clique ou flush().
+    """
+    IDLE_MS = 800
+
+    # {item_id: delta} gravados com sucesso
+    flushed = pyqtSignal(dict)
+    # Mensagem de erro da gravação
+    failed = pyqtSignal(str)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._deltas = {}
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(self.IDLE_MS)
+        self._timer.timeout.connect(self.flush)
+
+    def add(self, item_id, delta):
+        """Soma delta à variação pendente do item e reinicia a espera."""
+        total = self._deltas.get(item_id, 0) + delta
+        if total:
+            self._deltas[item_id] = total
+        else:
+            self._deltas.pop(item_id, None)
+        self._timer.start()
+
+    def pending(self, item_id):
+        """Variação ainda não gravada do item."""
+        return self._deltas.get(item_id, 0)
+
+    def has_pending(self):
+        return bool(self._deltas)
+
+    def flush(self):
+        """Grava as variações pendentes numa transação. Retorna True se não restar nada pendente."""
+        self._timer.stop()
+        if not self._deltas:
+            return True
+        deltas, self._deltas = self._deltas, {}
+        try:
+            with obter_conexao() as conn:
+                iniciar_escrita(conn)
+                antes = capturar(conn, "items", deltas, ("quantity",))
+                conn.executemany(UPDATE_SQL, [(delta, item_id) for item_id, delta in deltas.items()])
+                depois = capturar(conn, "items", deltas, ("quantity",))
+                # Deltas efetivos (o zero corta): desfazer aplica o inverso e preserva cliques de outros
+                aplicados = variacoes("quantity", antes, depois)
+                if aplicados:
+                    descricao = "Change quantity"
+                    if len(aplicados) > 1:
+                        descricao = f"Change quantity of {len(aplicados)} items"
+                    registrar(conn, descricao,
+                              [incrementar("items", "quantity", [(i, -d) for i, d in aplicados])],
+                              [incrementar("items", "quantity", aplicados)])
+        except Exception as e:
+            # Devolve os deltas, somando cliques feitos durante a tentativa
+            for item_id, delta in deltas.items():
+                self._deltas[item_id] = self._deltas.get(item_id, 0) + delta
+            self.failed.emit(str(e))
+            return False
+        self.flushed.emit(deltas)
+        return True
@@ -0,0 +1,156 @@
+import queue
+import sqlite3
+import threading
+import time
+from collections import deque
+
+from PyQt5.QtCore import QThread, pyqtSignal
+
+from database import fechar_conexao_leitura, obter_conexao
+
+
+class QueryWorker(QThread):
+    """
+    Thread dedicada às consultas de leitura da janela principal, para que um
+    banco lento ou travado na rede não congele a interface.
+
+    Cada pedido pertence a um canal ("items", "tree", ...). Um pedido novo num
+    canal torna obsoletos os anteriores do mesmo canal: os que ainda estão na
+    fila nem chegam a rodar e os resultados atrasados devem ser descartados por
+    quem os recebe (ver is_current). Se o pedido obsoleto já estiver rodando,
+    a consulta é interrompida com Connection.interrupt().
+
+    O tempo de cada pedido fica registrado por tipo (ver latency_stats).
+    """
+    # Pedidos acima deste tempo (s) são impressos no console
+    SLOW_QUERY_SECONDS = 1.0
+    # Quantidade de tempos guardados por canal
+    LATENCY_HISTORY = 500
+    # (canal, ticket, resultado)
+    resultReady = pyqtSignal(str, int, object)
+    # (canal, ticket, mensagem)
+    failed = pyqtSignal(str, int, str)
+    busyChanged = pyqtSignal(bool)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._next_ticket = 0
+        self._latest = {}
+        self._pending = 0
+        # (canal, conexão, tipo) do pedido em execução
+        self._running = None
+        self._latencies = {}
+        self._interrupted = {}
+
+    def submit(self, channel, func, kind=None, detail=None):
+        """
+        Agenda func(conn) numa conexão de leitura e retorna o ticket do pedido.
+        O resultado chega por resultReady (ou failed) no thread da interface.
+        kind agrupa o tempo do pedido nas estatísticas (padrão: o canal) e
+        detail (ex.: o termo buscado) aparece no registro de consultas lentas.
+        """
+        with self._lock:
+            self._next_ticket += 1
+            ticket = self._next_ticket
+            self._latest[channel] = ticket
+            self._pending += 1
+            starting = self._pending == 1
+            self._interrupt_running(channel)
+        if starting:
+            self.busyChanged.emit(True)
+        self._queue.put((channel, ticket, func, kind or channel, detail))
+        return ticket
+
+    def is_current(self, channel, ticket):
+        """Indica se ticket ainda é o pedido mais recente do canal."""
+        with self._lock:
+            return self._latest.get(channel) == ticket
+
+    def invalidate(self, channel):
+        """Torna obsoletos todos os pedidos do canal ainda não entregues."""
+        with self._lock:
+            self._latest.pop(channel, None)
+            self._interrupt_running(channel)
+
+    def _interrupt_running(self, channel):
+        # Chamado com self._lock adquirido
+        if self._running is not None and self._running[0] == channel:
+            self._running[1].interrupt()
+            kind = self._running[2]
+            self._interrupted[kind] = self._interrupted.get(kind, 0) + 1
+            self._running = None
+
+    def latency_stats(self):
+        """
+        Retorna, por tipo de pedido, um dicionário com count, avg, p50, p95 e max (em ms)
+        dos pedidos concluídos e quantos foram interrompidos.
+        """
+        with self._lock:
+            latencies = {kind: sorted(values) for kind, values in self._latencies.items()}
+            interrupted = dict(self._interrupted)
+        stats = {}
+        for kind in set(latencies) | set(interrupted):
+            values = latencies.get(kind, [])
+            entry = {"count": len(values), "interrupted": interrupted.get(kind, 0)}
+            if values:
+                entry.update(
+                    avg=1000 * sum(values) / len(values),
+                    p50=1000 * values[len(values) // 2],
+                    p95=1000 * values[min(len(values) - 1, int(len(values) * 0.95))],
+                    max=1000 * values[-1],
+                )
+            stats[kind] = entry
+        return stats
+
+    def _record_latency(self, kind, detail, seconds):
+        with self._lock:
+            history = self._latencies.setdefault(kind, deque(maxlen=self.LATENCY_HISTORY))
+            history.append(seconds)
+        if seconds >= self.SLOW_QUERY_SECONDS:
+            print(f"Consulta lenta ({kind}{': ' + detail if detail else ''}): {seconds:.3f} s")
+
+    def is_busy(self):
+        """
+        Indica se há pedidos pendentes. Use no lugar do valor de busyChanged,
+        que pode chegar fora de ordem (emitido de duas threads).
+        """
+        with self._lock:
+            return self._pending > 0
+
+    def stop(self):
+        """Encerra a thread depois do pedido em andamento."""
+        self._queue.put(None)
+        self.wait()
+
+    def run(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                # A conexão de leitura desta thread só pode ser fechada aqui
+                fechar_conexao_leitura()
+                break
+            channel, ticket, func, kind, detail = job
+            try:
+                if self.is_current(channel, ticket):
+                    with obter_conexao(somente_leitura=True) as conn:
+                        with self._lock:
+                            self._running = (channel, conn, kind)
+                        inicio = time.perf_counter()
+                        result = func(conn)
+                        self._record_latency(kind, detail, time.perf_counter() - inicio)
+                    self.resultReady.emit(channel, ticket, result)
+            except sqlite3.OperationalError as e:
+                # "interrupted": a consulta foi substituída por outra do mesmo canal
+                if str(e) != "interrupted":
+                    self.failed.emit(channel, ticket, str(e))
+            except Exception as e:
+                self.failed.emit(channel, ticket, str(e))
+            finally:
+                with self._lock:
+                    self._running = None
+                    self._pending -= 1
+                    idle = self._pending == 0
+                if idle:
+                    self.busyChanged.emit(False)
@@ -0,0 +1,259 @@
+"""
+Índice de busca textual (FTS5) dos itens.
+
+items_fts guarda, para cada item (rowid = items.id), título, descrição,
+responsável, o caminho completo do diretório (directories.path) e o texto
+da nota do item, tudo mantido por triggers em items, directories e notes.
+Se o SQLite não tiver FTS5, a busca volta a usar LIKE.
+"""
+import re
+import sqlite3
+
+# Caminho completo ("Raiz/Sub/Dir") do diretório do item, materializado em directories.path
+_PATH_SQL = "(SELECT path FROM directories WHERE id = NEW.directory_id)"
+
+CREATE_TABLE = """
+    CREATE VIRTUAL TABLE IF NOT EXISTS items_fts USING fts5(
+        title, description, responsible, directory_path, note_text,
+        tokenize = 'unicode61 remove_diacritics 2'
+    )
+"""
+
+TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS items_fts_insert
+    AFTER INSERT ON items
+    BEGIN
+        INSERT INTO items_fts (rowid, title, description, responsible, directory_path, note_text)
+        VALUES (NEW.id, NEW.title, NEW.description, NEW.responsible,
+                {_PATH_SQL}, '');
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS items_fts_update
+    AFTER UPDATE OF title, description, responsible, directory_id ON items
+    BEGIN
+        UPDATE items_fts
+           SET title = NEW.title,
+               description = NEW.description,
+               responsible = NEW.responsible,
+               directory_path = {_PATH_SQL}
+         WHERE rowid = NEW.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS items_fts_delete
+    AFTER DELETE ON items
+    BEGIN
+        DELETE FROM items_fts WHERE rowid = OLD.id;
+    END
+    """,
+    # Renomear ou mover um diretório reescreve o path de toda a subárvore
+    # (trigger directory_path_update), e cada path alterado chega aqui
+    """
+    CREATE TRIGGER IF NOT EXISTS items_fts_directory_path
+    AFTER UPDATE OF path ON directories
+    WHEN OLD.path IS NOT NEW.path
+    BEGIN
+        UPDATE items_fts
+           SET directory_path = NEW.path
+         WHERE rowid IN (SELECT id FROM items WHERE directory_id = NEW.id);
+    END
+    """,
+]
+
+# Triggers de versões anteriores, que montavam o caminho pela directory_closure
+_TRIGGERS_ANTIGOS = ("items_fts_insert", "items_fts_update", "items_fts_directory_update")
+
+# Nota do item: mantida pelos triggers da tabela notes (criada na migração 5)
+NOTE_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS items_fts_note_insert
+    AFTER INSERT ON notes WHEN NEW.entity_type = 'item'
+    BEGIN
+        UPDATE items_fts SET note_text = COALESCE(NEW.text, '') WHERE rowid = NEW.entity_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS items_fts_note_update
+    AFTER UPDATE OF text ON notes WHEN NEW.entity_type = 'item'
+    BEGIN
+        UPDATE items_fts SET note_text = COALESCE(NEW.text, '') WHERE rowid = NEW.entity_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS items_fts_note_delete
+    AFTER DELETE ON notes WHEN OLD.entity_type = 'item'
+    BEGIN
+        UPDATE items_fts SET note_text = '' WHERE rowid = OLD.entity_id;
+    END
+    """,
+]
+
+# Colunas no formato esperado por widgets.items_model.ItemsTableModel (ROW_FIELDS)
+_SELECT_COLUMNS = """
+    SELECT items.id, items.title, items.responsible, items.quantity,
+           items.image_path, items.description, directories.path AS directory,
+           n.text AS note_text, n.color AS note_color
+"""
+
+_NOTE_JOIN = """
+      LEFT JOIN notes n ON n.entity_type = 'item' AND n.entity_id = items.id
+"""
+
+FTS_SEARCH_SQL = _SELECT_COLUMNS + """
+      FROM items_fts
+      JOIN items ON items.id = items_fts.rowid
+      JOIN directories ON items.directory_id = directories.id
+""" + _NOTE_JOIN + """
+     WHERE items_fts MATCH ?
+     ORDER BY items_fts.rank
+"""
+
+LIKE_SEARCH_SQL = _SELECT_COLUMNS + """
+      FROM items
+      JOIN directories ON items.directory_id = directories.id
+""" + _NOTE_JOIN + """
+     WHERE items.title LIKE ?
+        OR items.description LIKE ?
+        OR items.responsible LIKE ?
+        OR items.directory_id IN (
+            SELECT c.descendant_id
+              FROM directories d
+              JOIN directory_closure c ON c.ancestor_id = d.id
+             WHERE d.name LIKE ?
+        )
+"""
+
+
+def fts5_suportado(conn):
+    """Indica se a biblioteca SQLite em uso foi compilada com FTS5."""
+    try:
+        conn.execute("CREATE VIRTUAL TABLE temp._fts5_probe USING fts5(x)")
+        conn.execute("DROP TABLE temp._fts5_probe")
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+
+def _tabela_existe(conn, nome):
+    row = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (nome,)).fetchone()
+    return row is not None
+
+
+def indice_disponivel(conn):
+    """Indica se o banco possui o índice items_fts."""
+    return _tabela_existe(conn, "items_fts")
+
+
+def criar_triggers_notas(conn):
+    """Liga a tabela notes ao índice (se ambos existirem) e reindexa o texto das notas."""
+    if not indice_disponivel(conn) or not _tabela_existe(conn, "notes"):
+        return
+    for trigger in NOTE_TRIGGERS:
+        conn.execute(trigger)
+    _reindexar_notas(conn)
+
+
+def _reindexar_notas(conn):
+    # Só as linhas de itens que têm nota; as demais já têm note_text vazio
+    conn.execute("""
+        UPDATE items_fts
+           SET note_text = COALESCE((SELECT text FROM notes
+                                      WHERE notes.entity_type = 'item' AND notes.entity_id = items_fts.rowid), '')
+         WHERE rowid IN (SELECT entity_id FROM notes WHERE entity_type = 'item')
+    """)
+
+
+def criar_tabela_busca(conn):
+    """
+    Cria só a tabela items_fts (vazia, sem triggers), se o FTS5 estiver
+    disponível. Retorna True se a tabela existir ao final.
+    """
+    if indice_disponivel(conn):
+        return True
+    if not fts5_suportado(conn):
+        print("FTS5 indisponível nesta versão do SQLite; a busca usará LIKE.")
+        return False
+    conn.execute(CREATE_TABLE)
+    return True
+
+
+def atualizar_triggers_busca(conn):
+    """Troca os triggers de items_fts pelos que leem directories.path e reconstrói o índice."""
+    if not indice_disponivel(conn):
+        return
+    for nome in _TRIGGERS_ANTIGOS:
+        conn.execute(f"DROP TRIGGER IF EXISTS {nome}")
+    for trigger in TRIGGERS:
+        conn.execute(trigger)
+    reconstruir_indice_busca(conn)
+
+
+def criar_indice_busca(conn):
+    """
+    Cria e popula items_fts se o FTS5 estiver disponível e o índice ainda não
+    existir. Retorna True se o índice estiver disponível ao final.
+    """
+    if indice_disponivel(conn):
+        return True
+    if not criar_tabela_busca(conn):
+        return False
+    for trigger in TRIGGERS:
+        conn.execute(trigger)
+    reconstruir_indice_busca(conn)
+    criar_triggers_notas(conn)
+    return True
+
+
+def reconstruir_indice_busca(conn):
+    """Recalcula todo o conteúdo de items_fts a partir de items, directories e notes."""
+    conn.execute("DELETE FROM items_fts")
+    conn.execute("""
+        INSERT INTO items_fts (rowid, title, description, responsible, directory_path, note_text)
+        SELECT items.id, items.title, items.description, items.responsible, directories.path, ''
+          FROM items
+          LEFT JOIN directories ON directories.id = items.directory_id
+    """)
+    if _tabela_existe(conn, "notes"):
+        _reindexar_notas(conn)
+
+
+def indexar_itens(conn, primeiro_id):
+    """Inclui em items_fts os itens com id >= primeiro_id (carga em massa feita sem o trigger de inserção)."""
+    conn.execute("""
+        INSERT INTO items_fts (rowid, title, description, responsible, directory_path, note_text)
+        SELECT items.id, items.title, items.description, items.responsible, directories.path, ''
+          FROM items
+          LEFT JOIN directories ON directories.id = items.directory_id
+         WHERE items.id >= ?
+    """, (primeiro_id,))
+
+
+def montar_consulta_fts(termo):
+    """
+    Converte o texto digitado em uma consulta FTS5: cada palavra vira um prefixo
+    entre aspas e as palavras são combinadas com AND. Retorna None se não houver
+    palavras pesquisáveis.
+    """
+    palavras = re.findall(r"\w+", termo, re.UNICODE)
+    if not palavras:
+        return None
+    return " AND ".join(f'"{palavra}"*' for palavra in palavras)
+
+
+def consulta_busca(conn, termo):
+    """
+    Retorna (sql, parâmetros) da busca de itens por termo: FTS5 ranqueado quando o
+    índice existir, ou o caminho antigo com LIKE como alternativa.
+    """
+    return montar_busca(termo, indice_disponivel(conn))
+
+
+def montar_busca(termo, usar_fts):
+    """Como consulta_busca, mas sem consultar o banco: usar_fts indica se items_fts existe."""
+    consulta = montar_consulta_fts(termo)
+    if consulta and usar_fts:
+        return FTS_SEARCH_SQL, (consulta,)
+    like_term = f"%{termo}%"
+    return LIKE_SEARCH_SQL, (like_term, like_term, like_term, like_term)
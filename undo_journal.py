@@ -0,0 +1,364 @@
+"""
+Diário persistente de operações para desfazer/refazer.
+
+Cada ação do usuário (incluir, editar, mover, duplicar ou excluir itens,
+alterar quantidades, mover ou excluir diretórios) vira uma linha de
+undo_journal com as operações que a desfazem e as que a refazem, gravadas
+em JSON na mesma transação da própria alteração: ou as duas ficam no
+banco, ou nenhuma.
+
+As operações guardam as linhas completas (com os ids), então desfazer uma
+exclusão devolve itens e diretórios com os mesmos ids, e as notas e
+referências ligadas a eles voltam a valer. Os triggers de directory_closure,
+directories.path, directory_stats e do índice de busca ajustam o resto.
+
+O histórico não tem limite de tamanho; entradas mais antigas que o período
+de retenção configurado são removidas em segundo plano (JournalPruneWorker).
+Cada usuário/máquina desfaz apenas as próprias ações.
+
+Outros usuários podem ter mexido nas mesmas linhas depois da ação: variações
+de quantidade são gravadas como deltas (desfazer aplica o delta inverso) e as
+demais alterações guardam os valores esperados; se o valor atual for outro,
+desfazer/refazer é recusado com ConflitoDiario em vez de sobrescrevê-lo.
+"""
+import getpass
+import json
+import socket
+import threading
+
+from PyQt5.QtCore import QThread, pyqtSignal
+
+from database import obter_conexao
+
+CREATE_TABLE = """
+    CREATE TABLE IF NOT EXISTS undo_journal (
+        id INTEGER PRIMARY KEY,
+        author TEXT NOT NULL,
+        created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        description TEXT NOT NULL,
+        undo_ops TEXT NOT NULL,
+        redo_ops TEXT NOT NULL,
+        undone INTEGER NOT NULL DEFAULT 0
+    )
+"""
+
+# Última entrada a desfazer / primeira a refazer de cada autor
+CREATE_INDEX = """
+    CREATE INDEX IF NOT EXISTS idx_undo_journal_author
+        ON undo_journal(author, undone, id)
+"""
+
+# Colunas-chave de cada tabela registrada no diário
+_CHAVES = {
+    "items": ("id",),
+    "directories": ("id",),
+    "notes": ("entity_type", "entity_id"),
+}
+# Colunas mantidas por triggers, que não são gravadas nem restauradas
+_DERIVADAS = {
+    "directories": ("path",),
+}
+# Tabela -> entidade do change_notifier
+_ENTIDADES = {"items": "item", "directories": "directory"}
+_NOTAS = {"item": "item", "dir": "directory"}
+
+# Chaves por consulta, abaixo do limite de parâmetros do SQLite
+_LOTE_CHAVES = 400
+# Entradas removidas por transação na limpeza
+PRUNE_BATCH = 500
+
+
+class ConflitoDiario(Exception):
+    """Linhas alteradas por outra pessoa depois da ação: desfazer/refazer sobrescreveria a mudança."""
+
+    def __init__(self, entrada_id, descricao):
+        super().__init__(f"'{descricao}' foi alterado por outro usuário depois desta ação.")
+        self.entrada_id = entrada_id
+        self.descricao = descricao
+
+
+def autor_atual():
+    """Identifica quem grava as entradas (usuário@máquina)."""
+    try:
+        usuario = getpass.getuser()
+    except Exception:
+        usuario = "?"
+    return f"{usuario}@{socket.gethostname()}"
+
+
+_AUTOR = autor_atual()
+
+
+def criar_diario(conn):
+    conn.execute(CREATE_TABLE)
+    conn.execute(CREATE_INDEX)
+
+
+def _colunas(conn, tabela):
+    derivadas = _DERIVADAS.get(tabela, ())
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({tabela})") if row[1] not in derivadas]
+
+
+def _chave(chave):
+    return tuple(chave) if isinstance(chave, (tuple, list)) else (chave,)
+
+
+def iniciar_escrita(conn):
+    """
+    Abre a transação com o lock de escrita (BEGIN IMMEDIATE) antes de capturar
+    linhas. O sqlite3 só emite BEGIN no primeiro comando de alteração: sem
+    isto, outro usuário poderia gravar entre a captura e a alteração, e a
+    mudança dele seria registrada (e desfeita) como nossa.
+    """
+    if not conn.in_transaction:
+        conn.execute("BEGIN IMMEDIATE")
+
+
+def capturar(conn, tabela, chaves, colunas=None):
+    """
+    Retorna as linhas atuais de tabela (dicts coluna -> valor) para as chaves
+    dadas (ids, ou tuplas (entity_type, entity_id) em notes), na ordem das
+    chaves; chaves inexistentes são ignoradas. colunas limita as colunas
+    gravadas além das chaves.
+    """
+    nomes_chave = _CHAVES[tabela]
+    nomes = list(nomes_chave) + [c for c in (colunas or _colunas(conn, tabela)) if c not in nomes_chave]
+    chaves = [_chave(chave) for chave in chaves]
+    encontradas = {}
+    for inicio in range(0, len(chaves), _LOTE_CHAVES):
+        lote = chaves[inicio:inicio + _LOTE_CHAVES]
+        if len(nomes_chave) == 1:
+            filtro = f"{nomes_chave[0]} IN ({', '.join('?' for _ in lote)})"
+        else:
+            tupla = "(" + ", ".join("?" for _ in nomes_chave) + ")"
+            filtro = f"({', '.join(nomes_chave)}) IN (VALUES {', '.join(tupla for _ in lote)})"
+        params = [valor for chave in lote for valor in chave]
+        for row in conn.execute(f"SELECT {', '.join(nomes)} FROM {tabela} WHERE {filtro}", params):
+            encontradas[tuple(row[:len(nomes_chave)])] = dict(zip(nomes, row))
+    return [encontradas[chave] for chave in chaves if chave in encontradas]
+
+
+# -------------------- Operações --------------------
+def inserir(tabela, linhas):
+    """Operação que insere as linhas capturadas (com as chaves originais)."""
+    return {"op": "insert", "table": tabela, "rows": list(linhas)}
+
+
+def excluir(tabela, linhas):
+    """Operação que exclui as linhas capturadas (pelas chaves)."""
+    chaves = _CHAVES[tabela]
+    return {"op": "delete", "table": tabela, "keys": [[linha[c] for c in chaves] for linha in linhas]}
+
+
+def atualizar(tabela, linhas, esperadas):
+    """
+    Operação que grava de volta os valores das linhas capturadas, desde que as
+    colunas ainda tenham os valores de esperadas (as linhas capturadas do
+    outro lado da ação).
+    """
+    return {"op": "update", "table": tabela, "rows": list(linhas), "expected": list(esperadas)}
+
+
+def incrementar(tabela, coluna, deltas):
+    """Operação que soma (id, delta) a coluna, sem descer de zero, como os botões +/-."""
+    return {"op": "increment", "table": tabela, "column": coluna, "deltas": [list(d) for d in deltas]}
+
+
+def variacoes(coluna, antes, depois):
+    """[(id, delta)] realmente aplicados em coluna entre as linhas capturadas antes e depois."""
+    anteriores = {linha["id"]: linha[coluna] or 0 for linha in antes}
+    deltas = [(linha["id"], (linha[coluna] or 0) - anteriores.get(linha["id"], 0)) for linha in depois]
+    return [(item_id, delta) for item_id, delta in deltas if delta]
+
+
+def registrar(conn, descricao, desfazer, refazer):
+    """
+    Grava uma entrada no diário, na transação corrente de conn (a mesma da
+    alteração). desfazer e refazer são listas de operações, aplicadas na
+    ordem. Uma ação nova descarta o que o autor tinha desfeito e ainda não
+    refez. Retorna o id da entrada.
+    """
+    conn.execute("DELETE FROM undo_journal WHERE author = ? AND undone = 1", (_AUTOR,))
+    cursor = conn.execute("""
+        INSERT INTO undo_journal (author, description, undo_ops, redo_ops)
+        VALUES (?, ?, ?, ?)
+    """, (_AUTOR, descricao, json.dumps(desfazer), json.dumps(refazer)))
+    return cursor.lastrowid
+
+
+def _alteradas(conn, tabela, linhas, esperadas):
+    """True se alguma coluna de linhas não tiver mais o valor de esperadas (ou a linha sumiu)."""
+    chaves = _CHAVES[tabela]
+    existentes = set(_colunas(conn, tabela))
+    por_chave = {tuple(linha[c] for c in chaves): linha for linha in esperadas}
+    for linha in linhas:
+        chave = [linha[c] for c in chaves]
+        esperada = por_chave.get(tuple(chave))
+        if esperada is None:
+            continue
+        colunas = [c for c in linha if c in existentes and c in esperada and c not in chaves]
+        filtro = " AND ".join([f"{c} = ?" for c in chaves] + [f"{c} IS ?" for c in colunas])
+        if conn.execute(f"SELECT 1 FROM {tabela} WHERE {filtro}",
+                        chave + [esperada[c] for c in colunas]).fetchone() is None:
+            return True
+    return False
+
+
+def _aplicar(conn, entrada_id, descricao, operacoes):
+    for operacao in operacoes:
+        tabela = operacao["table"]
+        chaves = _CHAVES[tabela]
+        existentes = set(_colunas(conn, tabela))
+        if operacao["op"] == "increment":
+            coluna = operacao["column"]
+            conn.executemany(
+                f"UPDATE {tabela} SET {coluna} = MAX(0, COALESCE({coluna}, 0) + ?) WHERE id = ?",
+                [(delta, item_id) for item_id, delta in operacao["deltas"]],
+            )
+            continue
+        if operacao["op"] == "update" and _alteradas(conn, tabela, operacao["rows"], operacao.get("expected", ())):
+            raise ConflitoDiario(entrada_id, descricao)
+        if operacao["op"] == "delete":
+            filtro = " AND ".join(f"{c} = ?" for c in chaves)
+            conn.executemany(f"DELETE FROM {tabela} WHERE {filtro}", operacao["keys"])
+            continue
+        for linha in operacao["rows"]:
+            # Colunas removidas do esquema depois da gravação são ignoradas
+            colunas = [c for c in linha if c in existentes]
+            if operacao["op"] == "insert":
+                conn.execute(
+                    f"INSERT INTO {tabela} ({', '.join(colunas)}) VALUES ({', '.join('?' for _ in colunas)})",
+                    [linha[c] for c in colunas],
+                )
+            else:
+                valores = [c for c in colunas if c not in chaves]
+                if not valores:
+                    continue
+                conn.execute(
+                    f"UPDATE {tabela} SET {', '.join(f'{c} = ?' for c in valores)}"
+                    f" WHERE {' AND '.join(f'{c} = ?' for c in chaves)}",
+                    [linha[c] for c in valores] + [linha[c] for c in chaves],
+                )
+
+
+def alteracoes(operacoes):
+    """Traduz operações em [(entity, action, ids, fields)] para o change_notifier."""
+    resultado = []
+    for operacao in operacoes:
+        tabela = operacao["table"]
+        if tabela == "notes":
+            if "rows" in operacao:
+                linhas = operacao["rows"]
+            else:
+                linhas = [dict(zip(_CHAVES["notes"], chave)) for chave in operacao["keys"]]
+            for entity_type, entidade in _NOTAS.items():
+                ids = [linha["entity_id"] for linha in linhas if linha["entity_type"] == entity_type]
+                if ids:
+                    resultado.append((entidade, "updated", ids, ("note",)))
+            continue
+        entidade = _ENTIDADES[tabela]
+        if operacao["op"] == "increment":
+            resultado.append((entidade, "updated", [d[0] for d in operacao["deltas"]], (operacao["column"],)))
+        elif operacao["op"] == "delete":
+            resultado.append((entidade, "deleted", [chave[0] for chave in operacao["keys"]], ()))
+        elif operacao["op"] == "insert":
+            resultado.append((entidade, "inserted", [linha["id"] for linha in operacao["rows"]], ()))
+        elif operacao["rows"]:
+            campos = tuple(c for c in operacao["rows"][0] if c != "id")
+            resultado.append((entidade, "updated", [linha["id"] for linha in operacao["rows"]], campos))
+    return resultado
+
+
+def desfazer(conn):
+    """
+    Desfaz a última ação do autor ainda não desfeita; levanta ConflitoDiario
+    se outra pessoa alterou as mesmas linhas depois dela.
+    Retorna (descrição, operações aplicadas) ou None se não houver o que desfazer.
+    """
+    # A verificação de conflito e a aplicação precisam ver o mesmo estado
+    iniciar_escrita(conn)
+    row = conn.execute("""
+        SELECT id, description, undo_ops FROM undo_journal
+         WHERE author = ? AND undone = 0
+         ORDER BY id DESC LIMIT 1
+    """, (_AUTOR,)).fetchone()
+    if row is None:
+        return None
+    entrada_id, descricao, operacoes = row
+    operacoes = json.loads(operacoes)
+    _aplicar(conn, entrada_id, descricao, operacoes)
+    conn.execute("UPDATE undo_journal SET undone = 1 WHERE id = ?", (entrada_id,))
+    return descricao, operacoes
+
+
+def refazer(conn):
+    """
+    Refaz a ação desfeita mais recentemente pelo autor; levanta ConflitoDiario
+    se outra pessoa alterou as mesmas linhas depois de desfeita.
+    Retorna (descrição, operações aplicadas) ou None se não houver o que refazer.
+    """
+    iniciar_escrita(conn)
+    row = conn.execute("""
+        SELECT id, description, redo_ops FROM undo_journal
+         WHERE author = ? AND undone = 1
+         ORDER BY id LIMIT 1
+    """, (_AUTOR,)).fetchone()
+    if row is None:
+        return None
+    entrada_id, descricao, operacoes = row
+    operacoes = json.loads(operacoes)
+    _aplicar(conn, entrada_id, descricao, operacoes)
+    conn.execute("UPDATE undo_journal SET undone = 0 WHERE id = ?", (entrada_id,))
+    return descricao, operacoes
+
+
+def descartar(conn, entrada_id):
+    """Remove uma entrada do diário (ex.: uma que não pode mais ser desfeita)."""
+    conn.execute("DELETE FROM undo_journal WHERE id = ?", (entrada_id,))
+
+
+def podar(dias, cancelado=None):
+    """
+    Remove as entradas (de todos os autores) com mais de dias dias, em
+    transações curtas de PRUNE_BATCH entradas para não segurar o lock de
+    escrita. dias <= 0 mantém tudo. Retorna o número de entradas removidas.
+    """
+    if dias <= 0:
+        return 0
+    removidas = 0
+    while not (cancelado and cancelado()):
+        with obter_conexao() as conn:
+            # Os ids crescem com created_at: as mais antigas estão no começo da tabela
+            apagadas = conn.execute("""
+                DELETE FROM undo_journal
+                 WHERE id IN (SELECT id FROM undo_journal
+                               WHERE created_at < datetime('now', ?)
+                               ORDER BY id LIMIT ?)
+            """, (f"-{int(dias)} days", PRUNE_BATCH)).rowcount
+        removidas += apagadas
+        if apagadas < PRUNE_BATCH:
+            break
+    return removidas
+
+
+class JournalPruneWorker(QThread):
+    """Roda podar() fora do thread da interface."""
+    # Entradas removidas
+    completed = pyqtSignal(int)
+    failed = pyqtSignal(str)
+
+    def __init__(self, days, parent=None):
+        super().__init__(parent)
+        self.days = days
+        self._cancel = threading.Event()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def run(self):
+        try:
+            removidas = podar(self.days, cancelado=self._cancel.is_set)
+        except Exception as e:
+            self.failed.emit(str(e))
+        else:
+            self.completed.emit(removidas)
@@ -1,2 +1,5 @@
-from .quantity_widget import QuantityWidget
+from .directory_tree_model import DirectoryTreeModel
+from .items_model import ItemsTableModel
+from .quantity_delegate import QuantityDelegate
+from .task_progress_dialog import TaskProgressDialog
 from .zoomable_label import ZoomableLabel
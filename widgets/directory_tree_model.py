@@ -0,0 +1,486 @@
+import bisect
+
+from PyQt5.QtCore import Qt, QAbstractItemModel, QModelIndex, QMimeData, QByteArray, pyqtSignal
+from PyQt5.QtGui import QColor
+
+from database import obter_conexao
+from directory_stats import estatisticas
+
+MIME_TYPE = "application/x-inventario-directory"
+
+# Colunas de contadores depois do nome (totais da subárvore, ver directory_stats)
+STAT_HEADERS = ["Items", "Quantity", "Images"]
+
+# Contadores no formato de directory_stats.estatisticas
+_STATS_COLUMNS = """
+           s.subtree_item_count, s.subtree_total_quantity, s.subtree_image_count,
+           s.item_count, s.total_quantity, s.image_count"""
+
+# Filhos de um diretório, com a nota, os contadores e um teste barato (índice de parent_id) de "tem filhos"
+_CHILDREN_SQL = """
+    SELECT d.id, d.name, n.text, n.color,
+           EXISTS (SELECT 1 FROM directories c WHERE c.parent_id = d.id),""" + _STATS_COLUMNS + """
+      FROM directories d
+      LEFT JOIN notes n ON n.entity_type = 'dir' AND n.entity_id = d.id
+      LEFT JOIN directory_stats s ON s.directory_id = d.id
+     WHERE {condition}
+     ORDER BY d.id
+"""
+
+
+# Os mesmos dados de _CHILDREN_SQL para diretórios específicos, com o pai
+_BY_ID_SQL = """
+    SELECT d.id, d.name, d.parent_id, n.text, n.color,
+           EXISTS (SELECT 1 FROM directories c WHERE c.parent_id = d.id),""" + _STATS_COLUMNS + """
+      FROM directories d
+      LEFT JOIN notes n ON n.entity_type = 'dir' AND n.entity_id = d.id
+      LEFT JOIN directory_stats s ON s.directory_id = d.id
+     WHERE d.id IN ({placeholders})
+"""
+
+
+def query_children(conn, parent_id):
+    """Retorna as linhas (id, name, note_text, note_color, has_children, *contadores) dos filhos de parent_id."""
+    if parent_id is None:
+        return conn.execute(_CHILDREN_SQL.format(condition="d.parent_id IS NULL")).fetchall()
+    return conn.execute(_CHILDREN_SQL.format(condition="d.parent_id = ?"), (parent_id,)).fetchall()
+
+
+class DirectoryNode:
+    __slots__ = ("id", "name", "parent", "row", "note_text", "note_color", "has_children", "children", "loading",
+                 "stats")
+
+    def __init__(self, dir_id, name, parent, row, note_text=None, note_color=None, has_children=False, stats=()):
+        self.id = dir_id
+        self.name = name
+        self.parent = parent
+        self.row = row
+        self.note_text = note_text
+        self.note_color = note_color
+        self.has_children = has_children
+        # (itens, quantidade, com imagem) da subárvore seguidos dos do próprio diretório
+        self.stats = tuple(stats)
+        # None enquanto os filhos não foram carregados
+        self.children = None
+        self.loading = False
+
+
+class DirectoryTreeModel(QAbstractItemModel):
+    """
+    Árvore de diretórios carregada sob demanda: só os diretórios raiz são lidos
+    no início e os filhos de um nó são buscados (parent_id indexado) quando ele
+    é expandido. hasChildren usa o EXISTS da consulta, sem carregar os filhos.
+
+    Com um QueryWorker as buscas (inclusive as de apply_change e reveal)
+    rodam fora do thread da interface; childrenLoaded avisa quando os filhos
+    de um nó chegaram, para a janela restaurar expansão e seleção, e revealed
+    quando o caminho até um diretório pedido a reveal() está carregado.
+    """
+    childrenLoaded = pyqtSignal(QModelIndex)
+    revealed = pyqtSignal(QModelIndex)
+    # (diretório arrastado, novo pai ou None para a raiz)
+    moveRequested = pyqtSignal(int, object)
+    errorOccurred = pyqtSignal(str)
+
+    def __init__(self, parent=None, worker=None):
+        super().__init__(parent)
+        self._root = DirectoryNode(None, "", None, 0)
+        self._nodes = {}
+        # Invalida respostas pedidas antes do último reload
+        self._generation = 0
+        # Diretórios incluídos/alterados cujas linhas ainda estão sendo relidas
+        self._changed_ids = set()
+        # Cores escolhidas pelo usuário (config "tree.colors"), com prioridade sobre a da nota
+        self.custom_colors = {}
+        self.worker = worker
+        if worker is not None:
+            worker.resultReady.connect(self._on_result)
+            worker.failed.connect(self._on_failed)
+
+    # -------------------- Carga --------------------
+    def reload(self):
+        """Descarta a árvore carregada e busca de novo os diretórios raiz."""
+        self._generation += 1
+        self._changed_ids.clear()
+        self.beginResetModel()
+        self._root = DirectoryNode(None, "", None, 0, has_children=True)
+        self._nodes = {}
+        self.endResetModel()
+        self._request_children(self._root)
+
+    def _channel(self, node):
+        return f"tree:{node.id}"
+
+    def _request_children(self, node):
+        if self.worker is None:
+            self.ensure_loaded(node)
+            return
+        node.loading = True
+        parent_id, generation = node.id, self._generation
+        self.worker.submit(self._channel(node), lambda conn: (generation, parent_id, query_children(conn, parent_id)),
+                           kind="tree")
+
+    def _submit(self, channel, job):
+        """Roda job(conn) no QueryWorker, ou aqui mesmo sem worker; retorna o resultado no segundo caso."""
+        if self.worker is not None:
+            self.worker.submit(channel, job, kind="tree")
+            return None
+        with obter_conexao(somente_leitura=True) as conn:
+            return job(conn)
+
+    def _on_result(self, channel, ticket, result):
+        if channel in ("tree-stats", "tree-change", "tree-reveal"):
+            if not self.worker.is_current(channel, ticket) or result[0] != self._generation:
+                return
+            if channel == "tree-stats":
+                self._set_stats(result[1])
+            elif channel == "tree-change":
+                self._changed_ids.clear()
+                self._apply_rows(result[1])
+            else:
+                self._apply_reveal(*result[1:])
+            return
+        if not channel.startswith("tree:"):
+            return
+        generation, parent_id, rows = result
+        node = self._root if parent_id is None else self._nodes.get(parent_id)
+        if generation != self._generation or node is None:
+            return
+        node.loading = False
+        if node.children is None:
+            self._set_children(node, rows)
+
+    def _on_failed(self, channel, ticket, message):
+        if channel == "tree-stats":
+            print("Error loading directory counters:", message)
+        elif channel in ("tree-change", "tree-reveal") and self.worker.is_current(channel, ticket):
+            self.errorOccurred.emit(f"Error loading directory tree: {message}")
+        elif channel.startswith("tree:"):
+            node_id = channel[len("tree:"):]
+            node = self._root if node_id == "None" else self._nodes.get(int(node_id))
+            if node is not None:
+                node.loading = False
+            self.errorOccurred.emit(f"Error loading directory tree: {message}")
+
+    def ensure_loaded(self, node):
+        """Carrega os filhos do nó no thread atual, se ainda não carregados."""
+        if node.children is not None:
+            return
+        with obter_conexao(somente_leitura=True) as conn:
+            rows = query_children(conn, node.id)
+        node.loading = False
+        self._set_children(node, rows)
+
+    def _set_children(self, node, rows):
+        children = []
+        for row, (d_id, name, note_text, note_color, has_children, *stats) in enumerate(rows):
+            child = DirectoryNode(d_id, name, node, row, note_text, note_color, bool(has_children), stats)
+            children.append(child)
+            self._nodes[d_id] = child
+        parent_index = self.index_for_node(node)
+        if children:
+            self.beginInsertRows(parent_index, 0, len(children) - 1)
+            node.children = children
+            self.endInsertRows()
+        else:
+            node.children = children
+            node.has_children = False
+            self.dataChanged.emit(parent_index, parent_index)
+        self.childrenLoaded.emit(parent_index)
+
+    def reveal(self, dir_id):
+        """
+        Carrega a cadeia de ancestrais de dir_id (os filhos de cada um) e emite
+        revealed com o índice do diretório. Se ele não existir, nada é emitido.
+        """
+        if dir_id in self._nodes:
+            self.revealed.emit(self.index_for_id(dir_id))
+            return
+        generation = self._generation
+
+        def fetch(conn):
+            chain = [row[0] for row in conn.execute("""
+                SELECT ancestor_id FROM directory_closure
+                 WHERE descendant_id = ?
+                 ORDER BY depth DESC
+            """, (dir_id,))]
+            parents = [None] + chain[:-1]
+            return generation, dir_id, parents, [query_children(conn, parent_id) for parent_id in parents]
+
+        result = self._submit("tree-reveal", fetch)
+        if result is not None:
+            self._apply_reveal(*result[1:])
+
+    def _apply_reveal(self, dir_id, parents, children):
+        for parent_id, rows in zip(parents, children):
+            node = self._root if parent_id is None else self._nodes.get(parent_id)
+            if node is None:
+                return
+            if node.children is None:
+                node.loading = False
+                self._set_children(node, rows)
+        index = self.index_for_id(dir_id)
+        if index.isValid():
+            self.revealed.emit(index)
+
+    # -------------------- Atualização por nó --------------------
+    def apply_change(self, change):
+        """
+        Aplica uma alteração de diretórios (change_notifier.Change) só nos nós
+        afetados: inclusão, renomeação, nota, mudança de pai e exclusão.
+        Diretórios cujo pai ainda não foi carregado só ajustam o hasChildren do pai.
+        As linhas incluídas/alteradas são relidas em segundo plano, numa só
+        consulta para as alterações que chegarem enquanto ela estiver pendente.
+        """
+        if change.entity != "directory":
+            return
+        if change.action == "deleted":
+            for dir_id in change.ids:
+                node = self._nodes.get(dir_id)
+                if node is not None:
+                    self._remove_node(node)
+            if self._changed_ids & set(change.ids):
+                # A consulta pendente pode trazer de volta os excluídos: refaz sem eles
+                self._changed_ids.difference_update(change.ids)
+                self._request_changes()
+            return
+        self._changed_ids.update(change.ids)
+        self._request_changes()
+
+    def _request_changes(self):
+        if not self._changed_ids:
+            if self.worker is not None:
+                self.worker.invalidate("tree-change")
+            return
+        ids, generation = sorted(self._changed_ids), self._generation
+        sql = _BY_ID_SQL.format(placeholders=", ".join("?" for _ in ids))
+        result = self._submit("tree-change", lambda conn: (generation, conn.execute(sql, ids).fetchall()))
+        if result is not None:
+            self._changed_ids.clear()
+            self._apply_rows(result[1])
+
+    def _apply_rows(self, rows):
+        for d_id, name, parent_id, note_text, note_color, has_children, *stats in rows:
+            parent = self._root if parent_id is None else self._nodes.get(parent_id)
+            node = self._nodes.get(d_id)
+            if node is not None and node.parent is not parent:
+                self._detach(node, parent)
+                node = self._nodes.get(d_id)
+            if node is not None:
+                node.name, node.note_text, node.note_color = name, note_text, note_color
+                node.has_children = bool(has_children)
+                node.stats = tuple(stats)
+                self._row_changed(node)
+            elif parent is not None and parent.children is not None:
+                child = DirectoryNode(d_id, name, parent, 0, note_text, note_color, bool(has_children), stats)
+                self._insert_node(parent, child)
+            elif parent is not None and not parent.has_children:
+                # Os filhos serão buscados quando o pai for expandido
+                parent.has_children = True
+                self._row_changed(parent)
+
+    def _position(self, parent, dir_id):
+        # Os irmãos ficam na ordem de id, como em _CHILDREN_SQL
+        return bisect.bisect_left([child.id for child in parent.children], dir_id)
+
+    def _renumber(self, parent, start=0):
+        for row in range(start, len(parent.children)):
+            parent.children[row].row = row
+
+    def _insert_node(self, parent, node):
+        position = self._position(parent, node.id)
+        self.beginInsertRows(self.index_for_node(parent), position, position)
+        node.parent = parent
+        parent.children.insert(position, node)
+        self._renumber(parent, position)
+        self._nodes[node.id] = node
+        self.endInsertRows()
+        self._parent_children_changed(parent)
+
+    def _detach(self, node, new_parent):
+        """Move o nó (com a subárvore carregada) para new_parent, ou o descarta se new_parent não estiver carregado."""
+        old_parent = node.parent
+        if new_parent is None or new_parent.children is None:
+            self._remove_node(node)
+            if new_parent is not None and not new_parent.has_children:
+                new_parent.has_children = True
+                self._row_changed(new_parent)
+            return
+        position = self._position(new_parent, node.id)
+        if not self.beginMoveRows(self.index_for_node(old_parent), node.row, node.row,
+                                  self.index_for_node(new_parent), position):
+            return
+        del old_parent.children[node.row]
+        self._renumber(old_parent, node.row)
+        new_parent.children.insert(position, node)
+        node.parent = new_parent
+        self._renumber(new_parent, position)
+        self.endMoveRows()
+        self._parent_children_changed(old_parent)
+        self._parent_children_changed(new_parent)
+
+    def _remove_node(self, node):
+        parent = node.parent
+        self.beginRemoveRows(self.index_for_node(parent), node.row, node.row)
+        del parent.children[node.row]
+        self._renumber(parent, node.row)
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            self._nodes.pop(current.id, None)
+            stack.extend(current.children or ())
+        self.endRemoveRows()
+        self._parent_children_changed(parent)
+
+    def _row_changed(self, node):
+        if node is self._root:
+            return
+        self.dataChanged.emit(self.createIndex(node.row, 0, node),
+                              self.createIndex(node.row, len(STAT_HEADERS), node))
+
+    def refresh_stats(self):
+        """Busca de novo os contadores dos diretórios carregados (após mudanças nos itens)."""
+        if not self._nodes:
+            return
+        dir_ids, generation = list(self._nodes), self._generation
+        result = self._submit("tree-stats", lambda conn: (generation, estatisticas(conn, dir_ids)))
+        if result is not None:
+            self._set_stats(result[1])
+
+    def _set_stats(self, stats_by_id):
+        for dir_id, stats in stats_by_id.items():
+            node = self._nodes.get(dir_id)
+            if node is not None and node.stats != stats:
+                node.stats = stats
+                self.dataChanged.emit(self.createIndex(node.row, 1, node),
+                                      self.createIndex(node.row, len(STAT_HEADERS), node))
+
+    def _parent_children_changed(self, parent):
+        if parent is self._root:
+            return
+        parent.has_children = bool(parent.children)
+        self._row_changed(parent)
+
+    # -------------------- Acesso aos nós --------------------
+    def node(self, index):
+        return index.internalPointer() if index.isValid() else self._root
+
+    def node_for_id(self, dir_id):
+        return self._nodes.get(dir_id)
+
+    def loaded_ids(self):
+        return self._nodes.keys()
+
+    def index_for_node(self, node):
+        if node is None or node is self._root:
+            return QModelIndex()
+        return self.createIndex(node.row, 0, node)
+
+    def index_for_id(self, dir_id):
+        node = self._nodes.get(dir_id)
+        return self.index_for_node(node) if node is not None else QModelIndex()
+
+    def set_custom_color(self, dir_id, color_name):
+        if color_name:
+            self.custom_colors[str(dir_id)] = color_name
+        else:
+            self.custom_colors.pop(str(dir_id), None)
+        node = self._nodes.get(dir_id)
+        if node is not None:
+            self._row_changed(node)
+
+    # -------------------- QAbstractItemModel --------------------
+    def index(self, row, column, parent=QModelIndex()):
+        node = self.node(parent)
+        if node.children is None or not 0 <= row < len(node.children) or not 0 <= column <= len(STAT_HEADERS):
+            return QModelIndex()
+        return self.createIndex(row, column, node.children[row])
+
+    def parent(self, index):
+        if not index.isValid():
+            return QModelIndex()
+        return self.index_for_node(index.internalPointer().parent)
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.column() > 0:
+            return 0
+        node = self.node(parent)
+        return len(node.children) if node.children is not None else 0
+
+    def columnCount(self, parent=QModelIndex()):
+        return 1 + len(STAT_HEADERS)
+
+    def hasChildren(self, parent=QModelIndex()):
+        node = self.node(parent)
+        if node.children is not None:
+            return bool(node.children)
+        return node.has_children
+
+    def canFetchMore(self, parent):
+        node = self.node(parent)
+        return node.children is None and node.has_children and not node.loading
+
+    def fetchMore(self, parent):
+        node = self.node(parent)
+        if node.children is None and not node.loading:
+            self._request_children(node)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return "Directories" if section == 0 else STAT_HEADERS[section - 1]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        node = index.internalPointer()
+        column = index.column()
+        if column > 0:
+            if role in (Qt.DisplayRole, Qt.ToolTipRole) and not node.stats:
+                return None
+            if role == Qt.DisplayRole:
+                return node.stats[column - 1]
+            if role == Qt.ToolTipRole:
+                return (f"{node.stats[column + len(STAT_HEADERS) - 1]} in this directory, "
+                        f"{node.stats[column - 1]} including subdirectories")
+            if role == Qt.TextAlignmentRole:
+                return int(Qt.AlignRight | Qt.AlignVCenter)
+        if role == Qt.DisplayRole:
+            return node.name
+        if role == Qt.ToolTipRole:
+            return node.note_text or None
+        if role == Qt.BackgroundRole:
+            color = self.custom_colors.get(str(node.id)) or node.note_color
+            return QColor(color) if color else None
+        if role == Qt.UserRole:
+            return node.id
+        return None
+
+    def flags(self, index):
+        flags = super().flags(index) | Qt.ItemIsDropEnabled
+        if index.isValid():
+            flags |= Qt.ItemIsDragEnabled
+        return flags
+
+    # -------------------- Arrastar e soltar --------------------
+    def supportedDropActions(self):
+        return Qt.MoveAction
+
+    def mimeTypes(self):
+        return [MIME_TYPE]
+
+    def mimeData(self, indexes):
+        data = QMimeData()
+        ids = [str(self.node(index).id) for index in indexes if index.isValid() and index.column() == 0]
+        data.setData(MIME_TYPE, QByteArray(",".join(ids).encode()))
+        return data
+
+    def dropMimeData(self, data, action, row, column, parent):
+        if action != Qt.MoveAction or not data.hasFormat(MIME_TYPE):
+            return False
+        new_parent_id = self.node(parent).id
+        for raw_id in bytes(data.data(MIME_TYPE)).decode().split(","):
+            if raw_id:
+                self.moveRequested.emit(int(raw_id), new_parent_id)
+        # A janela grava a mudança e atualiza a árvore; a view não remove nada
+        return False
@@ -0,0 +1,458 @@
+import difflib
+
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex, pyqtSignal
+from PyQt5.QtGui import QColor
+
+from database import obter_conexao
+from quantity_buffer import UPDATE_SQL
+
+# Colunas que toda consulta entregue ao modelo deve retornar, nesta ordem
+ROW_FIELDS = ("id", "title", "responsible", "quantity", "image_path",
+              "description", "directory", "note_text", "note_color")
+F_ID, F_TITLE, F_RESPONSIBLE, F_QUANTITY, F_IMAGE, F_DESCRIPTION, F_DIRECTORY, F_NOTE_TEXT, F_NOTE_COLOR = range(9)
+
+HEADERS = ["ID", "Title", "Responsible", "Quantity", "Image", "Description"]
+DIRECTORY_HEADER = "Directory"
+QUANTITY_COLUMN = 3
+
+# Coluna visível -> expressão de ordenação sobre as colunas da consulta
+_SORT_EXPRESSIONS = {
+    0: "id",
+    1: "title COLLATE NOCASE",
+    2: "responsible COLLATE NOCASE",
+    3: "quantity",
+    4: "(image_path IS NOT NULL AND image_path != '')",
+    5: "description COLLATE NOCASE",
+    6: "directory COLLATE NOCASE",
+}
+
+
+class ItemsTableModel(QAbstractTableModel):
+    """
+    Modelo da tabela de itens, compartilhado pela listagem de um diretório,
+    pela listagem recursiva e pela busca. As linhas são buscadas sob demanda
+    (canFetchMore/fetchMore) em páginas de PAGE_SIZE, conforme a tabela rola.
+
+    Cada página é uma consulta própria (LIMIT/OFFSET) em vez de um cursor
+    mantido aberto: um cursor aberto seguraria o lock compartilhado do banco
+    e impediria os outros usuários de gravar enquanto a tabela estiver na tela.
+    Por isso as linhas carregadas precisam ser sempre o começo exato do
+    resultado: alterações que podem mudá-lo recarregam a janela carregada,
+    que é mesclada às linhas atuais (só as diferenças são emitidas).
+
+    Com um QueryWorker, as páginas (e as linhas relidas por apply_change e
+    locate) são buscadas fora do thread da interface e respostas de consultas
+    já substituídas (outro diretório clicado, outra busca) são descartadas. Com um QuantityBuffer, os cliques de +/- são
+    acumulados e gravados depois; a quantidade exibida já inclui o pendente.
+    """
+    PAGE_SIZE = 200
+    # A primeira página é menor para os resultados aparecerem o quanto antes
+    FIRST_PAGE_SIZE = 50
+    CHANNEL = "items"
+
+    # Mensagem de erro para a janela exibir (o modelo não abre diálogos)
+    errorOccurred = pyqtSignal(str)
+    # Linha encontrada por locate()
+    itemLocated = pyqtSignal(int)
+
+    def __init__(self, parent=None, worker=None, quantity_buffer=None):
+        super().__init__(parent)
+        self._rows = []
+        self._sql = None
+        self._params = ()
+        self._with_directory = False
+        self._order_by = None
+        self._exhausted = True
+        self._pending_ticket = None
+        # (item_id,) procurado por locate() até ser carregado
+        self._locate_target = None
+        self._kind = "items"
+        self._detail = None
+        self.read_only = False
+        self.worker = worker
+        if worker is not None:
+            worker.resultReady.connect(self._on_page_ready)
+            worker.failed.connect(self._on_page_failed)
+        self.quantity_buffer = quantity_buffer
+        if quantity_buffer is not None:
+            quantity_buffer.flushed.connect(self._on_quantities_flushed)
+
+    # -------------------- Consulta --------------------
+    def set_query(self, sql, params=(), with_directory=False, kind="items", detail=None):
+        """
+        Define a consulta exibida (deve retornar as colunas de ROW_FIELDS) e
+        carrega a primeira página. kind e detail identificam a consulta nas
+        estatísticas do QueryWorker.
+        """
+        self._sql = sql
+        self._params = tuple(params)
+        self._kind = kind
+        self._detail = detail
+        self._order_by = None
+        self._reset(with_directory)
+        self._request_page(0, self.FIRST_PAGE_SIZE)
+
+    @property
+    def with_directory(self):
+        """Indica se a consulta atual mostra a coluna de diretório."""
+        return self._with_directory
+
+    def clear(self):
+        self._sql = None
+        self._reset(self._with_directory)
+        self._exhausted = True
+
+    def reload(self, extra=0):
+        """
+        Recarrega a consulta atual mantendo a ordenação e a quantidade de linhas
+        já carregadas (mais extra) e mescla o resultado às linhas atuais, sem
+        perder seleção e rolagem.
+        """
+        if self._sql is None:
+            return
+        # As linhas atuais ficam na tela até a resposta chegar
+        self._request_page(0, max(len(self._rows) + extra, self.PAGE_SIZE), mode="merge")
+
+    def _reset(self, with_directory):
+        self._cancel_pending()
+        self.beginResetModel()
+        self._with_directory = with_directory
+        self._rows = []
+        self._exhausted = False
+        self.endResetModel()
+
+    def _cancel_pending(self):
+        self._pending_ticket = None
+        self._locate_target = None
+        if self.worker is not None:
+            self.worker.invalidate(self.CHANNEL)
+
+    def _page_sql(self):
+        sql = f"SELECT * FROM ({self._sql})"
+        if self._order_by:
+            sql += f" ORDER BY {self._order_by}"
+        return sql + " LIMIT ? OFFSET ?"
+
+    def _request_page(self, offset, limit, mode="append"):
+        """mode: "append" (próxima página), "merge" (recarga mesclada) ou "reset" (nova ordenação)."""
+        sql, params = self._page_sql(), self._params + (limit, offset)
+
+        def fetch(conn):
+            return mode, limit, [list(row) for row in conn.execute(sql, params).fetchall()]
+
+        self._submit(fetch)
+
+    def _submit(self, job):
+        """Roda job(conn) no QueryWorker (ou aqui, sem worker) e aplica o resultado."""
+        if self.worker is not None:
+            self._pending_ticket = self.worker.submit(self.CHANNEL, job, self._kind, self._detail)
+            return
+        try:
+            with obter_conexao(somente_leitura=True) as conn:
+                result = job(conn)
+        except Exception as e:
+            self._fail(str(e))
+            return
+        self._apply_result(result)
+
+    def _on_page_ready(self, channel, ticket, result):
+        if channel != self.CHANNEL or ticket != self._pending_ticket:
+            return
+        self._pending_ticket = None
+        self._apply_result(result)
+
+    def _on_page_failed(self, channel, ticket, message):
+        if channel != self.CHANNEL or ticket != self._pending_ticket:
+            return
+        self._pending_ticket = None
+        self._fail(message)
+
+    def _fail(self, message):
+        self._exhausted = True
+        self._locate_target = None
+        self.errorOccurred.emit(f"Error loading items: {message}")
+
+    def _apply_result(self, result):
+        mode = result[0]
+        if mode == "ids":
+            self._apply_fetched(*result[1:])
+        elif mode == "locate":
+            exhausted, rows = result[1:]
+            self._append_rows(rows)
+            self._exhausted = exhausted
+        else:
+            self._apply_page(*result)
+        # Um locate() feito com outra consulta pendente continua depois dela
+        if self._locate_target is not None and self._pending_ticket is None:
+            self._continue_locate()
+
+    def _apply_page(self, mode, limit, page):
+        self._exhausted = len(page) < limit
+        if mode == "reset":
+            self.beginResetModel()
+            self._rows = page
+            self.endResetModel()
+        elif mode == "merge":
+            self._merge_rows(page)
+        else:
+            self._append_rows(page)
+
+    def _append_rows(self, rows):
+        if rows:
+            first = len(self._rows)
+            self.beginInsertRows(QModelIndex(), first, first + len(rows) - 1)
+            self._rows.extend(rows)
+            self.endInsertRows()
+
+    def _merge_rows(self, page):
+        """Troca as linhas por page emitindo só as remoções, inclusões e alterações necessárias."""
+        matcher = difflib.SequenceMatcher(None, [row[F_ID] for row in self._rows], [row[F_ID] for row in page],
+                                          autojunk=False)
+        last_column = self.columnCount() - 1
+        shift = 0
+        for tag, old_start, old_end, new_start, new_end in matcher.get_opcodes():
+            first = old_start + shift
+            if tag == "equal":
+                for offset in range(old_end - old_start):
+                    if self._rows[first + offset] != page[new_start + offset]:
+                        self._rows[first + offset] = page[new_start + offset]
+                        self.dataChanged.emit(self.index(first + offset, 0), self.index(first + offset, last_column))
+                continue
+            if old_end > old_start:
+                self.beginRemoveRows(QModelIndex(), first, first + old_end - old_start - 1)
+                del self._rows[first:first + old_end - old_start]
+                self.endRemoveRows()
+            if new_end > new_start:
+                self.beginInsertRows(QModelIndex(), first, first + new_end - new_start - 1)
+                self._rows[first:first] = page[new_start:new_end]
+                self.endInsertRows()
+            shift += (new_end - new_start) - (old_end - old_start)
+
+    def is_loading(self):
+        return self._pending_ticket is not None
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self._exhausted and self._pending_ticket is None
+
+    def fetchMore(self, parent=QModelIndex()):
+        if not self.canFetchMore(parent):
+            return
+        self._request_page(len(self._rows), self.PAGE_SIZE)
+
+    def locate(self, item_id=None):
+        """
+        Carrega as páginas seguintes até a linha de item_id (None: até a última
+        linha) e emite itemLocated com o número da linha. Se o item não estiver
+        no resultado, nada é emitido.
+        """
+        if self._sql is None:
+            return
+        self._locate_target = (item_id,)
+        if self._pending_ticket is None:
+            self._continue_locate()
+
+    def _continue_locate(self):
+        item_id, = self._locate_target
+        if item_id is None:
+            row = len(self._rows) - 1 if self._exhausted else -1
+        else:
+            row = self.row_for_id(item_id)
+        if row >= 0 or self._exhausted:
+            self._locate_target = None
+            if row >= 0:
+                self.itemLocated.emit(row)
+            return
+        # Uma consulta a partir da primeira linha não carregada, lida em páginas até o item
+        sql, params, size = self._page_sql(), self._params + (-1, len(self._rows)), self.PAGE_SIZE
+
+        def scan(conn):
+            cursor = conn.execute(sql, params)
+            rows = []
+            while True:
+                page = cursor.fetchmany(size)
+                rows.extend(list(row) for row in page)
+                if len(page) < size:
+                    return "locate", True, rows
+                if item_id is not None and any(row[F_ID] == item_id for row in page):
+                    return "locate", False, rows
+
+        self._submit(scan)
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        expression = _SORT_EXPRESSIONS.get(column)
+        if self._sql is None or expression is None:
+            return
+        direction = "DESC" if order == Qt.DescendingOrder else "ASC"
+        self._order_by = f"{expression} {direction}, id {direction}"
+        # Outra ordem: as linhas mudam quase todas de lugar, então a tabela é recriada
+        self._request_page(0, max(len(self._rows), self.PAGE_SIZE), mode="reset")
+
+    # -------------------- Atualização por linha --------------------
+    def apply_change(self, change):
+        """
+        Aplica uma alteração de itens (change_notifier.Change) só nas linhas
+        afetadas, mantendo rolagem e seleção da tabela.
+        """
+        if change.entity != "item" or self._sql is None:
+            return
+        ids = set(change.ids)
+        if change.action == "deleted":
+            # As linhas excluídas saem do começo carregado e do banco: o resto continua coerente
+            self._remove_ids(ids)
+            if self._pending_ticket is not None:
+                # A resposta pendente pode ter sido lida antes da exclusão
+                self.reload()
+            return
+        if self._pending_ticket is not None or not self._exhausted:
+            # A página pendente pode ou não refletir a alteração, e com o resultado só em parte
+            # carregado um item incluído ou alterado pode passar a cair dentro (ou fora) das
+            # linhas já carregadas e deslocar o OFFSET das próximas páginas: recarrega a janela
+            self.reload(extra=len(ids) if change.action == "inserted" else 0)
+            return
+        # Tudo carregado: basta reler as linhas alteradas
+        sql, params = f"SELECT * FROM ({self._sql}) WHERE id IN ({', '.join('?' for _ in ids)})", self._params
+
+        def fetch(conn):
+            rows = conn.execute(sql, params + tuple(ids)).fetchall()
+            return "ids", ids, {row[F_ID]: list(row) for row in rows}
+
+        self._submit(fetch)
+
+    def _apply_fetched(self, ids, fetched):
+        # Itens que deixaram de atender à consulta (ex.: movidos para outro diretório)
+        self._remove_ids(ids - set(fetched))
+        rows_by_id = {data[F_ID]: number for number, data in enumerate(self._rows)}
+        new_rows = []
+        for item_id in sorted(fetched):
+            row = rows_by_id.get(item_id)
+            if row is not None:
+                self._rows[row] = fetched[item_id]
+                self.dataChanged.emit(self.index(row, 0), self.index(row, self.columnCount() - 1))
+            else:
+                new_rows.append(fetched[item_id])
+        if new_rows:
+            first = len(self._rows)
+            self.beginInsertRows(QModelIndex(), first, first + len(new_rows) - 1)
+            self._rows.extend(new_rows)
+            self.endInsertRows()
+
+    def _remove_ids(self, ids):
+        # De baixo para cima, um beginRemoveRows por faixa de linhas seguidas
+        row = len(self._rows) - 1
+        while row >= 0:
+            if self._rows[row][F_ID] not in ids:
+                row -= 1
+                continue
+            last = row
+            while row > 0 and self._rows[row - 1][F_ID] in ids:
+                row -= 1
+            self.beginRemoveRows(QModelIndex(), row, last)
+            del self._rows[row:last + 1]
+            self.endRemoveRows()
+            row -= 1
+
+    # -------------------- Acesso às linhas --------------------
+    def item_id(self, row):
+        if 0 <= row < len(self._rows):
+            return self._rows[row][F_ID]
+        return None
+
+    def row_for_id(self, item_id):
+        for row, data in enumerate(self._rows):
+            if data[F_ID] == item_id:
+                return row
+        return -1
+
+    def note_text(self, row):
+        if 0 <= row < len(self._rows):
+            return self._rows[row][F_NOTE_TEXT] or ""
+        return ""
+
+    def quantity(self, row):
+        """Quantidade exibida da linha, incluindo cliques ainda não gravados."""
+        data = self._rows[row]
+        quantity = data[F_QUANTITY] or 0
+        if self.quantity_buffer is not None:
+            quantity = max(0, quantity + self.quantity_buffer.pending(data[F_ID]))
+        return quantity
+
+    # -------------------- QAbstractTableModel --------------------
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(HEADERS) + (1 if self._with_directory else 0)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            if section < len(HEADERS):
+                return HEADERS[section]
+            return DIRECTORY_HEADER
+        return super().headerData(section, orientation, role)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row = self._rows[index.row()]
+        column = index.column()
+        if role == Qt.DisplayRole:
+            if column == 0:
+                return str(row[F_ID])
+            if column == 1:
+                return row[F_TITLE]
+            if column == 2:
+                return row[F_RESPONSIBLE] or ""
+            if column == QUANTITY_COLUMN:
+                return self.quantity(index.row())
+            if column == 4:
+                return "Yes" if row[F_IMAGE] else "No"
+            if column == 5:
+                return row[F_DESCRIPTION] or ""
+            if column == 6:
+                return row[F_DIRECTORY] or ""
+        elif role == Qt.EditRole and column == QUANTITY_COLUMN:
+            return self.quantity(index.row())
+        elif role == Qt.ToolTipRole and column == 1:
+            return row[F_NOTE_TEXT] or None
+        elif role == Qt.BackgroundRole and column == 1 and row[F_NOTE_COLOR]:
+            return QColor(row[F_NOTE_COLOR])
+        elif role == Qt.UserRole:
+            return row[F_ID]
+        return None
+
+    def flags(self, index):
+        flags = super().flags(index)
+        if index.isValid() and index.column() == QUANTITY_COLUMN and not self.read_only:
+            flags |= Qt.ItemIsEditable
+        return flags
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if not index.isValid() or index.column() != QUANTITY_COLUMN or role != Qt.EditRole:
+            return False
+        row = self._rows[index.row()]
+        delta = max(0, int(value)) - self.quantity(index.row())
+        if not delta:
+            return False
+        if self.quantity_buffer is not None:
+            self.quantity_buffer.add(row[F_ID], delta)
+        else:
+            try:
+                with obter_conexao() as conn:
+                    conn.execute(UPDATE_SQL, (delta, row[F_ID]))
+            except Exception as e:
+                self.errorOccurred.emit(f"Error updating quantity: {e}")
+                return False
+            row[F_QUANTITY] = max(0, (row[F_QUANTITY] or 0) + delta)
+        self.dataChanged.emit(index, index, [Qt.DisplayRole, Qt.EditRole])
+        return True
+
+    def _on_quantities_flushed(self, deltas):
+        # O banco já tem os deltas; passa-os para as linhas em memória
+        for number, row in enumerate(self._rows):
+            delta = deltas.get(row[F_ID])
+            if delta:
+                row[F_QUANTITY] = max(0, (row[F_QUANTITY] or 0) + delta)
+                index = self.index(number, QUANTITY_COLUMN)
+                self.dataChanged.emit(index, index, [Qt.DisplayRole, Qt.EditRole])
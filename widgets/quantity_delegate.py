@@ -0,0 +1,64 @@
+from PyQt5.QtCore import Qt, QEvent, QRect, QSize
+from PyQt5.QtWidgets import QStyledItemDelegate, QStyleOptionButton, QStyle, QApplication
+
+
+class QuantityDelegate(QStyledItemDelegate):
+    """
+    Desenha a coluna de quantidade como "[-] valor [+]" e trata os cliques
+    nos botões, gravando pelo setData do modelo. Substitui o antigo
+    QuantityWidget: nenhum widget real é criado por linha.
+    """
+    BUTTON_WIDTH = 20
+
+    def _button_rects(self, rect):
+        width = self.BUTTON_WIDTH
+        decrease = QRect(rect.left(), rect.top(), width, rect.height())
+        increase = QRect(rect.right() - width + 1, rect.top(), width, rect.height())
+        return decrease, increase
+
+    def paint(self, painter, option, index):
+        style = option.widget.style() if option.widget else QApplication.style()
+        # Fundo e seleção da célula, sem o texto
+        self.initStyleOption(option, index)
+        option.text = ""
+        style.drawControl(QStyle.CE_ItemViewItem, option, painter, option.widget)
+
+        enabled = bool(index.flags() & Qt.ItemIsEditable)
+        decrease_rect, increase_rect = self._button_rects(option.rect)
+        for rect, text in ((decrease_rect, "-"), (increase_rect, "+")):
+            button = QStyleOptionButton()
+            button.rect = rect
+            button.text = text
+            button.state = QStyle.State_Enabled if enabled else QStyle.State_None
+            style.drawControl(QStyle.CE_PushButton, button, painter, option.widget)
+
+        value_rect = QRect(decrease_rect.right() + 1, option.rect.top(),
+                           increase_rect.left() - decrease_rect.right() - 1, option.rect.height())
+        painter.save()
+        if option.state & QStyle.State_Selected:
+            painter.setPen(option.palette.highlightedText().color())
+        painter.drawText(value_rect, Qt.AlignCenter, str(index.data(Qt.DisplayRole)))
+        painter.restore()
+
+    def sizeHint(self, option, index):
+        return QSize(2 * self.BUTTON_WIDTH + 30, super().sizeHint(option, index).height())
+
+    def createEditor(self, parent, option, index):
+        # A edição é feita só pelos botões
+        return None
+
+    def editorEvent(self, event, model, option, index):
+        if event.type() != QEvent.MouseButtonRelease or event.button() != Qt.LeftButton:
+            return False
+        if not index.flags() & Qt.ItemIsEditable:
+            return False
+        decrease_rect, increase_rect = self._button_rects(option.rect)
+        current = int(index.data(Qt.EditRole) or 0)
+        if increase_rect.contains(event.pos()):
+            model.setData(index, current + 1, Qt.EditRole)
+            return True
+        if decrease_rect.contains(event.pos()):
+            if current > 0:
+                model.setData(index, current - 1, Qt.EditRole)
+            return True
+        return False
@@ -0,0 +1,53 @@
+import time
+
+from PyQt5.QtCore import Qt
+from PyQt5.QtWidgets import QProgressDialog
+
+
+def format_duration(seconds):
+    seconds = int(seconds)
+    if seconds < 60:
+        return f"{seconds}s"
+    if seconds < 3600:
+        return f"{seconds // 60}m {seconds % 60:02d}s"
+    return f"{seconds // 3600}h {seconds % 3600 // 60:02d}m"
+
+
+class TaskProgressDialog(QProgressDialog):
+    """
+    Diálogo de progresso para tarefas longas que rodam num QThread
+    (exportação, importação, backup). update_progress recebe (feito, total)
+    e mostra a taxa e o tempo restante estimado; Cancel chama cancel() do worker.
+    unit é o nome da unidade no texto ("rows", "MB", ...).
+    """
+
+    def __init__(self, title, label, unit="rows", parent=None):
+        super().__init__(label, "Cancel", 0, 0, parent)
+        self.setWindowTitle(title)
+        self.setWindowModality(Qt.WindowModal)
+        self.setMinimumDuration(0)
+        self.setAutoClose(False)
+        self.setAutoReset(False)
+        self.base_label = label
+        self.unit = unit
+        self._start = time.perf_counter()
+
+    def attach(self, worker):
+        """Liga o sinal progress(int, int) do worker e o botão Cancel ao worker.cancel()."""
+        worker.progress.connect(self.update_progress)
+        self.canceled.connect(worker.cancel)
+        worker.finished.connect(self.close)
+
+    def update_progress(self, done, total):
+        if total > 0:
+            # QProgressDialog usa int de 32 bits
+            self.setMaximum(1000)
+            self.setValue(min(1000, int(1000 * done / total)))
+        elapsed = time.perf_counter() - self._start
+        text = f"{self.base_label}\n{done:,} of {total:,} {self.unit}"
+        if done and elapsed > 0:
+            rate = done / elapsed
+            text += f" ({rate:,.0f} {self.unit}/s)"
+            if total > done:
+                text += f", about {format_duration((total - done) / rate)} left"
+        self.setLabelText(text)